@@ -2,91 +2,304 @@
 # Python flask server to interact with webGL.
 # Octavio Navarro. 2024
 
-from flask import Flask, request, jsonify
+import json
+import os
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+import numpy as np
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
-from trafficBase.model import RandomModel
-from trafficBase.agent import Edificio, Semaforo, Calle, Destino, Coche
+from streaming import FIN, Transmisor
+from sessions import RegistroSesiones
+from monitoring import MetricasServidor, Muestreador
+from binary_format import MIME_BINARIO, TIPOS_CELDA, pide_binario, codificar_dinamicos, codificar_estaticos
+from trafficBase.model import MOTORES, RandomModel
+from trafficBase.demand import Demanda
+from trafficBase.mapcache import compilar_mapa
+from trafficBase.signals import MODOS
+from trafficBase.profiling import PerfilPasos
+from trafficBase.snapshot import guardar_instantanea, leer_instantanea, restaurar_instantanea
 
-# Variables globales para el modelo
-randomModel = None
-currentStep = 0
+# Simulaciones por sesión. El id llega en el encabezado X-Session-Id, en
+# ?session= o en el cuerpo de /init; sin id se usa la sesión "default".
+sesiones = RegistroSesiones()
+SESION_POR_DEFECTO = "default"
+
+# Máximo de pasos que /advance puede avanzar en una sola solicitud
+MAX_PASOS_POR_SOLICITUD = 1000
+# Máximo de pasos de /fastforward (sin métricas ni registro de cambios)
+MAX_PASOS_AVANCE_RAPIDO = 100000
+# Máximos de los buffers de un modelo restaurado desde una instantánea
+MAX_METRICAS_CAPACIDAD = 1000000
+MAX_HISTORIAL = 1000
+MAX_CAMBIOS = 10000
+# El motor particionado usa un proceso por trabajador: a lo más uno por CPU y
+# pocas sesiones particionadas a la vez
+MAX_TRABAJADORES = os.cpu_count() or 1
+MAX_SESIONES_PARTICIONADAS = 2
+lock_particionadas = threading.Lock()
+
+# Latencias y tamaños de respuesta por endpoint (ver /metrics)
+metricas = MetricasServidor()
 
 # Configuración del servidor Flask
 app = Flask("Traffic Simulation API")
 CORS(app)
 
+@app.before_request
+def iniciar_cronometro():
+    g.inicio = time.perf_counter()
+
+@app.after_request
+def registrar_solicitud(response):
+    """
+    Registra latencia, código y tamaño de cada respuesta (las transmisiones no tienen tamaño).
+    """
+    inicio = g.get('inicio')
+    if inicio is not None:
+        metricas.observar(request.endpoint or "desconocido", request.method, response.status_code,
+                          time.perf_counter() - inicio, response.content_length)
+    return response
+
+def id_sesion():
+    """
+    Id de sesión de la solicitud actual.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    return (request.headers.get('X-Session-Id')
+            or request.args.get('session')
+            or (data or {}).get('session')
+            or SESION_POR_DEFECTO)
+
+def agentes_estaticos(compilado):
+    """
+    Edificios, calles y destinos del mapa compilado, columna por columna como en grid.coord_iter.
+    """
+    static_agents = []
+    alto = compilado.height
+    por_columna = compilado.tipos.reshape(alto, compilado.width).T.ravel()
+    for k in np.flatnonzero(por_columna).tolist():
+        x, y = k // alto, k % alto
+        tipo = TIPOS_CELDA[por_columna[k]]
+        agent_data = {"id": f"{tipo}-{x}-{y}", "type": tipo, "pos": [x, y]}
+        if tipo == "Calle":
+            agent_data["direction"] = int(compilado.direcciones[y * compilado.width + x])
+        static_agents.append(agent_data)
+    return static_agents
+
+def sin_modelo():
+    return jsonify({"error": "El modelo no ha sido inicializado."}), 400
+
+def entero_positivo(valor, maximo=None):
+    """
+    Indica si valor es un entero mayor que cero (y no mayor que maximo, si se da).
+    """
+    return (isinstance(valor, int) and not isinstance(valor, bool) and valor >= 1
+            and (maximo is None or valor <= maximo))
+
+def validar_parametros(mapa, motor, trabajadores, control, demanda, reruteo):
+    """
+    Revisa los parámetros de un modelo nuevo (de /init o de una instantánea).
+    Devuelve el mensaje de error, o None si son válidos.
+    """
+    if not isinstance(mapa, list) or not mapa or not all(isinstance(row, str) for row in mapa):
+        return "El mapa debe ser una lista no vacía de filas de texto."
+
+    # Validar que todas las filas del mapa tengan el mismo ancho
+    if not all(len(row) == len(mapa[0]) for row in mapa):
+        return "El mapa debe ser rectangular."
+
+    if motor not in MOTORES:
+        return f"Motor desconocido: {motor}"
+
+    if trabajadores is not None and not entero_positivo(trabajadores, MAX_TRABAJADORES):
+        return f"trabajadores debe ser un entero entre 1 y {MAX_TRABAJADORES}."
+
+    if control not in MODOS:
+        return f"Modo de semáforos desconocido: {control}"
+
+    if reruteo is not None and not entero_positivo(reruteo):
+        return "reruteo debe ser un entero positivo."
+
+    if demanda is not None and not isinstance(demanda, dict):
+        return "demanda debe ser un objeto."
+
+    # La demanda se arma contra el mapa (ya compilado para el modelo) para reportar sus errores aparte
+    if demanda:
+        try:
+            Demanda(compilar_mapa(mapa), demanda, 0)
+        except (ValueError, TypeError, KeyError, IndexError, AttributeError) as error:
+            return f"Demanda inválida: {error}"
+    return None
+
+@contextmanager
+def cupo_particionado(motor, session_id):
+    """
+    Reserva el cupo de sesiones con motor particionado mientras se crea y guarda
+    el modelo. Da el mensaje de error si ya no hay cupo, o None.
+    """
+    if motor != "particionado":
+        yield None
+        return
+    with lock_particionadas:
+        activas = sum(1 for sesion in sesiones.todas()
+                      if sesion.id != session_id and getattr(sesion.model.motor, "nombre", None) == "particionado")
+        if activas >= MAX_SESIONES_PARTICIONADAS:
+            yield f"Ya hay {activas} sesiones con motor particionado (máximo {MAX_SESIONES_PARTICIONADAS})."
+        else:
+            yield None
+
+def validar_instantanea(meta):
+    """
+    Revisa los parámetros guardados en una instantánea antes de crear su modelo.
+    Devuelve el mensaje de error, o None si son válidos.
+    """
+    reruteo = meta.get('reruteo') or {}
+    if not isinstance(reruteo, dict):
+        return "reruteo debe ser un objeto."
+    error = validar_parametros(meta.get('mapa'), meta.get('motor'), meta.get('trabajadores'),
+                               meta.get('control_semaforos'), meta.get('demanda'), reruteo.get('periodo'))
+    if error is not None:
+        return error
+
+    limites = {
+        "metricas_capacidad": MAX_METRICAS_CAPACIDAD,
+        "metricas_cada": None,
+        "historial_max": MAX_HISTORIAL,
+        "cambios_max": MAX_CAMBIOS,
+        "periodo_aparicion": None,
+        "intervalo_semaforo": None,
+    }
+    for nombre, maximo in limites.items():
+        if not entero_positivo(meta.get(nombre), maximo):
+            limite = f" no mayor que {maximo}" if maximo is not None else ""
+            return f"{nombre} debe ser un entero positivo{limite}."
+
+    contadores = meta.get('contadores')
+    if (not isinstance(contadores, dict)
+            or not all(isinstance(v, int) and not isinstance(v, bool) and v >= 0 for v in contadores.values())):
+        return "Los contadores deben ser enteros no negativos."
+
+    umbral = reruteo.get('umbral', 0.25)
+    if isinstance(umbral, bool) or not isinstance(umbral, (int, float)) or umbral < 0:
+        return "El umbral de reruteo debe ser un número no negativo."
+    return None
+
 @app.route('/init', methods=['POST'])
 def init_model():
     """
     Inicializa el modelo con parámetros recibidos en la solicitud.
     """
-    global randomModel, currentStep
-
     data = request.json  # Obtener datos del cliente
     mapa = data.get('mapa', [])  # Mapa inicial
+    motor = data.get('motor', 'mesa')  # "mesa", "vectorizado" o "particionado"
+    trabajadores = data.get('trabajadores')  # Procesos del motor particionado (uno por CPU por defecto)
+    demanda = data.get('demanda')  # Configuración de Demanda (por defecto, coches en las esquinas)
+    control = data.get('semaforos', 'fijo')  # "fijo", "onda" o "actuado"
+    reruteo = data.get('reruteo')  # Pasos entre reparaciones de rutas por tiempo de viaje (sin reruteo por defecto)
+    perfil = data.get('perfil', False)  # Medir el tiempo de cada fase del paso (ver /metrics)
+
+    error = validar_parametros(mapa, motor, trabajadores, control, demanda, reruteo)
+    if error is not None:
+        return jsonify({"error": error}), 400
+
+    if not isinstance(perfil, bool):
+        return jsonify({"error": "perfil debe ser true o false."}), 400
 
     # Calcular dinámicamente las dimensiones del mapa
     height = len(mapa)
-    width = len(mapa[0]) if height > 0 else 0
-
-    # Validar que todas las filas del mapa tengan el mismo ancho
-    if not all(len(row) == width for row in mapa):
-        return jsonify({"error": "El mapa debe ser rectangular."}), 400
+    width = len(mapa[0])
 
-    # Crear modelo con las dimensiones dinámicas
-    randomModel = RandomModel(width, height, mapa)
-    currentStep = 0
+    # Crear modelo con las dimensiones dinámicas (reemplaza sólo la sesión de este cliente)
+    session_id = id_sesion()
+    with cupo_particionado(motor, session_id) as error:
+        if error is not None:
+            return jsonify({"error": error}), 400
+        try:
+            model = RandomModel(width, height, mapa, motor=motor, control_semaforos=control,
+                                trabajadores=trabajadores, demanda=demanda, periodo_reruteo=reruteo)
+        except (ValueError, TypeError) as error:
+            return jsonify({"error": f"Parámetros inválidos: {error}"}), 400
+        sesiones.guardar(session_id, model, perfil)
 
-    return jsonify({"message": "Modelo inicializado correctamente.", "width": width, "height": height})
+    respuesta = {"message": "Modelo inicializado correctamente.", "width": width, "height": height,
+                 "session": session_id}
+    if model.demanda is not None:
+        # Orden de las filas de las matrices origen-destino
+        respuesta["origenes"] = [(celda % width, celda // width) for celda in model.demanda.origenes.tolist()]
+    return jsonify(respuesta)
 
 @app.route('/getStaticAgents', methods=['GET'])
 def get_static_agents():
-    global randomModel
-
-    if randomModel is None:
-        return jsonify({"error": "El modelo no ha sido inicializado."}), 400
+    """
+    Devuelve edificios, calles y destinos. Con ?format=binary (o Accept:
+    application/octet-stream) responde con el formato de binary_format.py.
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
 
-    static_agents = []
-    for cell in randomModel.grid.coord_iter():
-        agents_in_cell, pos = cell  
-        x, y = pos  
-        for agent in agents_in_cell:
-            if isinstance(agent, (Edificio, Calle, Destino)):
-                agent_data = {
-                    "id": agent.unique_id,
-                    "type": type(agent).__name__,
-                    "pos": [x, y]
-                }
-                if isinstance(agent, Calle):
-                    agent_data["direction"] = agent.direction 
-                static_agents.append(agent_data)
-
-    return jsonify({"staticAgents": static_agents})
+    # La respuesta sólo depende del mapa: se serializa una vez por mapa compilado
+    # y el hash del mapa sirve de ETag para responder 304 al cliente que ya la tiene.
+    randomModel = sesion.model
+    compilado = randomModel.mapa_compilado
+    if pide_binario(request):
+        datos = compilado.carga("binario", lambda: codificar_estaticos(randomModel))
+        respuesta = Response(datos, mimetype=MIME_BINARIO)
+        respuesta.set_etag(f"{compilado.hash}-bin")
+    else:
+        datos = compilado.carga("json", lambda: json.dumps({"staticAgents": agentes_estaticos(compilado)}))
+        respuesta = Response(datos, mimetype="application/json")
+        respuesta.set_etag(f"{compilado.hash}-json")
+    respuesta.vary.add("Accept")
+    return respuesta.make_conditional(request)
 
 @app.route('/getDynamicAgents', methods=['GET'])
 def get_dynamic_agents():
-    global randomModel
-
-    if randomModel is None:
-        return jsonify({"error": "El modelo no ha sido inicializado."}), 400
-
-    dynamic_agents = []
-    for agent in randomModel.schedule.agents:
-        if isinstance(agent, (Coche, Semaforo)):
-            agent_data = {
-                "id": agent.unique_id,
-                "type": type(agent).__name__,
-                "pos": agent.pos
+    """
+    Devuelve coches y semáforos. Con ?since=<paso> sólo envía los que cambiaron
+    después de ese paso (y los ids eliminados en "removed"); si el servidor ya no
+    tiene esos cambios responde con la foto completa ("full": true).
+    Con ?historial=0 se omite recent_positions. Con ?format=binary (o Accept:
+    application/octet-stream) responde con el formato de binary_format.py;
+    ?dict=1 agrega el diccionario de ids.
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    since = request.args.get('since', type=int)
+    historial = request.args.get('historial', default=1, type=int) != 0
+
+    if pide_binario(request):
+        incluir_diccionario = request.args.get('dict', default=0, type=int) != 0
+        with sesion.lock:
+            datos = codificar_dinamicos(sesion.model, since, incluir_diccionario)
+        return Response(datos, mimetype=MIME_BINARIO)
+
+    with sesion.lock:
+        return jsonify(estado_dinamico(sesion.model, since, historial))
+
+def estado_dinamico(model, since=None, historial=True):
+    """
+    Arma la respuesta de agentes dinámicos: diferencias desde el paso since o la foto completa.
+    """
+    if since is not None:
+        cambios = model.cambios_desde(since)
+        if cambios is not None:
+            cambiados, eliminados = cambios
+            return {
+                "step": model.step_counter,
+                "full": False,
+                "dynamicAgents": model.agentes_dinamicos(sorted(cambiados), historial),
+                "removed": sorted(eliminados),
             }
-            if isinstance(agent, Semaforo):
-                agent_data["state"] = agent.green  # Estado del semáforo
-                agent_data["direction"] = agent.direction  # Dirección de la calle a la que pertenece
-            if isinstance(agent, Coche):
-                agent_data["destination"] = agent.destino.unique_id if agent.destino else None
-                agent_data["recent_positions"] = agent.recent_positions  # Historial de posiciones recientes
-            dynamic_agents.append(agent_data)
 
-    return jsonify({"dynamicAgents": dynamic_agents})
+    dynamic_agents = model.agentes_dinamicos(historial=historial)
+
+    return {"step": model.step_counter, "full": True, "dynamicAgents": dynamic_agents}
 
 
 @app.route('/update', methods=['GET'])
@@ -94,27 +307,287 @@ def update_model():
     """
     Avanza un paso en la simulación y devuelve el estado actualizado.
     """
-    global randomModel, currentStep
-
-    if randomModel is None:
-        return jsonify({"error": "El modelo no ha sido inicializado."}), 400
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
 
     # Avanzar un paso en la simulación
-    randomModel.step()
-    currentStep += 1
+    with sesion.lock:
+        sesion.model.step()
+        sesion.current_step += 1
+        currentStep = sesion.current_step
 
     return jsonify({"message": f"Simulación avanzada al paso {currentStep}.", "currentStep": currentStep})
 
+@app.route('/advance', methods=['GET'])
+def advance_model():
+    """
+    Avanza ?steps=N pasos (1 por defecto) y devuelve en una sola respuesta el
+    estado dinámico (diferencias desde ?since= si se indica) y las estadísticas.
+    Con ?frames=1 también incluye los cambios de cada paso intermedio.
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    steps = request.args.get('steps', default=1, type=int)
+    since = request.args.get('since', type=int)
+    frames = request.args.get('frames', default=0, type=int) != 0
+    historial = request.args.get('historial', default=1, type=int) != 0
+
+    if steps < 1 or steps > MAX_PASOS_POR_SOLICITUD:
+        return jsonify({"error": f"steps debe estar entre 1 y {MAX_PASOS_POR_SOLICITUD}."}), 400
+
+    intermediate = []
+    with sesion.lock:
+        randomModel = sesion.model
+        for _ in range(steps):
+            randomModel.step()
+            sesion.current_step += 1
+            if frames:
+                intermediate.append(estado_dinamico(randomModel, randomModel.step_counter - 1, historial))
+
+        result = estado_dinamico(randomModel, since, historial)
+        result["currentStep"] = sesion.current_step
+        result["stats"] = randomModel.get_stats()
+    if frames:
+        result["frames"] = intermediate
+    return jsonify(result)
+
 @app.route('/getStats', methods=['GET'])
 def get_stats():
-    global randomModel
-
-    if randomModel is None:
-        return jsonify({"error": "El modelo no ha sido inicializado."}), 400
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
 
-    stats = randomModel.get_stats()
+    with sesion.lock:
+        stats = sesion.model.get_stats()
     return jsonify(stats)
 
+@app.route('/fastforward', methods=['GET'])
+def fast_forward():
+    """
+    Avanza ?steps=N pasos sin guardar métricas ni el registro de cambios y
+    devuelve las estadísticas. Después el cliente debe pedir la foto completa.
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    steps = request.args.get('steps', default=1, type=int)
+    if steps < 1 or steps > MAX_PASOS_AVANCE_RAPIDO:
+        return jsonify({"error": f"steps debe estar entre 1 y {MAX_PASOS_AVANCE_RAPIDO}."}), 400
+
+    with sesion.lock:
+        sesion.model.avanzar_rapido(steps)
+        sesion.current_step += steps
+        return jsonify({"currentStep": sesion.current_step, "step": sesion.model.step_counter,
+                        "stats": sesion.model.get_stats()})
+
+@app.route('/snapshot', methods=['GET'])
+def save_snapshot():
+    """
+    Descarga una instantánea binaria del modelo de la sesión (ver trafficBase/snapshot.py).
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    with sesion.lock:
+        datos = guardar_instantanea(sesion.model)
+        step = sesion.model.step_counter
+    return Response(datos, mimetype=MIME_BINARIO,
+                    headers={"Content-Disposition": f"attachment; filename=snapshot-{step}.npz"})
+
+@app.route('/snapshot', methods=['POST'])
+def load_snapshot():
+    """
+    Reemplaza el modelo de la sesión por el de la instantánea enviada en el cuerpo.
+    """
+    try:
+        meta, arreglos = leer_instantanea(request.get_data())
+    except (ValueError, KeyError, OSError, zipfile.BadZipFile) as error:
+        return jsonify({"error": f"Instantánea inválida: {error}"}), 400
+
+    error = validar_instantanea(meta)
+    if error is not None:
+        return jsonify({"error": f"Instantánea inválida: {error}"}), 400
+
+    session_id = id_sesion()
+    with cupo_particionado(meta['motor'], session_id) as error:
+        if error is not None:
+            return jsonify({"error": error}), 400
+        try:
+            model = restaurar_instantanea(meta, arreglos)
+        except (ValueError, TypeError, IndexError, KeyError) as error:
+            return jsonify({"error": f"Instantánea inválida: {error}"}), 400
+        sesion = sesiones.guardar(session_id, model)
+    sesion.current_step = model.step_counter
+    return jsonify({"message": "Instantánea cargada correctamente.", "width": model.width,
+                    "height": model.height, "step": model.step_counter, "session": session_id})
+
+@app.route('/getMetrics', methods=['GET'])
+def get_metrics():
+    """
+    Devuelve la serie de métricas conservada entre los pasos ?desde= y ?hasta= (ambos opcionales).
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    desde = request.args.get('desde', type=int)
+    hasta = request.args.get('hasta', type=int)
+    with sesion.lock:
+        return jsonify(sesion.model.datacollector.rango(desde, hasta))
+
+def frame_transmision(model, since):
+    """
+    Frame que se envía a los clientes de /stream: estado dinámico sin historial más estadísticas.
+    """
+    frame = estado_dinamico(model, since, historial=False)
+    frame["stats"] = model.get_stats()
+    return frame
+
+@app.route('/stream/start', methods=['GET'])
+def start_stream():
+    """
+    Empieza a avanzar el modelo en segundo plano a ?rate= pasos por segundo (10 por defecto).
+    ?buffer= indica cuántos frames se guardan por cliente antes de juntarlos (8 por defecto).
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    rate = request.args.get('rate', default=10, type=float)
+    buffer = request.args.get('buffer', default=8, type=int)
+    if rate <= 0 or buffer < 1:
+        return jsonify({"error": "rate y buffer deben ser mayores que cero."}), 400
+
+    def contar_paso():
+        sesion.current_step += 1
+
+    with sesion.lock:
+        if sesion.cerrada:
+            return sin_modelo()
+        if sesion.transmisor is not None:
+            # Su hilo ve la señal al tomar el candado y termina sin avanzar
+            sesion.transmisor.detener(esperar=False)
+        sesion.transmisor = Transmisor(sesion.model, sesion.lock, frame_transmision,
+                                       pasos_por_segundo=rate, max_pendientes=buffer, al_avanzar=contar_paso)
+        sesion.transmisor.iniciar()
+
+    return jsonify({"message": "Transmisión iniciada.", "rate": rate})
+
+@app.route('/stream/stop', methods=['GET'])
+def stop_stream():
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is not None:
+        with sesion.lock:
+            transmisor = sesion.transmisor
+            sesion.transmisor = None
+        if transmisor is not None:
+            transmisor.detener()
+
+    return jsonify({"message": "Transmisión detenida."})
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    """
+    Envía los frames de la transmisión como Server-Sent Events. El primer frame
+    es la foto completa y después llegan sólo los cambios de cada paso. La
+    respuesta termina cuando la transmisión se detiene o la sesión se cierra.
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None or sesion.transmisor is None:
+        return jsonify({"error": "La transmisión no ha sido iniciada."}), 400
+
+    suscripcion = sesion.transmisor.suscribir()
+
+    def eventos():
+        try:
+            while True:
+                frame = suscripcion.siguiente(timeout=15)
+                if frame is FIN:
+                    return
+                if frame is None:
+                    yield ": keep-alive\n\n"  # Mantener viva la conexión
+                else:
+                    yield f"data: {json.dumps(frame)}\n\n"
+        finally:
+            suscripcion.cerrar()
+
+    return Response(eventos(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Métricas del servidor y de cada sesión en formato de texto de Prometheus.
+    """
+    return Response(metricas.texto(sesiones.todas()), mimetype="text/plain; version=0.0.4")
+
+@app.route('/profile/start', methods=['GET'])
+def start_profile():
+    """
+    Empieza a muestrear la pila de la simulación de la sesión cada ?interval= ms (5 por defecto).
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    intervalo = request.args.get('interval', default=5, type=float)
+    if intervalo <= 0:
+        return jsonify({"error": "interval debe ser mayor que cero."}), 400
+
+    with sesion.lock:
+        if sesion.muestreador is None:
+            # El muestreador encuentra el hilo de step() a través del perfil por fases
+            if sesion.model.perfil is None:
+                sesion.model.perfil = PerfilPasos()
+            sesion.muestreador = Muestreador(sesion.model.perfil, intervalo / 1000)
+            sesion.muestreador.iniciar()
+    return jsonify({"message": "Perfilador iniciado."})
+
+@app.route('/profile/stop', methods=['GET'])
+def stop_profile():
+    """
+    Detiene el perfilador de la sesión y devuelve las pilas colapsadas (ver /profile).
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    with sesion.lock:
+        muestreador = sesion.muestreador
+        sesion.muestreador = None
+    if muestreador is None:
+        return jsonify({"error": "El perfilador no está activo."}), 400
+    muestreador.detener()
+    return Response(muestreador.texto(), mimetype="text/plain")
+
+@app.route('/profile', methods=['GET'])
+def get_profile():
+    """
+    Pilas colapsadas ("funcion;funcion;... cuenta", para flamegraph.pl o speedscope)
+    muestreadas hasta ahora por el perfilador activo de la sesión.
+    """
+    sesion = sesiones.obtener(id_sesion())
+    if sesion is None:
+        return sin_modelo()
+
+    muestreador = sesion.muestreador
+    if muestreador is None:
+        return jsonify({"error": "El perfilador no está activo."}), 400
+    return Response(muestreador.texto(), mimetype="text/plain")
+
+@app.route('/session', methods=['DELETE'])
+def delete_session():
+    """
+    Libera la simulación de la sesión actual.
+    """
+    if not sesiones.eliminar(id_sesion()):
+        return sin_modelo()
+    return jsonify({"message": "Sesión eliminada."})
+
 # Iniciar servidor
 if __name__ == '__main__':
-    app.run(host="localhost", port=8585, debug=True)
+    app.run(host="localhost", port=8585, debug=True, threaded=True)
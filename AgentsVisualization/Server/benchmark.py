@@ -0,0 +1,164 @@
+# Benchmark de escalamiento sobre ciudades sintéticas (ver city_generator.py).
+#
+# Ejemplo:
+#   python benchmark.py --tamanos 50 100 200 500 1000 --pasos 200 \
+#       --motores mesa vectorizado particionado --trabajadores 8 --salida benchmark.json
+#
+# Cada caso corre en un proceso nuevo para que la memoria máxima medida sea
+# solo la suya. Con --demanda (archivo JSON, ver trafficBase/demand.py) los coches
+# salen de un generador origen-destino en vez de las esquinas; con --reruteo N los
+# coches eligen camino por tiempo de viaje y las rutas se reparan cada N pasos.
+# Por cada tamaño y motor se mide:
+#   construccion_s         tiempo de construir el modelo (mapa, agentes, rutas)
+#   pasos_por_s            pasos de simulación por segundo
+#   us_por_coche_paso      microsegundos por coche y por paso
+#   memoria_max_mb         memoria residente máxima del proceso
+#   json_ms / binario_ms   tiempo de serializar /getDynamicAgents en cada formato
+#   json_bytes / binario_bytes   tamaño de cada respuesta
+#   coches_al_destino      coches que llegaron (calentamiento incluido)
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from binary_format import codificar_dinamicos
+from city_generator import generar_ciudad
+from trafficBase.model import MOTORES, RandomModel
+
+
+def medir(caso):
+    """Construye la ciudad del caso, la simula y devuelve las mediciones."""
+    mapa = generar_ciudad(
+        caso["tamano"], caso["tamano"], caso["bloque"], caso["edificios"], caso["semaforos"],
+        caso["destinos"], caso["seed"],
+    )
+
+    inicio = time.perf_counter()
+    model = RandomModel(
+        len(mapa[0]), len(mapa), mapa,
+        motor=caso["motor"], periodo_aparicion=caso["periodo_aparicion"], seed=caso["seed"],
+        metricas_capacidad=1, trabajadores=caso["trabajadores"], demanda=caso["demanda"],
+        periodo_reruteo=caso["reruteo"],
+    )
+    construccion = time.perf_counter() - inicio
+
+    # Calentamiento para que haya coches en el grid antes de medir
+    for _ in range(caso["calentamiento"]):
+        model.step()
+
+    coches_paso = 0
+    inicio = time.perf_counter()
+    for _ in range(caso["pasos"]):
+        coches_paso += model._contar_coches()
+        model.step()
+    simulacion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    texto = json.dumps({"step": model.step_counter, "full": True, "dynamicAgents": model.agentes_dinamicos()})
+    json_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    binario = codificar_dinamicos(model)
+    binario_s = time.perf_counter() - inicio
+    model.cerrar()
+
+    return {
+        **caso,
+        "ancho": model.width,
+        "alto": model.height,
+        "semaforos_mapa": len(model.semaforos),
+        "destinos_mapa": len(model.destinos),
+        "coches_final": model._contar_coches(),
+        "coches_al_destino": model.coches_destino,
+        "construccion_s": round(construccion, 4),
+        "pasos_por_s": round(caso["pasos"] / simulacion, 2),
+        "us_por_coche_paso": round(simulacion / coches_paso * 1e6, 3) if coches_paso else None,
+        # ru_maxrss está en KiB en Linux y en bytes en macOS
+        "memoria_max_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                                / (1024 ** 2 if sys.platform == "darwin" else 1024), 1),
+        "json_ms": round(json_s * 1000, 3),
+        "json_bytes": len(texto.encode("utf-8")),
+        "binario_ms": round(binario_s * 1000, 3),
+        "binario_bytes": len(binario),
+    }
+
+
+def casos(tamanos, motores, pasos, calentamiento, bloque, edificios, semaforos, destinos, periodo_aparicion, seed,
+          trabajadores=None, demanda=None, reruteo=None):
+    for tamano in tamanos:
+        for motor in motores:
+            yield {
+                "tamano": tamano,
+                "motor": motor,
+                "pasos": pasos,
+                "calentamiento": calentamiento,
+                "bloque": bloque,
+                "edificios": edificios,
+                "semaforos": semaforos,
+                "destinos": destinos,
+                "periodo_aparicion": periodo_aparicion,
+                "seed": seed,
+                "trabajadores": trabajadores,
+                "demanda": demanda,
+                "reruteo": reruteo,
+            }
+
+
+def benchmark(lista_casos):
+    """Corre cada caso en su propio proceso, uno a la vez para no competir por CPU."""
+    resultados = []
+    for caso in lista_casos:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            resultado = pool.submit(medir, caso).result()
+        print(f"{resultado['tamano']}x{resultado['tamano']} {resultado['motor']}: "
+              f"{resultado['construccion_s']} s construcción, {resultado['pasos_por_s']} pasos/s, "
+              f"{resultado['memoria_max_mb']} MB", flush=True)
+        resultados.append(resultado)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escalamiento de la simulación de tráfico.")
+    parser.add_argument("--tamanos", nargs="+", type=int, default=[50, 100, 200], help="Lado de cada ciudad")
+    parser.add_argument("--motores", nargs="+", choices=MOTORES, default=["mesa", "vectorizado"])
+    parser.add_argument("--pasos", type=int, default=200, help="Pasos medidos por caso")
+    parser.add_argument("--calentamiento", type=int, default=50, help="Pasos previos sin medir")
+    parser.add_argument("--bloque", type=int, default=6, help="Lado de cada manzana")
+    parser.add_argument("--edificios", type=float, default=1.0, help="Fracción de celdas de manzana con edificio")
+    parser.add_argument("--semaforos", type=float, default=0.5, help="Probabilidad de semáforos por cruce")
+    parser.add_argument("--destinos", type=int, default=20)
+    parser.add_argument("--periodo-aparicion", type=int, default=2, help="Pasos entre apariciones de coches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trabajadores", type=int, default=None,
+                        help="Procesos del motor particionado (uno por CPU por defecto)")
+    parser.add_argument("--demanda", default=None, help="Archivo JSON con la configuración de la demanda")
+    parser.add_argument("--reruteo", type=int, default=None, help="Pasos entre reparaciones de rutas (sin reruteo por defecto)")
+    parser.add_argument("--salida", default="benchmark.json", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    demanda = None
+    if args.demanda:
+        with open(args.demanda, encoding="utf-8") as archivo:
+            demanda = json.load(archivo)
+    lista_casos = casos(args.tamanos, args.motores, args.pasos, args.calentamiento, args.bloque, args.edificios,
+                        args.semaforos, args.destinos, args.periodo_aparicion, args.seed, args.trabajadores,
+                        demanda, args.reruteo)
+    resultados = benchmark(lista_casos)
+
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump({
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "procesador": platform.processor(),
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "resultados": resultados,
+        }, archivo, indent=2)
+    print(f"{len(resultados)} casos en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
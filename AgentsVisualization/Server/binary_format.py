@@ -0,0 +1,94 @@
+# Formato binario compacto para los agentes estáticos y dinámicos.
+#
+# Todos los números son little-endian y cada sección empieza en un múltiplo
+# de 4 bytes, así que el cliente puede leerlas con Uint32Array/Uint16Array/
+# Uint8Array sin copiar.
+#
+# Dinámicos ("TRF1"):
+#   encabezado: magic(4) paso(u32) completo(u8) relleno(3)
+#               coches(u32) semaforos(u32) eliminados(u32) bytes_diccionario(u32)
+#   ids de coche         u32[coches]      (número de "Coche-<n>")
+#   posiciones de coche  u16[2 * coches]  (x, y)
+#   destino de coche     u16[coches]      (índice en diccionario.destinos)
+#   índice de semáforo   u16[semaforos]   (índice en diccionario.semaforos)
+#   estado de semáforo   u8[ceil(semaforos / 8)]  (bit k = verde, orden little)
+#   ids eliminados       u32[eliminados]
+#   diccionario          JSON utf-8 opcional: tipos, destinos y semáforos (id, pos, dirección)
+#
+# Estáticos ("TRS1"):
+#   encabezado: magic(4) ancho(u16) alto(u16)
+#   tipo de celda        u8[ancho * alto]  (índice en TIPOS_CELDA, celda = y * ancho + x)
+#   dirección de calle   u8[ancho * alto]  (SIN_DIRECCION si no es calle)
+
+import json
+import struct
+import numpy as np
+from trafficBase.mapcache import TIPOS_CELDA, SIN_DIRECCION
+
+MIME_BINARIO = "application/octet-stream"
+
+_ENCABEZADO_DINAMICO = struct.Struct("<4sIB3xIIII")
+_ENCABEZADO_ESTATICO = struct.Struct("<4sHH")
+
+
+def pide_binario(request):
+    """Indica si el cliente pidió el formato binario (?format=binary o Accept)."""
+    if request.args.get("format") == "binary":
+        return True
+    return request.accept_mimetypes.best == MIME_BINARIO
+
+
+def _alinear(datos):
+    """Rellena con ceros hasta un múltiplo de 4 bytes."""
+    return datos + b"\0" * (-len(datos) % 4)
+
+
+def diccionario(model):
+    """Tabla única de tipos, destinos y semáforos a la que apuntan los índices del formato."""
+    return {
+        "types": ["Coche", "Semaforo"],
+        "destinos": [d.unique_id for d in model.destinos],
+        "semaforos": [
+            {"id": s.unique_id, "pos": list(pos), "direction": s.direction}
+            for pos, s in model.semaforos.items()
+        ],
+    }
+
+
+def codificar_dinamicos(model, since=None, incluir_diccionario=False):
+    """Codifica coches y semáforos (diferencias desde since, o la foto completa)."""
+    ids = None
+    eliminados = ()
+    if since is not None:
+        cambios = model.cambios_desde(since)
+        if cambios is not None:
+            ids, eliminados = cambios
+
+    arreglos = model.arreglos_dinamicos(ids)
+    removidos = np.array(sorted(int(i[len("Coche-"):]) for i in eliminados), dtype=np.uint32)
+    extra = json.dumps(diccionario(model)).encode("utf-8") if incluir_diccionario else b""
+
+    partes = [
+        _ENCABEZADO_DINAMICO.pack(
+            b"TRF1", model.step_counter, ids is None, len(arreglos["coche_ids"]),
+            len(arreglos["semaforo_indices"]), len(removidos), len(extra),
+        ),
+        arreglos["coche_ids"].astype("<u4").tobytes(),
+        _alinear(arreglos["coche_pos"].astype("<u2").tobytes()),
+        _alinear(arreglos["coche_destinos"].astype("<u2").tobytes()),
+        _alinear(arreglos["semaforo_indices"].astype("<u2").tobytes()),
+        _alinear(np.packbits(arreglos["semaforo_verde"], bitorder="little").tobytes()),
+        removidos.astype("<u4").tobytes(),
+        extra,
+    ]
+    return b"".join(partes)
+
+
+def codificar_estaticos(model):
+    """Codifica el mapa como arreglos de tipo de celda y dirección de calle."""
+    compilado = model.mapa_compilado
+    return b"".join([
+        _ENCABEZADO_ESTATICO.pack(b"TRS1", compilado.width, compilado.height),
+        _alinear(compilado.tipos.tobytes()),
+        _alinear(compilado.direcciones.tobytes()),
+    ])
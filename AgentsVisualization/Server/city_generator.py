@@ -0,0 +1,124 @@
+# Generador de ciudades sintéticas con el mismo formato de caracteres que los mapas del proyecto.
+#
+#   >  <  ^  v   calles (derecha, izquierda, arriba, abajo)
+#   d  i  A  B   semáforos sobre calles >, <, ^, v
+#   #            edificio
+#   D            destino
+#   (espacio)    celda vacía dentro de una manzana
+#
+# La ciudad es una cuadrícula de manzanas separadas por calles de dos carriles
+# de un solo sentido. El borde es un anillo (abajo >, derecha ^, arriba <,
+# izquierda v) y las calles interiores alternan su sentido, así que desde
+# cualquier calle se puede llegar a cualquier otra. Los cruces toman el sentido
+# de la calle horizontal, que no impide cruzarlos en vertical.
+
+import argparse
+import random
+
+CALLE = {0: "^", 1: ">", 2: "v", 3: "<"}
+SEMAFORO = {0: "A", 1: "d", 2: "B", 3: "i"}
+
+
+def _posiciones_calles(largo, paso):
+    """Primera celda de cada calle de dos carriles; siempre hay una en cada borde."""
+    posiciones = list(range(0, largo - 2, paso))
+    if largo - 2 - posiciones[-1] < 3:
+        posiciones.pop()  # La última manzana quedaría demasiado angosta
+    posiciones.append(largo - 2)
+    return posiciones
+
+
+def generar_ciudad(ancho, alto, tamano_bloque=6, densidad_edificios=1.0, densidad_semaforos=0.5,
+                   destinos=10, seed=None):
+    """Devuelve la ciudad como lista de filas (la primera fila es la de arriba).
+
+    tamano_bloque es el lado de cada manzana, densidad_edificios la fracción de
+    celdas de manzana con edificio, densidad_semaforos la probabilidad de poner
+    semáforos en cada acceso a un cruce y destinos cuántos destinos colocar.
+    """
+    if ancho < 8 or alto < 8 or tamano_bloque < 1:
+        raise ValueError("La ciudad debe medir al menos 8x8 y las manzanas al menos 1.")
+    aleatorio = random.Random(seed)
+    paso = tamano_bloque + 2
+
+    # Celdas en coordenadas del modelo: y = 0 es la fila de abajo
+    celdas = [[" " if aleatorio.random() >= densidad_edificios else "#" for _ in range(ancho)] for _ in range(alto)]
+    direccion = {}
+
+    columnas = _posiciones_calles(ancho, paso)
+    filas = _posiciones_calles(alto, paso)
+
+    # Calles verticales: izquierda baja, derecha sube, las interiores alternan
+    verticales = {}
+    for k, x0 in enumerate(columnas):
+        sentido = 2 if k % 2 == 0 else 0
+        if k == len(columnas) - 1:
+            sentido = 0
+        for x in (x0, x0 + 1):
+            verticales[x] = sentido
+            for y in range(alto):
+                direccion[(x, y)] = sentido
+
+    # Calles horizontales (pisan los cruces): abajo a la derecha, arriba a la izquierda
+    horizontales = {}
+    for k, y0 in enumerate(filas):
+        sentido = 1 if k % 2 == 0 else 3
+        if k == len(filas) - 1:
+            sentido = 3
+        for y in (y0, y0 + 1):
+            horizontales[y] = sentido
+            for x in range(ancho):
+                direccion[(x, y)] = sentido
+
+    for (x, y), sentido in direccion.items():
+        celdas[y][x] = CALLE[sentido]
+
+    # Semáforos en los accesos a cada cruce
+    for x0 in columnas:
+        for y0 in filas:
+            if aleatorio.random() >= densidad_semaforos:
+                continue
+            sentido_h = horizontales[y0]
+            sentido_v = verticales[x0]
+            xs = x0 - 1 if sentido_h == 1 else x0 + 2  # Celda antes del cruce en la calle horizontal
+            ys = y0 - 1 if sentido_v == 0 else y0 + 2  # Celda antes del cruce en la calle vertical
+            if 0 <= xs < ancho and xs not in verticales:
+                for y in (y0, y0 + 1):
+                    celdas[y][xs] = SEMAFORO[sentido_h]
+            if 0 <= ys < alto and ys not in horizontales:
+                for x in (x0, x0 + 1):
+                    celdas[ys][x] = SEMAFORO[sentido_v]
+
+    # Destinos en edificios pegados a una calle
+    candidatos = []
+    for y in range(alto):
+        for x in range(ancho):
+            if (x, y) in direccion:
+                continue
+            vecinos = ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+            if any(v in direccion for v in vecinos):
+                candidatos.append((x, y))
+    for x, y in aleatorio.sample(candidatos, min(destinos, len(candidatos))):
+        celdas[y][x] = "D"
+
+    return ["".join(fila) for fila in reversed(celdas)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una ciudad sintética.")
+    parser.add_argument("ancho", type=int)
+    parser.add_argument("alto", type=int)
+    parser.add_argument("--bloque", type=int, default=6, help="Lado de cada manzana")
+    parser.add_argument("--edificios", type=float, default=1.0, help="Fracción de celdas de manzana con edificio")
+    parser.add_argument("--semaforos", type=float, default=0.5, help="Probabilidad de semáforos por cruce")
+    parser.add_argument("--destinos", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    ciudad = generar_ciudad(args.ancho, args.alto, args.bloque, args.edificios, args.semaforos,
+                            args.destinos, args.seed)
+    print("\n".join(ciudad))
+
+
+if __name__ == "__main__":
+    main()
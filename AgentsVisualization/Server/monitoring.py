@@ -0,0 +1,193 @@
+# Métricas del servidor en formato de texto de Prometheus y muestreo de perfiles.
+#
+# /metrics expone:
+#   traffic_http_request_duration_seconds   histograma por endpoint y método
+#   traffic_http_response_bytes             histograma de tamaño de respuesta por endpoint
+#   traffic_http_requests_total             solicitudes por endpoint, método y código
+#   traffic_sessions                        sesiones activas
+#   traffic_session_busy                    1 si la sesión estaba ocupada (sin sus métricas en esta lectura)
+#   traffic_session_step / _cars            paso y coches de cada sesión
+#   traffic_session_queued_cars             coches esperando en las colas de la demanda
+#   traffic_session_dropped_cars_total      pedidos descartados con la cola llena
+#   traffic_step_phase_seconds_total        tiempo por fase del paso (sesiones con perfil, ver PerfilPasos)
+#   traffic_step_phase_calls_total          veces que se ejecutó cada fase
+#   traffic_agent_step_seconds_total        tiempo de la fase de cada tipo de agente
+#   traffic_agent_steps_total               agentes procesados por tipo (costo = segundos / agentes)
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Segundos que /metrics espera el candado de cada sesión; una sesión ocupada
+# (por ejemplo en un /fastforward largo) se reporta como ocupada y no detiene la lectura
+ESPERA_CANDADO = 0.05
+
+# Fase del paso -> tipo de agente que procesa
+FASES_AGENTE = {"coches": "Coche", "semaforos": "Semaforo"}
+
+
+def _etiquetas(**valores):
+    """Formatea etiquetas de Prometheus escapando los valores."""
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+class Histograma:
+    """ Histograma acumulado con buckets fijos (como los de Prometheus). """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.cuentas = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre, **etiquetas):
+        acumulado = 0
+        for limite, cuenta in zip(self.buckets + ("+Inf",), self.cuentas):
+            acumulado += cuenta
+            yield f"{nombre}_bucket{_etiquetas(**etiquetas, le=limite)} {acumulado}"
+        yield f"{nombre}_sum{_etiquetas(**etiquetas)} {self.suma}"
+        yield f"{nombre}_count{_etiquetas(**etiquetas)} {self.total}"
+
+
+class MetricasServidor:
+    """ Latencia, tamaño de respuesta y conteo de solicitudes por endpoint. """
+    def __init__(self):
+        self.latencias = {}  # (endpoint, método) -> Histograma
+        self.tamanos = {}  # endpoint -> Histograma
+        self.solicitudes = Counter()  # (endpoint, método, código) -> cuenta
+        self.lock = threading.Lock()
+
+    def observar(self, endpoint, metodo, codigo, segundos, tamano=None):
+        with self.lock:
+            latencia = self.latencias.get((endpoint, metodo))
+            if latencia is None:
+                latencia = self.latencias[(endpoint, metodo)] = Histograma(BUCKETS_LATENCIA)
+            latencia.observar(segundos)
+            if tamano is not None:
+                histograma = self.tamanos.get(endpoint)
+                if histograma is None:
+                    histograma = self.tamanos[endpoint] = Histograma(BUCKETS_BYTES)
+                histograma.observar(tamano)
+            self.solicitudes[(endpoint, metodo, codigo)] += 1
+
+    def texto(self, sesiones):
+        """Todas las métricas en formato de texto de Prometheus.
+
+        sesiones es una lista de Sesion ya copiada del registro (RegistroSesiones.todas);
+        cada modelo se lee con el candado de su sesión tomado. Si no se consigue
+        en ESPERA_CANDADO segundos la sesión sólo aparece en traffic_session_busy.
+        """
+        lineas = []
+        with self.lock:
+            lineas.append("# TYPE traffic_http_request_duration_seconds histogram")
+            for (endpoint, metodo), histograma in sorted(self.latencias.items()):
+                lineas.extend(histograma.lineas("traffic_http_request_duration_seconds",
+                                                endpoint=endpoint, method=metodo))
+            lineas.append("# TYPE traffic_http_response_bytes histogram")
+            for endpoint, histograma in sorted(self.tamanos.items()):
+                lineas.extend(histograma.lineas("traffic_http_response_bytes", endpoint=endpoint))
+            lineas.append("# TYPE traffic_http_requests_total counter")
+            for (endpoint, metodo, codigo), cuenta in sorted(self.solicitudes.items()):
+                lineas.append(f"traffic_http_requests_total{_etiquetas(endpoint=endpoint, method=metodo, code=codigo)} {cuenta}")
+
+        lineas.append("# TYPE traffic_sessions gauge")
+        lineas.append(f"traffic_sessions {len(sesiones)}")
+        por_tipo = {
+            "traffic_session_busy": ("gauge", []),
+            "traffic_session_step": ("gauge", []),
+            "traffic_session_cars": ("gauge", []),
+            "traffic_session_queued_cars": ("gauge", []),
+            "traffic_session_dropped_cars_total": ("counter", []),
+            "traffic_step_phase_seconds_total": ("counter", []),
+            "traffic_step_phase_calls_total": ("counter", []),
+            "traffic_agent_step_seconds_total": ("counter", []),
+            "traffic_agent_steps_total": ("counter", []),
+        }
+        for sesion in sesiones:
+            # Copia de los valores con el candado de la sesión: el modelo puede estar avanzando en otro hilo
+            ocupada = not sesion.lock.acquire(timeout=ESPERA_CANDADO)
+            por_tipo["traffic_session_busy"][1].append(f"{_etiquetas(session=sesion.id)} {int(ocupada)}")
+            if ocupada:
+                continue
+            try:
+                model = sesion.model
+                paso, coches = model.step_counter, model._contar_coches()
+                demanda = (model.demanda.en_espera, model.demanda.descartados) if model.demanda is not None else None
+                fases = ([(fase, tuple(valores)) for fase, valores in sorted(model.perfil.fases.items())]
+                         if model.perfil is not None else [])
+            finally:
+                sesion.lock.release()
+            por_tipo["traffic_session_step"][1].append(f"{_etiquetas(session=sesion.id)} {paso}")
+            por_tipo["traffic_session_cars"][1].append(f"{_etiquetas(session=sesion.id)} {coches}")
+            if demanda is not None:
+                por_tipo["traffic_session_queued_cars"][1].append(f"{_etiquetas(session=sesion.id)} {demanda[0]}")
+                por_tipo["traffic_session_dropped_cars_total"][1].append(f"{_etiquetas(session=sesion.id)} {demanda[1]}")
+            for fase, (llamadas, segundos, agentes) in fases:
+                etiquetas = _etiquetas(session=sesion.id, phase=fase)
+                por_tipo["traffic_step_phase_seconds_total"][1].append(f"{etiquetas} {segundos}")
+                por_tipo["traffic_step_phase_calls_total"][1].append(f"{etiquetas} {llamadas}")
+                if fase in FASES_AGENTE:
+                    etiquetas = _etiquetas(session=sesion.id, type=FASES_AGENTE[fase])
+                    por_tipo["traffic_agent_step_seconds_total"][1].append(f"{etiquetas} {segundos}")
+                    por_tipo["traffic_agent_steps_total"][1].append(f"{etiquetas} {agentes}")
+        for nombre, (tipo, valores) in por_tipo.items():
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            lineas.extend(f"{nombre}{valor}" for valor in valores)
+        return "\n".join(lineas) + "\n"
+
+
+class Muestreador:
+    """ Perfilador por muestreo de una sesión.
+
+    Cada intervalo segundos mira la pila del hilo que está dentro de
+    model.step() (perfil.hilo) y cuenta la pila en formato "colapsado"
+    (funciones separadas por ";"), que leen flamegraph.pl y speedscope.
+    """
+    def __init__(self, perfil, intervalo=0.005):
+        self.perfil = perfil
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.muestras = 0
+        self._detenido = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._ciclo, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detenido.set()
+        if self._hilo is not None and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=1)
+
+    def _ciclo(self):
+        while not self._detenido.wait(self.intervalo):
+            hilo = self.perfil.hilo
+            if hilo is None:
+                continue
+            frame = sys._current_frames().get(hilo)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                frame = frame.f_back
+            self.pilas[";".join(reversed(pila))] += 1
+            self.muestras += 1
+
+    def texto(self):
+        """Pilas colapsadas: una línea "pila cuenta" por pila, de la más frecuente a la menos."""
+        return "".join(f"{pila} {cuenta}\n" for pila, cuenta in self.pilas.most_common())
@@ -0,0 +1,133 @@
+# Registro de simulaciones independientes dentro de un mismo proceso.
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from trafficBase.profiling import PerfilPasos
+
+# Estimación de memoria usada para decidir desalojos (bytes)
+BYTES_POR_CELDA = 128  # Lista del grid, ocupación y tablas del mapa compilado
+BYTES_POR_COCHE = 2048  # Agente, historial y entradas en los diccionarios del modelo
+
+
+class Sesion:
+    """ Una simulación con su propio candado, contador de pasos y transmisión.
+
+    Con perfil=True el modelo mide el tiempo de cada fase del paso (ver
+    /metrics); sin él step() no paga ese costo.
+    """
+    def __init__(self, session_id, model, perfil=False):
+        self.id = session_id
+        self.model = model
+        self.lock = threading.Lock()  # Acceso exclusivo al modelo
+        self.current_step = 0
+        self.transmisor = None  # Transmisión de frames (ver /stream)
+        self.muestreador = None  # Perfilador por muestreo (ver /profile)
+        self.ultimo_uso = time.monotonic()
+        self.cerrada = False
+        if perfil:
+            model.perfil = PerfilPasos()  # Tiempo por fase del paso (ver /metrics)
+
+    def memoria_estimada(self):
+        return (self.model.width * self.model.height * BYTES_POR_CELDA
+                + self.model._contar_coches() * BYTES_POR_COCHE)
+
+    def cerrar(self):
+        """Detiene la transmisión y el perfilador y libera el modelo.
+
+        Se llama desde el hilo de otra solicitud (al desalojar), así que el
+        modelo se cierra con el candado tomado para no hacerlo a mitad de un
+        paso. La transmisión se detiene antes: su hilo necesita el candado.
+        """
+        transmisor = self.transmisor
+        if transmisor is not None:
+            transmisor.detener()
+        muestreador = self.muestreador
+        if muestreador is not None:
+            muestreador.detener()
+        with self.lock:
+            self.cerrada = True
+            if self.transmisor is not None:
+                self.transmisor.detener(esperar=False)  # Una transmisión iniciada mientras tanto
+            self.transmisor = None
+            self.muestreador = None
+            self.model.cerrar()
+
+
+class RegistroSesiones:
+    """ Sesiones por id con desalojo LRU.
+
+    Se desalojan las sesiones que llevan más de max_inactividad segundos sin
+    usarse y, empezando por la menos usada recientemente, las que excedan
+    max_sesiones o el límite de memoria estimada. La sesión que se acaba de
+    usar nunca se desaloja. Las sesiones viven en memoria del proceso: con
+    varios workers hay que enrutar cada sesión siempre al mismo worker.
+    """
+    def __init__(self, max_sesiones=16, max_inactividad=30 * 60, memoria_max=2 * 1024 ** 3):
+        self.max_sesiones = max_sesiones
+        self.max_inactividad = max_inactividad
+        self.memoria_max = memoria_max
+        self.sesiones = OrderedDict()
+        self.lock = threading.Lock()
+
+    def todas(self):
+        """Lista de las sesiones actuales (sin marcarlas como usadas)."""
+        with self.lock:
+            return list(self.sesiones.values())
+
+    def nuevo_id(self):
+        return uuid.uuid4().hex
+
+    def guardar(self, session_id, model, perfil=False):
+        """Crea (o reemplaza) la sesión session_id con el modelo dado."""
+        sesion = Sesion(session_id, model, perfil)
+        with self.lock:
+            anterior = self.sesiones.pop(session_id, None)
+            self.sesiones[session_id] = sesion
+            desalojadas = self._desalojar(session_id)
+        if anterior is not None:
+            desalojadas.append(anterior)
+        for vieja in desalojadas:
+            vieja.cerrar()
+        return sesion
+
+    def obtener(self, session_id):
+        """Devuelve la sesión y la marca como usada, o None si no existe."""
+        with self.lock:
+            sesion = self.sesiones.get(session_id)
+            if sesion is None:
+                return None
+            sesion.ultimo_uso = time.monotonic()
+            self.sesiones.move_to_end(session_id)
+            desalojadas = self._desalojar(session_id)
+        for vieja in desalojadas:
+            vieja.cerrar()
+        return sesion
+
+    def eliminar(self, session_id):
+        with self.lock:
+            sesion = self.sesiones.pop(session_id, None)
+        if sesion is not None:
+            sesion.cerrar()
+        return sesion is not None
+
+    def _desalojar(self, conservar):
+        """Quita sesiones inactivas o sobrantes (se llama con self.lock tomado)."""
+        ahora = time.monotonic()
+        desalojadas = []
+        for session_id in list(self.sesiones):
+            sesion = self.sesiones[session_id]
+            if session_id != conservar and ahora - sesion.ultimo_uso > self.max_inactividad:
+                desalojadas.append(self.sesiones.pop(session_id))
+
+        memoria = sum(s.memoria_estimada() for s in self.sesiones.values())
+        for session_id in list(self.sesiones):
+            if len(self.sesiones) <= self.max_sesiones and memoria <= self.memoria_max:
+                break
+            if session_id == conservar:
+                continue
+            sesion = self.sesiones.pop(session_id)
+            memoria -= sesion.memoria_estimada()
+            desalojadas.append(sesion)
+        return desalojadas
@@ -0,0 +1,162 @@
+# Transmisión de la simulación a varios clientes sin que ellos la avancen.
+
+import threading
+import time
+from collections import deque
+
+# Lo que devuelve Suscripcion.siguiente cuando la transmisión terminó
+FIN = object()
+
+
+class Suscripcion:
+    """ Cola acotada de frames para un cliente.
+
+    Si el cliente no alcanza a leer, los frames más viejos se descartan y en
+    la siguiente lectura recibe un solo frame con todos los cambios desde el
+    último paso que sí vio (o la foto completa si ya no hay registro). Cuando
+    el transmisor se detiene (o su sesión se cierra) la suscripción termina:
+    el cliente recibe los frames pendientes y después FIN.
+    """
+    def __init__(self, transmisor, max_pendientes):
+        self.transmisor = transmisor
+        self.frames = deque()
+        self.max_pendientes = max_pendientes
+        self.ultimo_paso = None  # Último paso entregado al cliente
+        self.atrasado = False  # Se descartaron frames desde la última lectura
+        self.terminada = False
+        self.condicion = threading.Condition()
+
+    def publicar(self, frame):
+        with self.condicion:
+            if len(self.frames) >= self.max_pendientes:
+                self.frames.clear()
+                self.atrasado = True
+            self.frames.append(frame)
+            self.condicion.notify()
+
+    def terminar(self):
+        """Marca que ya no van a llegar frames y despierta al cliente que espera."""
+        with self.condicion:
+            self.terminada = True
+            self.condicion.notify_all()
+
+    def siguiente(self, timeout=None):
+        """Devuelve el siguiente frame, None si no llegó ninguno antes del timeout o FIN si la transmisión terminó."""
+        while True:
+            with self.condicion:
+                if not self.frames:
+                    if not self.condicion.wait_for(lambda: self.frames or self.terminada, timeout):
+                        return None
+                    if not self.frames:
+                        return FIN
+                frame = self.frames.popleft()
+                atrasado = self.atrasado
+                self.atrasado = False
+                if atrasado:
+                    self.frames.clear()
+
+            if atrasado:
+                # Juntar los frames perdidos en uno solo a partir del registro de cambios del modelo
+                frame = self.transmisor.frame_desde(self.ultimo_paso)
+            if self.ultimo_paso is not None and frame["step"] <= self.ultimo_paso:
+                continue  # Ya incluido en un frame anterior
+            self.ultimo_paso = frame["step"]
+            return frame
+
+    def cerrar(self):
+        self.transmisor.desuscribir(self)
+
+
+class Transmisor:
+    """ Avanza un modelo en un hilo a un ritmo fijo y reparte cada paso a los suscriptores.
+
+    generar_frame(model, since) arma el frame a enviar (ver estado_dinamico en
+    agents_server.py); se llama una vez por paso para todos los clientes y el
+    acceso al modelo se protege con lock. al_avanzar, si se da, se llama sin
+    argumentos (con lock tomado) después de cada paso. Al detenerse terminan
+    todas las suscripciones; un transmisor detenido no se vuelve a iniciar.
+    Quien tiene lock tomado sólo puede detenerlo con esperar=False: el hilo
+    necesita lock para terminar el paso en curso (y ya no avanza otro).
+    """
+    def __init__(self, model, lock, generar_frame, pasos_por_segundo=10, max_pendientes=8, al_avanzar=None):
+        self.model = model
+        self.lock = lock
+        self.generar_frame = generar_frame
+        self.al_avanzar = al_avanzar
+        self.pasos_por_segundo = pasos_por_segundo
+        self.max_pendientes = max_pendientes
+        self.suscripciones = []
+        self._suscripciones_lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._terminado = False
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        if self.activo or self._terminado:
+            return
+        self._hilo = threading.Thread(target=self._ciclo, daemon=True)
+        self._hilo.start()
+
+    def detener(self, esperar=True):
+        """Detiene la transmisión; con esperar espera a que termine el hilo."""
+        self._detener.set()
+        if esperar and self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        with self._suscripciones_lock:
+            self._terminado = True
+            suscripciones = self.suscripciones
+            self.suscripciones = []
+        for suscripcion in suscripciones:
+            suscripcion.terminar()
+
+    def suscribir(self):
+        suscripcion = Suscripcion(self, self.max_pendientes)
+        with self.lock:
+            # El primer frame de cada cliente es la foto completa
+            suscripcion.frames.append(self.generar_frame(self.model, None))
+            with self._suscripciones_lock:
+                if self._terminado:
+                    suscripcion.terminada = True
+                else:
+                    self.suscripciones.append(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._suscripciones_lock:
+            if suscripcion in self.suscripciones:
+                self.suscripciones.remove(suscripcion)
+
+    def frame_desde(self, paso):
+        with self.lock:
+            return self.generar_frame(self.model, paso)
+
+    def avanzar(self):
+        """Avanza un paso y lo publica a todos los suscriptores."""
+        with self.lock:
+            if self._detener.is_set():
+                return  # Se detuvo mientras esperaba el candado
+            self.model.step()
+            if self.al_avanzar is not None:
+                self.al_avanzar()
+            frame = self.generar_frame(self.model, self.model.step_counter - 1)
+        with self._suscripciones_lock:
+            suscripciones = list(self.suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.publicar(frame)
+
+    def _ciclo(self):
+        periodo = 1.0 / self.pasos_por_segundo
+        siguiente = time.monotonic()
+        while not self._detener.is_set():
+            self.avanzar()
+            siguiente += periodo
+            espera = siguiente - time.monotonic()
+            if espera > 0:
+                self._detener.wait(espera)
+            else:
+                siguiente = time.monotonic()  # No acumular atraso
@@ -0,0 +1,165 @@
+# Barrido de parámetros sin interfaz: corre muchas simulaciones en paralelo.
+#
+# Ejemplo:
+#   python sweep.py --mapas mapa.txt --periodos 5 10 --intervalos 5 10 15 \
+#       --semillas 1 2 3 --pasos 2000 --procesos 8 --salida resultados.csv
+#
+# Cada corrida agrega una fila a --salida en cuanto termina. Si el barrido se
+# interrumpe, volver a ejecutar el mismo comando salta las corridas que ya
+# están en el archivo (el mapa cuenta por su contenido: si el archivo cambia,
+# sus corridas se repiten). Las corridas que fallan se reportan al final y no
+# se escriben, así que se reintentan en la siguiente ejecución. Con --metricas DIR además se exportan las métricas de
+# cada paso de cada corrida a DIR/<run_id>.csv (por bloques, sin guardarlas en memoria).
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from trafficBase.model import RandomModel
+
+COLUMNAS = [
+    "run_id", "mapa", "periodo_aparicion", "intervalo_semaforo", "seed", "max_pasos", "motor",
+    "pasos_simulacion", "coches_creados", "coches_al_destino", "accidentes", "coches_en_el_grid",
+    "promedio_pasos", "segundos",
+]
+
+
+def cargar_mapa(ruta):
+    """Lee un mapa de texto (una fila por línea) y descarta líneas vacías."""
+    with open(ruta, encoding="utf-8") as archivo:
+        return [linea.rstrip("\r\n") for linea in archivo if linea.strip()]
+
+
+def huella_mapa(ruta):
+    """Hash del contenido de un archivo de mapa."""
+    with open(ruta, "rb") as archivo:
+        return hashlib.sha1(archivo.read()).hexdigest()
+
+
+def id_corrida(config, huellas=None):
+    """Id estable de una configuración, usado para reanudar barridos.
+
+    El mapa entra por el hash de su contenido, no por su ruta. huellas es un
+    diccionario ruta -> hash para no leer el mismo archivo varias veces.
+    """
+    if huellas is None:
+        huellas = {}
+    if config["mapa"] not in huellas:
+        huellas[config["mapa"]] = huella_mapa(config["mapa"])
+    texto = json.dumps(dict(config, mapa=huellas[config["mapa"]]), sort_keys=True)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def configuraciones(mapas, periodos, intervalos, semillas, max_pasos, motor="mesa"):
+    """Producto cartesiano de los parámetros del barrido."""
+    for mapa, periodo, intervalo, seed in itertools.product(mapas, periodos, intervalos, semillas):
+        yield {
+            "mapa": mapa,
+            "periodo_aparicion": periodo,
+            "intervalo_semaforo": intervalo,
+            "seed": seed,
+            "max_pasos": max_pasos,
+            "motor": motor,
+        }
+
+
+def correr(config, run_id=None, metricas=None):
+    """Corre una simulación hasta max_pasos (o hasta que el modelo se detenga).
+
+    Con metricas (un directorio) las métricas de cada paso se exportan a metricas/<run_id>.csv.
+    """
+    if run_id is None:
+        run_id = id_corrida(config)
+    mapa = cargar_mapa(config["mapa"])
+    inicio = time.perf_counter()
+    model = RandomModel(
+        len(mapa[0]), len(mapa), mapa,
+        motor=config["motor"],
+        periodo_aparicion=config["periodo_aparicion"],
+        intervalo_semaforo=config["intervalo_semaforo"],
+        seed=config["seed"],
+        metricas_capacidad=1000 if metricas else 1,
+        exportar_metricas=os.path.join(metricas, f"{run_id}.csv") if metricas else None,
+    )
+    while model.running and model.step_counter < config["max_pasos"]:
+        model.step()
+    model.cerrar()
+
+    fila = {"run_id": run_id, **config, **model.get_stats()}
+    fila["promedio_pasos"] = model._calcular_promedio_pasos()
+    fila["segundos"] = round(time.perf_counter() - inicio, 3)
+    return fila
+
+
+def corridas_hechas(salida):
+    """Ids de las corridas que ya están en el archivo de resultados."""
+    if not os.path.exists(salida):
+        return set()
+    with open(salida, newline="", encoding="utf-8") as archivo:
+        return {fila["run_id"] for fila in csv.DictReader(archivo)}
+
+
+def barrido(configs, salida, procesos=None, metricas=None):
+    """Corre las configuraciones pendientes en un pool de procesos y agrega cada resultado a salida.
+
+    Devuelve (corridas pendientes, run_id de las que fallaron).
+    """
+    hechas = corridas_hechas(salida)
+    huellas = {}
+    pendientes = [(id_corrida(c, huellas), c) for c in configs]
+    pendientes = [(run_id, c) for run_id, c in pendientes if run_id not in hechas]
+    fallidas = []
+
+    nuevo = not os.path.exists(salida)
+    with open(salida, "a", newline="", encoding="utf-8") as archivo:
+        escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS)
+        if nuevo:
+            escritor.writeheader()
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = {pool.submit(correr, config, run_id, metricas): run_id for run_id, config in pendientes}
+            for k, futuro in enumerate(as_completed(futuros), start=1):
+                try:
+                    fila = futuro.result()
+                except Exception as error:
+                    # Una corrida que falla no detiene las demás ni se pierde su resultado
+                    fallidas.append(futuros[futuro])
+                    print(f"Falló la corrida {futuros[futuro]}: {error!r}", file=sys.stderr, flush=True)
+                    continue
+                escritor.writerow(fila)
+                archivo.flush()  # Cada corrida queda guardada aunque se interrumpa el barrido
+                print(f"{k}/{len(pendientes)} corridas terminadas", flush=True)
+
+    return len(pendientes), fallidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de parámetros de la simulación de tráfico.")
+    parser.add_argument("--mapas", nargs="+", required=True, help="Archivos de mapa")
+    parser.add_argument("--periodos", nargs="+", type=int, default=[10], help="Pasos entre apariciones de coches")
+    parser.add_argument("--intervalos", nargs="+", type=int, default=[5], help="Intervalos de cambio de semáforo")
+    parser.add_argument("--semillas", nargs="+", type=int, default=[0], help="Semillas aleatorias")
+    parser.add_argument("--pasos", type=int, default=1000, help="Pasos máximos por corrida")
+    parser.add_argument("--motor", choices=["mesa", "vectorizado"], default="mesa")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (todos los núcleos por defecto)")
+    parser.add_argument("--salida", default="resultados.csv", help="Archivo CSV de resultados")
+    parser.add_argument("--metricas", default=None, help="Directorio donde exportar las métricas de cada paso")
+    args = parser.parse_args()
+    if args.metricas:
+        os.makedirs(args.metricas, exist_ok=True)
+
+    configs = configuraciones(args.mapas, args.periodos, args.intervalos, args.semillas, args.pasos, args.motor)
+    corridas, fallidas = barrido(configs, args.salida, args.procesos, args.metricas)
+    print(f"{corridas - len(fallidas)} corridas nuevas en {args.salida}")
+    if fallidas:
+        print(f"{len(fallidas)} corridas fallaron: {' '.join(fallidas)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Las pruebas importan los módulos del servidor (trafficBase, sessions, ...) como se corren desde aquí
+SERVIDOR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVIDOR)
+
+MAPA_BASE = os.path.join(SERVIDOR, "static", "city_files", "2021_base.txt")
+# Mapa del cliente web (el de visualization/random_agents.js)
+MAPA_CLIENTE = os.path.join(SERVIDOR, "static", "city_files", "cliente.txt")
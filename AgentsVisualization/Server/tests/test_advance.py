@@ -0,0 +1,46 @@
+import pytest
+import agents_server
+from conftest import MAPA_CLIENTE
+from sweep import cargar_mapa
+
+
+@pytest.fixture
+def cliente():
+    cliente = agents_server.app.test_client()
+    datos = {"mapa": cargar_mapa(MAPA_CLIENTE), "motor": "vectorizado"}
+    assert cliente.post("/init?session=advance", json=datos).status_code == 200
+    yield cliente
+    cliente.delete("/session?session=advance")
+
+
+def por_id(agentes):
+    return {agente["id"]: agente for agente in agentes}
+
+
+def test_frames_traen_los_cambios_de_cada_paso(cliente):
+    cliente.get("/advance?session=advance&steps=20")
+    estado = por_id(cliente.get("/getDynamicAgents?session=advance").get_json()["dynamicAgents"])
+
+    respuesta = cliente.get("/advance?session=advance&steps=10&since=20&frames=1").get_json()
+    assert respuesta["currentStep"] == 30 and respuesta["step"] == 30 and not respuesta["full"]
+    assert [frame["step"] for frame in respuesta["frames"]] == list(range(21, 31))
+    for frame in respuesta["frames"]:  # Cada frame es la diferencia contra el anterior
+        assert not frame["full"]
+        for eliminado in frame["removed"]:
+            estado.pop(eliminado, None)
+        estado.update(por_id(frame["dynamicAgents"]))
+    completo = cliente.get("/getDynamicAgents?session=advance").get_json()
+    assert estado == por_id(completo["dynamicAgents"])
+
+
+def test_sin_frames_no_hay_pasos_intermedios(cliente):
+    respuesta = cliente.get("/advance?session=advance&steps=3").get_json()
+    assert "frames" not in respuesta
+    assert respuesta["full"] and respuesta["currentStep"] == 3
+
+
+@pytest.mark.parametrize("steps", [0, agents_server.MAX_PASOS_POR_SOLICITUD + 1])
+def test_steps_fuera_de_rango_responde_400(cliente, steps):
+    respuesta = cliente.get(f"/advance?session=advance&steps={steps}&frames=1")
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["error"].startswith("steps")
@@ -0,0 +1,88 @@
+import json
+import struct
+import numpy as np
+import pytest
+import agents_server
+from binary_format import codificar_dinamicos, codificar_estaticos
+from conftest import MAPA_CLIENTE
+from sweep import cargar_mapa
+from trafficBase.mapcache import TIPOS_CELDA
+from trafficBase.model import RandomModel
+
+
+def leer_dinamicos(datos):
+    """Decodifica un bloque "TRF1" como lo hace el cliente: cada sección con un arreglo tipado sin copiar."""
+    magic, paso, completo, coches, semaforos, eliminados, bytes_diccionario = struct.unpack_from("<4sIB3xIIII", datos)
+    assert magic == b"TRF1"
+    secciones = [("coche_ids", "<u4", coches), ("coche_pos", "<u2", 2 * coches), ("coche_destinos", "<u2", coches),
+                 ("semaforo_indices", "<u2", semaforos), ("semaforo_verde", "u1", (semaforos + 7) // 8),
+                 ("eliminados", "<u4", eliminados)]
+    leido = {"paso": paso, "completo": bool(completo)}
+    inicio = struct.calcsize("<4sIB3xIIII")
+    for nombre, tipo, cantidad in secciones:
+        assert inicio % 4 == 0, nombre
+        leido[nombre] = np.frombuffer(datos, dtype=tipo, count=cantidad, offset=inicio)
+        inicio += -(-leido[nombre].nbytes // 4) * 4
+    assert inicio % 4 == 0 and len(datos) == inicio + bytes_diccionario
+    leido["diccionario"] = json.loads(datos[inicio:]) if bytes_diccionario else None
+    return leido
+
+
+def agentes(leido, diccionario):
+    """Reconstruye los diccionarios de /getDynamicAgents?historial=0 a partir de un bloque decodificado."""
+    resultado = {}
+    for numero, (x, y), destino in zip(leido["coche_ids"].tolist(), leido["coche_pos"].reshape(-1, 2).tolist(),
+                                       leido["coche_destinos"].tolist()):
+        resultado[f"Coche-{numero}"] = {"id": f"Coche-{numero}", "type": "Coche", "pos": [x, y],
+                                        "destination": diccionario["destinos"][destino]}
+    verde = np.unpackbits(leido["semaforo_verde"], bitorder="little")
+    for k, indice in enumerate(leido["semaforo_indices"].tolist()):
+        semaforo = diccionario["semaforos"][indice]
+        resultado[semaforo["id"]] = {"id": semaforo["id"], "type": "Semaforo", "pos": semaforo["pos"],
+                                     "state": bool(verde[k]), "direction": semaforo["direction"]}
+    return resultado
+
+
+def json_por_id(model, since=None):
+    respuesta = json.loads(json.dumps(agents_server.estado_dinamico(model, since, historial=False)))
+    return {agente["id"]: agente for agente in respuesta["dynamicAgents"]}, respuesta
+
+
+@pytest.mark.parametrize("motor", ["mesa", "vectorizado"])
+def test_dinamicos_ida_y_vuelta(motor):
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=5)
+    for _ in range(40):
+        model.step()
+
+    completo = leer_dinamicos(codificar_dinamicos(model, incluir_diccionario=True))
+    diccionario = completo["diccionario"]
+    esperado, _ = json_por_id(model)
+    assert completo["paso"] == 40 and completo["completo"]
+    assert len(completo["coche_ids"]) > 0
+    assert agentes(completo, diccionario) == esperado
+
+    for _ in range(15):
+        model.step()
+    delta = leer_dinamicos(codificar_dinamicos(model, since=40))
+    esperado, respuesta = json_por_id(model, since=40)
+    assert delta["paso"] == 55 and not delta["completo"] and delta["diccionario"] is None
+    assert agentes(delta, diccionario) == esperado
+    assert {f"Coche-{n}" for n in delta["eliminados"].tolist()} == set(respuesta["removed"]) != set()
+
+
+def test_estaticos_ida_y_vuelta():
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor="vectorizado")
+    datos = codificar_estaticos(model)
+    magic, ancho, alto = struct.unpack_from("<4sHH", datos)
+    assert (magic, ancho, alto) == (b"TRS1", len(mapa[0]), len(mapa))
+
+    celdas = ancho * alto
+    seccion = -(-celdas // 4) * 4
+    assert len(datos) == 8 + 2 * seccion
+    tipos = np.frombuffer(datos, dtype=np.uint8, count=celdas, offset=8)
+    direcciones = np.frombuffer(datos, dtype=np.uint8, count=celdas, offset=8 + seccion)
+    assert (tipos == model.mapa_compilado.tipos.ravel()).all()
+    assert (direcciones == model.mapa_compilado.direcciones.ravel()).all()
+    assert {TIPOS_CELDA[t] for t in np.unique(tipos).tolist()} >= {"Edificio", "Calle", "Destino"}
@@ -0,0 +1,57 @@
+import pytest
+import agents_server
+from conftest import MAPA_CLIENTE
+from sweep import cargar_mapa
+from trafficBase.model import RandomModel
+
+
+def modelo(motor, **kwargs):
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    return RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=3, **kwargs)
+
+
+def por_id(agentes):
+    return {agente["id"]: agente for agente in agentes}
+
+
+@pytest.mark.parametrize("motor", ["mesa", "vectorizado"])
+def test_aplicar_las_diferencias_da_la_foto_completa(motor):
+    model = modelo(motor)
+    for _ in range(30):
+        model.step()
+    estado = por_id(agents_server.estado_dinamico(model)["dynamicAgents"])
+
+    for desde in range(30, 90, 15):
+        for _ in range(15):
+            model.step()
+        delta = agents_server.estado_dinamico(model, desde)
+        assert not delta["full"] and delta["step"] == desde + 15
+        for eliminado in delta["removed"]:
+            estado.pop(eliminado, None)  # Puede haber aparecido y salido dentro del intervalo
+        estado.update(por_id(delta["dynamicAgents"]))
+        assert estado == por_id(agents_server.estado_dinamico(model)["dynamicAgents"])
+    assert delta["removed"]  # En el último intervalo también llegan coches a su destino
+
+
+def test_since_fuera_del_registro_devuelve_la_foto_completa():
+    model = modelo("vectorizado", cambios_max=5)
+    for _ in range(10):
+        model.step()
+    assert not agents_server.estado_dinamico(model, 5)["full"]  # Los pasos 6 a 10 siguen en el registro
+    for since in (4, 0, 11):  # Más viejo que cambios_max, o en el futuro
+        respuesta = agents_server.estado_dinamico(model, since)
+        assert respuesta["full"] and respuesta["step"] == 10
+        assert "removed" not in respuesta
+        assert respuesta == agents_server.estado_dinamico(model)
+
+
+def test_get_dynamic_agents_con_since():
+    cliente = agents_server.app.test_client()
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    assert cliente.post("/init?session=deltas", json={"mapa": mapa, "motor": "vectorizado"}).status_code == 200
+    try:
+        cliente.get("/advance?session=deltas&steps=5")
+        assert not cliente.get("/getDynamicAgents?session=deltas&since=3").get_json()["full"]
+        assert cliente.get("/getDynamicAgents?session=deltas&since=6").get_json()["full"]
+    finally:
+        cliente.delete("/session?session=deltas")
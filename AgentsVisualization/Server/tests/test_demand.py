@@ -0,0 +1,34 @@
+import pytest
+from conftest import MAPA_CLIENTE
+from sweep import cargar_mapa
+from trafficBase.model import RandomModel
+
+
+def correr_demanda(motor, pasos, demanda, seed=1):
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=seed, demanda=demanda)
+    llegadas = []
+    for _ in range(pasos // 200):
+        for _ in range(200):
+            model.step()
+        llegadas.append(model.coches_destino)
+    model.cerrar()
+    return model, [b - a for a, b in zip([0] + llegadas, llegadas)]
+
+
+@pytest.mark.parametrize("motor", ["mesa", "vectorizado"])
+def test_la_demanda_por_defecto_no_atasca_la_red(motor):
+    # Orígenes por defecto ("todos", incluidas las celdas junto a los destinos)
+    model, por_tramo = correr_demanda(motor, 2000, {"componentes": [{"tasa": 0.3}]})
+    assert min(por_tramo[2:]) > 30, por_tramo
+    assert model._contar_coches() < 50
+    assert model.demanda.descartados == 0
+
+
+def test_demanda_igual_en_mesa_y_vectorizado():
+    demanda = {"origenes": "bordes", "componentes": [{"tasa": 0.2, "perfil": [0.5, 1.0]}], "duracion_dia": 400}
+    mesa, tramos_mesa = correr_demanda("mesa", 1000, demanda, seed=3)
+    vectorizado, tramos_vectorizado = correr_demanda("vectorizado", 1000, demanda, seed=3)
+    assert tramos_mesa == tramos_vectorizado
+    assert mesa.get_stats() == vectorizado.get_stats()
+    assert mesa.coches_destino > 100
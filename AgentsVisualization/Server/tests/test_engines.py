@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from conftest import MAPA_BASE, MAPA_CLIENTE
+from sweep import cargar_mapa
+from trafficBase.model import RandomModel
+
+
+def correr(motor, pasos, seed, mapa=MAPA_CLIENTE, **kwargs):
+    # En el mapa del cliente todos los destinos son alcanzables, así que hay muchas llegadas que comparar
+    mapa = cargar_mapa(mapa)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=seed, **kwargs)
+    for _ in range(pasos):
+        if not model.running:
+            break
+        model.step()
+    resultado = (model.get_stats(), model._calcular_promedio_pasos(), model.running)
+    model.cerrar()
+    return resultado
+
+
+@pytest.mark.parametrize("seed", [1, 7])
+def test_vectorizado_da_los_mismos_contadores_que_mesa(seed):
+    mesa = correr("mesa", 1000, seed)
+    vectorizado = correr("vectorizado", 1000, seed)
+    assert vectorizado == mesa
+    assert mesa[0]["coches_al_destino"] > 300
+
+
+def test_particionado_da_los_mismos_contadores_que_vectorizado():
+    particionado = correr("particionado", 1000, 1, trabajadores=2)
+    assert particionado == correr("vectorizado", 1000, 1)
+    assert particionado[0]["coches_al_destino"] > 300
+
+
+@pytest.mark.parametrize("motor", ["mesa", "particionado"])
+def test_demanda_y_reruteo_iguales_en_todos_los_motores(motor):
+    parametros = {"demanda": {"origenes": "bordes", "componentes": [{"tasa": 0.3}]}, "periodo_reruteo": 20}
+    resultado = correr(motor, 800, 4, trabajadores=2, **parametros)
+    assert resultado == correr("vectorizado", 800, 4, **parametros)
+    assert resultado[0]["coches_al_destino"] > 150
+
+
+def test_mapa_base_tambien_coincide():
+    assert correr("mesa", 500, 1, mapa=MAPA_BASE) == correr("vectorizado", 500, 1, mapa=MAPA_BASE)
+
+
+def test_coche_sobre_destino_ajeno_sale_sin_contar():
+    for motor in ("mesa", "vectorizado"):
+        mapa = cargar_mapa(MAPA_CLIENTE)
+        model = RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=1)
+        destino, ajeno = model.destinos[0], model.destinos[1]
+        if motor == "mesa":
+            model._crear_coche(ajeno.pos, destino)
+        else:
+            celda = ajeno.pos[1] * model.width + ajeno.pos[0]
+            model.motor._agregar_lote(np.array([celda]), np.array([0]))
+        model.step()
+        assert model._contar_coches() == 0, motor
+        assert model.coches_destino == 0, motor
+        assert model.pasos_totales == 0, motor
+
+
+@pytest.mark.parametrize("motor", ["mesa", "vectorizado"])
+@pytest.mark.parametrize("seed", [2, 6])
+def test_el_mapa_del_cliente_no_se_atasca(motor, seed):
+    # Con estas semillas dos coches que cambian de carril uno hacia el otro se bloqueaban para siempre
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=seed)
+    llegadas = []
+    for _ in range(6):
+        for _ in range(500):
+            model.step()
+        llegadas.append(model.coches_destino)
+    assert model.running
+    por_tramo = [b - a for a, b in zip([0] + llegadas, llegadas)]
+    assert min(por_tramo) > 100, por_tramo
+
+
+# Anillo de dos carriles: los coches sólo pueden volver a la columna de los destinos dando la vuelta
+ANILLO = [
+    "v<<<<<<",
+    "v#####^",
+    "v#D###^",
+    ">>>>>>^",
+    ">>>>>>^",
+    "##D####",
+]
+
+
+@pytest.mark.parametrize("motor", ["mesa", "vectorizado", "particionado"])
+def test_dos_coches_que_necesitan_la_celda_del_otro_se_desvian(motor):
+    model = RandomModel(7, 6, ANILLO, motor=motor, periodo_aparicion=10 ** 6, trabajadores=2)
+    abajo, arriba = 0, 1  # Destinos (2, 0) y (2, 3)
+    # Cada coche espera la celda del otro para llegar a su destino; avanzar lo aleja
+    if motor == "mesa":
+        model._crear_coche((2, 1), model.destinos[arriba])
+        model._crear_coche((2, 2), model.destinos[abajo])
+    else:
+        model.motor._agregar_lote(np.array([1 * 7 + 2, 2 * 7 + 2]), np.array([arriba, abajo]))
+    for _ in range(60):
+        model.step()
+    model.cerrar()
+    assert model.coches_destino == 2
+    assert model._contar_coches() == 0
@@ -0,0 +1,52 @@
+import agents_server
+from conftest import MAPA_BASE
+from sweep import cargar_mapa
+
+
+def iniciar(**datos):
+    return agents_server.app.test_client().post("/init?session=init", json={"mapa": cargar_mapa(MAPA_BASE), **datos})
+
+
+def test_demanda_valida():
+    respuesta = iniciar(demanda={"componentes": [{"tasa": 0.5}]})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["origenes"]
+
+
+def test_demanda_invalida_tiene_su_propio_mensaje():
+    for demanda in ({"componentes": [{"tasa": -1}]}, {"componentes": [3]}, {"origenes": [[-5, 0]]},
+                    {"duracion_dia": "x"}):
+        respuesta = iniciar(demanda=demanda)
+        assert respuesta.status_code == 400
+        assert respuesta.get_json()["error"].startswith("Demanda inválida")
+
+
+def test_otros_parametros_invalidos_no_se_reportan_como_demanda():
+    respuesta = iniciar(motor="particionado", trabajadores=True)
+    assert respuesta.status_code == 400
+    assert "Demanda" not in respuesta.get_json()["error"]
+
+
+def test_trabajadores_no_pasan_del_numero_de_cpus():
+    respuesta = iniciar(motor="particionado", trabajadores=agents_server.MAX_TRABAJADORES + 1)
+    assert respuesta.status_code == 400
+    assert "trabajadores" in respuesta.get_json()["error"]
+
+
+def test_sesiones_particionadas_tienen_cupo():
+    cliente = agents_server.app.test_client()
+    datos = {"mapa": cargar_mapa(MAPA_BASE), "motor": "particionado", "trabajadores": 1}
+    ids = [f"particionada-{k}" for k in range(agents_server.MAX_SESIONES_PARTICIONADAS)]
+    try:
+        for session_id in ids:
+            assert cliente.post(f"/init?session={session_id}", json=datos).status_code == 200
+        respuesta = cliente.post("/init?session=particionada-extra", json=datos)
+        assert respuesta.status_code == 400
+        assert "particionado" in respuesta.get_json()["error"]
+        # Reemplazar una sesión particionada no cuenta contra el cupo
+        assert cliente.post(f"/init?session={ids[0]}", json=datos).status_code == 200
+    finally:
+        for session_id in ids:
+            agents_server.sesiones.eliminar(session_id)
+    assert cliente.post("/init?session=particionada-extra", json=datos).status_code == 200
+    agents_server.sesiones.eliminar("particionada-extra")
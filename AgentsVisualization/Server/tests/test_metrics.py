@@ -0,0 +1,50 @@
+import csv
+import numpy as np
+from conftest import MAPA_BASE
+from sweep import cargar_mapa
+from trafficBase.metrics import RegistroMetricas
+from trafficBase.model import RandomModel
+
+
+def modelo(**kwargs):
+    mapa = cargar_mapa(MAPA_BASE)
+    return RandomModel(len(mapa[0]), len(mapa), mapa, motor="vectorizado", seed=3, **kwargs)
+
+
+def test_exportar_csv_guarda_todas_las_filas(tmp_path):
+    ruta = tmp_path / "metricas.csv"
+    model = modelo(metricas_capacidad=40, exportar_metricas=str(ruta))
+    esperadas = []
+    for _ in range(237):  # Más pasos que la capacidad y no múltiplo del bloque
+        model.step()
+        esperadas.append([model.step_counter, model.step_counter, model.coches_creados, model.coches_destino])
+    model.cerrar()
+
+    with open(ruta, newline="", encoding="utf-8") as archivo:
+        filas = list(csv.reader(archivo))
+    assert filas[0][:4] == ["pasos", "Pasos Simulación", "Coches Creados", "Coches al Destino"]
+    assert [[int(v) for v in fila[:4]] for fila in filas[1:]] == esperadas
+    # En memoria sólo quedan las últimas capacidad filas
+    assert model.datacollector.rango()["pasos"] == list(range(198, 238))
+
+
+def test_exportar_npz_por_bloques(tmp_path):
+    ruta = str(tmp_path / "metricas")
+    registro = RegistroMetricas({"valor": lambda m: m.step_counter * 2}, capacidad=25)
+    registro.exportar_a(ruta, "npz", tam_bloque=10)
+
+    class Modelo:
+        step_counter = 0
+
+    model = Modelo()
+    for paso in range(1, 108):
+        model.step_counter = paso
+        registro.collect(model)
+    registro.volcar()
+
+    bloques = sorted(tmp_path.glob("metricas_*.npz"))
+    assert len(bloques) == 11
+    pasos = np.concatenate([np.load(b)["pasos"] for b in bloques])
+    datos = np.concatenate([np.load(b)["datos"][:, 0] for b in bloques])
+    assert pasos.tolist() == list(range(1, 108))
+    assert datos.tolist() == [2 * p for p in range(1, 108)]
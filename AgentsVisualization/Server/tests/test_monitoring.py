@@ -0,0 +1,35 @@
+import agents_server
+from conftest import MAPA_BASE
+from sweep import cargar_mapa
+
+
+def iniciar(cliente, sesion, **datos):
+    respuesta = cliente.post(f"/init?session={sesion}", json={"mapa": cargar_mapa(MAPA_BASE), **datos})
+    assert respuesta.status_code == 200
+    assert cliente.get(f"/fastforward?session={sesion}&steps=5").status_code == 200
+
+
+def test_perfil_por_fases_es_opcional():
+    cliente = agents_server.app.test_client()
+    iniciar(cliente, "sin-perfil")
+    iniciar(cliente, "con-perfil", perfil=True)
+    assert agents_server.sesiones.obtener("sin-perfil").model.perfil is None
+
+    texto = cliente.get("/metrics").get_data(as_text=True)
+    fases = [linea for linea in texto.splitlines() if linea.startswith("traffic_step_phase_calls_total{")]
+    assert fases and all('session="con-perfil"' in linea for linea in fases)
+    assert 'traffic_session_step{session="sin-perfil"} 5' in texto
+
+
+def test_metrics_no_espera_a_una_sesion_ocupada():
+    cliente = agents_server.app.test_client()
+    iniciar(cliente, "ocupada")
+    sesion = agents_server.sesiones.obtener("ocupada")
+    with sesion.lock:  # Como un /fastforward largo
+        texto = cliente.get("/metrics").get_data(as_text=True)
+    assert 'traffic_session_busy{session="ocupada"} 1' in texto
+    assert 'traffic_session_step{session="ocupada"}' not in texto
+
+    texto = cliente.get("/metrics").get_data(as_text=True)
+    assert 'traffic_session_busy{session="ocupada"} 0' in texto
+    assert 'traffic_session_step{session="ocupada"} 5' in texto
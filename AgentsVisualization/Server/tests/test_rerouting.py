@@ -0,0 +1,66 @@
+import heapq
+import numpy as np
+import pytest
+from conftest import MAPA_CLIENTE
+from sweep import cargar_mapa
+from trafficBase.model import RandomModel
+
+
+def modelo(motor="vectorizado"):
+    mapa = cargar_mapa(MAPA_CLIENTE)
+    return RandomModel(len(mapa[0]), len(mapa), mapa, motor=motor, seed=2, periodo_reruteo=20)
+
+
+def dijkstra(reruteo, destino):
+    """Distancias hacia la celda destino con los pesos actuales, calculadas desde cero (-1 sin camino)."""
+    usables = reruteo.legal | reruteo.a_destino
+    distancia = np.full(len(reruteo.vecinos), -1.0)
+    distancia[destino] = 0.0
+    cola = [(0.0, destino)]
+    while cola:
+        actual, celda = heapq.heappop(cola)
+        if actual > distancia[celda]:
+            continue
+        for k, previa in enumerate(reruteo.previos[celda].tolist()):
+            if previa < 0 or not usables[previa, k]:
+                continue
+            propuesta = actual + reruteo.peso[previa, k]
+            if distancia[previa] < 0 or propuesta < distancia[previa]:
+                distancia[previa] = propuesta
+                heapq.heappush(cola, (propuesta, previa))
+    return distancia
+
+
+def revisar_arboles(reruteo):
+    """Cada árbol reparado coincide con Dijkstra y su siguiente celda da esa misma distancia."""
+    for d, destino in enumerate(reruteo.destino_celda):
+        distancias = reruteo.distancias[d]
+        np.testing.assert_allclose(distancias, dijkstra(reruteo, destino))
+        celdas = np.flatnonzero(reruteo.siguiente[d] >= 0)
+        siguientes = reruteo.siguiente[d, celdas]
+        k = np.array([reruteo.vecinos[c].tolist().index(s) for c, s in zip(celdas.tolist(), siguientes.tolist())])
+        np.testing.assert_allclose(distancias[celdas], reruteo.peso[celdas, k] + distancias[siguientes])
+        assert ((distancias >= 0) == ((reruteo.siguiente[d] >= 0) | (np.arange(len(distancias)) == destino))).all()
+
+
+def test_reparar_pesos_al_azar_da_lo_mismo_que_dijkstra():
+    reruteo = modelo().reruteo
+    usables = np.argwhere(reruteo.legal | reruteo.a_destino)
+    rng = np.random.default_rng(0)
+    for ronda in range(6):
+        elegidas = usables[rng.choice(len(usables), 150, replace=False)]
+        # Unas rondas sólo suben tiempos, otras sólo los bajan y otras mezclan
+        bajo, alto = [(1.0, 8.0), (0.3, 1.0), (0.3, 8.0)][ronda % 3]
+        reruteo.tiempo[elegidas[:, 0], elegidas[:, 1]] = rng.uniform(bajo, alto, len(elegidas))
+        reruteo.actualizar()
+        revisar_arboles(reruteo)
+    assert 0 < reruteo.reparaciones < 6 * len(reruteo.destino_celda) * len(reruteo.vecinos)
+
+
+@pytest.mark.parametrize("motor", ["mesa", "vectorizado"])
+def test_reparar_con_tiempos_de_la_simulacion_da_lo_mismo_que_dijkstra(motor):
+    model = modelo(motor)
+    for _ in range(300):
+        model.step()
+    assert model.reruteo.reparaciones > 0
+    revisar_arboles(model.reruteo)
@@ -0,0 +1,83 @@
+import numpy as np
+from trafficBase.mapcache import compilar_mapa
+from trafficBase.signals import ControladorCruces
+
+ANCHO = 12
+
+
+def mapa_dos_cruces():
+    """Dos cruces con un semáforo vertical (A) y uno horizontal (d) cada uno, centrados en x + y = 4 y 17."""
+    filas = [["#"] * ANCHO for _ in range(ANCHO)]  # filas[y][x], y = 0 abajo
+    for k in range(ANCHO):
+        filas[k][2] = filas[k][9] = "^"
+        filas[3][k] = filas[9][k] = ">"
+    filas[2][2], filas[3][1] = "A", "d"
+    filas[8][9], filas[9][8] = "A", "d"
+    return ["".join(fila) for fila in reversed(filas)]
+
+
+def controlador(modo, intervalo=5):
+    return ControladorCruces(compilar_mapa(mapa_dos_cruces()), modo, intervalo)
+
+
+def celda(x, y):
+    return y * ANCHO + x
+
+
+def correr(c, pasos, ocupacion=None):
+    """Estado de los semáforos antes del primer paso y después de cada uno, arreglo (pasos + 1, semáforos)."""
+    ocupacion = ocupacion if ocupacion is not None else np.zeros(ANCHO * ANCHO, dtype=np.int32)
+    verdes = [c.verde.copy()]
+    for _ in range(pasos):
+        cambiados = c.step(ocupacion)
+        assert (np.flatnonzero(c.verde != verdes[-1]) == cambiados).all()
+        verdes.append(c.verde.copy())
+    return np.array(verdes)
+
+
+def test_orden_de_los_semaforos():
+    c = controlador("fijo")
+    assert c.cruce.tolist() == [0, 0, 1, 1]
+    assert c.grupo.tolist() == [0, 1, 0, 1]  # Vertical, horizontal en cada cruce
+    assert c.cola[0].tolist() == [celda(2, 1), celda(2, 0), -1, -1]
+    assert c.cola[1].tolist() == [celda(0, 3), -1, -1, -1]
+
+
+def test_fijo_cambia_todos_los_cruces_cada_intervalo():
+    verdes = correr(controlador("fijo", intervalo=5), 40)
+    for t, verde in enumerate(verdes):
+        vertical = (t // 5) % 2 == 0
+        assert verde.tolist() == [vertical, not vertical] * 2
+
+
+def test_onda_desfasa_cada_cruce_segun_su_posicion():
+    verdes = correr(controlador("onda", intervalo=5), 60)
+    # El segundo cruce está 13 celdas más adelante: repite al primero 13 pasos después
+    assert (verdes[13:, 2:] == verdes[:-13, :2]).all()
+    assert (verdes[:, 0] != verdes[:, 1]).all()  # En cada cruce sólo un grupo está en verde
+    for cruce in (0, 1):  # Cada fase sigue durando intervalo pasos
+        cambios = np.flatnonzero(np.diff(verdes[:, 2 * cruce].astype(int)))
+        assert set(np.diff(cambios).tolist()) == {5}
+
+
+def test_actuado_sin_coches_extiende_hasta_verde_max():
+    verdes = correr(controlador("actuado", intervalo=5), 30)
+    cambios = np.flatnonzero(np.diff(verdes[:, 0].astype(int))) + 1
+    assert cambios.tolist() == [15, 30]
+
+
+def test_actuado_cambia_al_intervalo_si_solo_esperan_en_rojo():
+    ocupacion = np.zeros(ANCHO * ANCHO, dtype=np.int32)
+    ocupacion[celda(0, 3)] = 1  # Coche esperando el semáforo horizontal del primer cruce (en rojo)
+    verdes = correr(controlador("actuado", intervalo=5), 5, ocupacion)
+    assert verdes[4, :2].tolist() == [True, False]
+    assert verdes[5, :2].tolist() == [False, True]
+    assert verdes[5, 2:].tolist() == [True, False]  # El otro cruce sigue vacío y no cambia
+
+
+def test_actuado_extiende_mientras_haya_cola_en_verde():
+    ocupacion = np.zeros(ANCHO * ANCHO, dtype=np.int32)
+    ocupacion[[celda(0, 3), celda(2, 1)]] = 1  # Cola en los dos accesos del primer cruce
+    verdes = correr(controlador("actuado", intervalo=5), 15, ocupacion)
+    assert verdes[14, :2].tolist() == [True, False]
+    assert verdes[15, :2].tolist() == [False, True]
@@ -0,0 +1,48 @@
+import io
+import json
+import numpy as np
+import pytest
+import agents_server
+from conftest import MAPA_BASE
+from sweep import cargar_mapa
+from trafficBase.model import RandomModel
+from trafficBase.snapshot import guardar_instantanea
+
+
+def instantanea(**cambios):
+    """Instantánea del mapa base con los campos de meta reemplazados por cambios."""
+    mapa = cargar_mapa(MAPA_BASE)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor="vectorizado", seed=1)
+    for _ in range(20):
+        model.step()
+    with np.load(io.BytesIO(guardar_instantanea(model))) as archivo:
+        arreglos = {nombre: archivo[nombre] for nombre in archivo.files}
+    meta = json.loads(arreglos.pop("meta").tobytes().decode("utf-8"))
+    meta.update(cambios)
+    salida = io.BytesIO()
+    np.savez_compressed(salida, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arreglos)
+    return salida.getvalue()
+
+
+def test_instantanea_valida_se_carga():
+    respuesta = agents_server.app.test_client().post("/snapshot?session=instantanea", data=instantanea())
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["step"] == 20
+
+
+@pytest.mark.parametrize("cambios", [
+    {"motor": "desconocido"},
+    {"trabajadores": "4"},
+    {"control_semaforos": "ninguno"},
+    {"mapa": []},
+    {"mapa": [1, 2]},
+    {"metricas_capacidad": 10 ** 12},
+    {"historial_max": 0},
+    {"demanda": [1]},
+    {"reruteo": {"periodo": "5"}},
+    {"contadores": {"step_counter": "x"}},
+])
+def test_instantanea_con_meta_invalida_responde_400(cambios):
+    respuesta = agents_server.app.test_client().post("/snapshot?session=instantanea", data=instantanea(**cambios))
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["error"].startswith("Instantánea inválida")
@@ -0,0 +1,103 @@
+import json
+import threading
+import agents_server
+from conftest import MAPA_BASE
+from sweep import cargar_mapa
+from streaming import FIN, Transmisor
+from trafficBase.model import RandomModel
+
+
+def transmisor(max_pendientes=4):
+    mapa = cargar_mapa(MAPA_BASE)
+    model = RandomModel(len(mapa[0]), len(mapa), mapa, motor="vectorizado", seed=2)
+    return Transmisor(model, threading.Lock(), agents_server.frame_transmision, max_pendientes=max_pendientes)
+
+
+def test_cliente_lento_recibe_un_frame_con_todos_los_cambios():
+    t = transmisor(max_pendientes=4)
+    suscripcion = t.suscribir()
+    primero = suscripcion.siguiente(timeout=0)
+    assert primero["full"] and primero["step"] == 0
+
+    for _ in range(3):  # Caben en la cola: llegan uno por uno
+        t.avanzar()
+    assert [suscripcion.siguiente(timeout=0)["step"] for _ in range(3)] == [1, 2, 3]
+
+    for _ in range(10):  # No caben: se juntan en un solo frame desde el paso 3
+        t.avanzar()
+    frame = suscripcion.siguiente(timeout=0)
+    assert frame["step"] == 13 and not frame["full"]
+    assert frame == agents_server.frame_transmision(t.model, 3)
+    assert suscripcion.siguiente(timeout=0) is None
+    t.detener()
+
+
+def test_la_suscripcion_termina_al_detener():
+    t = transmisor()
+    suscripcion = t.suscribir()
+    t.avanzar()
+    t.detener()
+    assert suscripcion.siguiente(timeout=1)["step"] == 0  # Los frames pendientes se entregan
+    assert suscripcion.siguiente(timeout=1)["step"] == 1
+    assert suscripcion.siguiente(timeout=1) is FIN
+    assert t.suscribir().siguiente(timeout=0)["full"]  # Ya no se suscribe: recibe la foto y termina
+
+
+def test_stream_http_termina_al_detener_y_cuenta_los_pasos():
+    cliente = agents_server.app.test_client()
+    cabeceras = {"X-Session-Id": "prueba-stream"}
+    assert cliente.post("/init", json={"mapa": cargar_mapa(MAPA_BASE), "motor": "vectorizado"},
+                        headers=cabeceras).status_code == 200
+    assert cliente.get("/stream/start?rate=200", headers=cabeceras).status_code == 200
+
+    respuesta = cliente.get("/stream", headers=cabeceras, buffered=False)
+    eventos = iter(respuesta.response)
+    primero = json.loads(next(eventos).decode()[len("data: "):])
+    assert primero["full"]
+    segundo = json.loads(next(eventos).decode()[len("data: "):])  # Al menos un paso transmitido
+    assert segundo["step"] >= 1
+
+    cliente.get("/stream/stop", headers=cabeceras)
+    resto = list(eventos)  # Termina en vez de esperar keep-alives para siempre
+    respuesta.close()
+    pasos = [segundo["step"]] + [json.loads(e.decode()[len("data: "):])["step"] for e in resto
+                                 if e.startswith(b"data: ")]
+    assert pasos == sorted(pasos)
+
+    sesion = agents_server.sesiones.obtener("prueba-stream")
+    assert sesion.current_step == sesion.model.step_counter > 0
+    actualizado = cliente.get("/update", headers=cabeceras).json
+    assert actualizado["currentStep"] == sesion.model.step_counter
+    agents_server.sesiones.eliminar("prueba-stream")
+
+
+def test_cerrar_la_sesion_no_interrumpe_un_paso():
+    mapa = cargar_mapa(MAPA_BASE)
+    sesion = agents_server.sesiones.guardar("prueba-cierre", RandomModel(len(mapa[0]), len(mapa), mapa))
+    cerrada = threading.Event()
+    with sesion.lock:
+        # Desalojar desde otro hilo mientras este "avanza" el modelo
+        hilo = threading.Thread(target=lambda: (agents_server.sesiones.eliminar("prueba-cierre"), cerrada.set()))
+        hilo.start()
+        assert not cerrada.wait(0.2)
+        assert not sesion.cerrada
+    assert cerrada.wait(5)
+    assert sesion.cerrada
+    assert agents_server.app.test_client().get("/stream/start", headers={"X-Session-Id": "prueba-cierre"}
+                                               ).status_code == 400
+
+
+def test_reiniciar_la_transmision_no_deja_dos_hilos():
+    cliente = agents_server.app.test_client()
+    cabeceras = {"X-Session-Id": "prueba-reinicio"}
+    assert cliente.post("/init", json={"mapa": cargar_mapa(MAPA_BASE), "motor": "vectorizado"},
+                        headers=cabeceras).status_code == 200
+    sesion = agents_server.sesiones.obtener("prueba-reinicio")
+    assert cliente.get("/stream/start?rate=200", headers=cabeceras).status_code == 200
+    primero = sesion.transmisor
+    assert cliente.get("/stream/start?rate=200", headers=cabeceras).status_code == 200
+    primero._hilo.join(timeout=5)
+    assert not primero._hilo.is_alive()
+    assert sesion.transmisor is not primero and sesion.transmisor.activo
+    agents_server.sesiones.eliminar("prueba-reinicio")
+    assert sesion.transmisor is None
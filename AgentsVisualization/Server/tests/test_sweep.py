@@ -0,0 +1,30 @@
+import csv
+import shutil
+from conftest import MAPA_BASE
+from sweep import barrido, configuraciones, id_corrida
+
+
+def test_una_corrida_que_falla_no_pierde_las_demas(tmp_path):
+    salida = str(tmp_path / "resultados.csv")
+    buenas = list(configuraciones([MAPA_BASE], [10], [5], [1, 2], 50, "vectorizado"))
+    mala = dict(buenas[0], motor="desconocido")
+    corridas, fallidas = barrido(buenas + [mala], salida, procesos=2)
+
+    assert corridas == 3
+    assert fallidas == [id_corrida(mala)]
+    with open(salida, newline="", encoding="utf-8") as archivo:
+        filas = list(csv.DictReader(archivo))
+    assert sorted(f["run_id"] for f in filas) == sorted(id_corrida(c) for c in buenas)
+
+    # Al reanudar sólo se reintenta la que falló
+    assert barrido(buenas + [mala], salida, procesos=1) == (1, [id_corrida(mala)])
+
+
+def test_el_id_depende_del_contenido_del_mapa(tmp_path):
+    mapa = tmp_path / "mapa.txt"
+    shutil.copy(MAPA_BASE, mapa)
+    config = next(configuraciones([str(mapa)], [10], [5], [1], 50))
+    antes = id_corrida(config)
+    assert id_corrida(config) == antes
+    mapa.write_text(mapa.read_text().replace("D", "#", 1))
+    assert id_corrida(config) != antes
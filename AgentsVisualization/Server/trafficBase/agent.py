@@ -1,38 +1,18 @@
 from mesa import Agent
+from collections import deque
 import math
+from trafficBase.routing import ESPERA_DESVIO
 
 
-class Edificio(Agent):
-    """ Agente obstáculo estático que no se mueve. """
-    def __init__(self, unique_id, model):
-        super().__init__(unique_id, model)
-
-    def step(self):
-        pass 
-
 class Semaforo(Agent):
-    """ Agente semáforo que alterna entre rojo y verde. """
-    def __init__(self, unique_id, model, change_interval, direction):
-        super().__init__(unique_id, model)
-        self.change_interval = change_interval
-        self.time_elapsed = 0  # Tiempo transcurrido desde el último cambio
-        self.green = True  # Estado inicial del semáforo: verde
-        self.direction = None  # Dirección de la calle a la que pertenece
-
-    def step(self):
-        """Actualiza el estado del semáforo según el intervalo de cambio."""
-        self.time_elapsed += 1
-        if self.time_elapsed >= self.change_interval:
-            self.green = not self.green  # Cambiar de estado
-            self.time_elapsed = 0
-
-class Calle(Agent):
-    def __init__(self, unique_id, model, direction):
+    """ Agente semáforo; el controlador de cruces del modelo decide cuándo cambia. """
+    def __init__(self, unique_id, model, direction, green=True):
         super().__init__(unique_id, model)
-        self.direction = direction  # Dirección de la calle (0: arriba, 1: derecha, 2: abajo, 3: izquierda)
+        self.green = green  # Estado del semáforo: verde o rojo
+        self.direction = direction  # Dirección de la calle a la que pertenece
 
     def step(self):
-        pass 
+        pass
 
 class Destino(Agent):
     """ Agente que representa un destino final. """
@@ -42,110 +22,118 @@ class Destino(Agent):
     def step(self):
         pass
 
-class Coche(Agent):
-    """Agente que representa un coche."""
-    def __init__(self, unique_id, model, destino):
-        super().__init__(unique_id, model)
+class Coche:
+    """Agente que representa un coche.
+
+    No hereda de mesa.Agent para no cargar un __dict__ por coche: con
+    __slots__ cada coche guarda sólo sus campos. La rejilla y el schedule del
+    modelo sólo usan unique_id y pos (y una referencia débil en las versiones
+    de mesa cuyo schedule es un AgentSet).
+    """
+    __slots__ = ("unique_id", "model", "pos", "numero", "last_pos", "destino", "recent_positions",
+                 "paso_creacion", "paso_entrada", "__weakref__")
+
+    def __init__(self, unique_id, model, destino, numero):
+        self.unique_id = unique_id
+        self.model = model
+        self.pos = None
+        self.numero = numero  # Número del id ("Coche-<numero>"), se guarda en la ocupación del modelo
         self.last_pos = None  # Almacena la última posición
         self.destino = destino  # Almacena el destino actual
-        self.recent_positions = []  # Almacena las últimas posiciones visitadas
+        self.recent_positions = deque(maxlen=model.historial_max)  # Últimas posiciones visitadas (acotadas)
+        self.paso_creacion = model.step_counter  # Paso en el que apareció el coche
+        self.paso_entrada = model.step_counter  # Paso en el que entró a su celda actual
 
     def euc(self, possible_step, destino):
         """Calcula la distancia euclidiana entre dos puntos."""
         return math.sqrt((possible_step[0] - destino[0])**2 + (possible_step[1] - destino[1])**2)
 
-    def step(self):
-        """Mueve el coche respetando el sentido de la calle, el estado del semáforo y su última dirección."""
-        current_pos = self.pos
-        current_cell_contents = self.model.grid.get_cell_list_contents(current_pos)
-        neighbor_cell_contents = self.model.grid.get_neighbors(current_pos, moore=False, include_center=False)
+    def libre(self, paso, semaforo):
+        """Indica si el coche puede entrar en la celda vecina en este paso."""
+        # Respetar el semáforo si está en rojo
+        if semaforo is not None and not semaforo.green:
+            return False
+        # No regresar ni avanzar a una celda ocupada por otro coche
+        return paso != self.last_pos and self.model.celda_libre(paso)
+
+    def paso_ruteado(self, sucesores, ruta, distancia_actual):
+        """Sigue la tabla de ruteo; si el siguiente salto está bloqueado usa otro que no aleje del destino.
+
+        Con reruteo cada vecina vale el tiempo de la arista más el que falta desde ella.
+        Después de ESPERA_DESVIO pasos detenido también acepta vecinas más lejanas (un desvío).
+        """
+        new_pos = None
+        mejor = None
+        desvio = self.model.step_counter - self.paso_entrada > ESPERA_DESVIO
+        for paso, semaforo in sucesores:
+            distancia = ruta.distancia_a(paso)
+            if distancia < 0 or (distancia > distancia_actual and not desvio) or not self.libre(paso, semaforo):
+                continue
+            puntaje = distancia + ruta.costo(self.pos, paso)
+            if mejor is None or puntaje < mejor:
+                new_pos = paso
+                mejor = puntaje
+        return new_pos
+
+    def paso_voraz(self, sucesores):
+        """Elige el paso libre más cercano al destino, evitando las posiciones ya visitadas."""
         possible_steps = []
         visited_steps = []
         distancias = []
-        new_pos = None
 
-        for obj in current_cell_contents:
-            if isinstance(obj, Destino): # Si el coche llega al destino se elimina
-                self.model.schedule.remove(self)
-                self.model.grid.remove_agent(self)
-                if current_pos in self.model.reservas:
-                    del self.model.reservas[current_pos]
-                return
-            if isinstance(obj, Calle):
-                direction = obj.direction # Almacena la dirección de la calle actual
-            
-        def visit(pos):
-            result = pos in self.recent_positions 
-            return result 
-
-        # Función para añadir pasos posibles
-        def add_possible_step(neigh, direction, pos, last_pos):
-            if neigh.pos != last_pos: 
-                if pos[0] < neigh.pos[0] and neigh.direction != 3 and direction != 3:
-                    visited_steps.append(neigh.pos) if visit(neigh.pos) else possible_steps.append(neigh.pos)
-                if pos[0] > neigh.pos[0] and neigh.direction != 1 and direction != 1:
-                    visited_steps.append(neigh.pos) if visit(neigh.pos) else possible_steps.append(neigh.pos)
-                if pos[1] < neigh.pos[1] and neigh.direction != 2 and direction != 2:
-                    visited_steps.append(neigh.pos) if visit(neigh.pos) else possible_steps.append(neigh.pos)
-                if pos[1] > neigh.pos[1] and neigh.direction != 0 and direction != 0:
-                    visited_steps.append(neigh.pos) if visit(neigh.pos) else possible_steps.append(neigh.pos)
-
-        # Evaluar vecinos para determinar posibles pasos
-        for neigh in neighbor_cell_contents:
-            calle = None
-            semaforo = None
-            coche = None
-            destino = None
-
-            # Buscar si hay una calle o semáforo en la celda vecina
-            for obj in self.model.grid.get_cell_list_contents(neigh.pos):
-                if isinstance(obj, Calle):
-                    calle = obj
-                elif isinstance(obj, Semaforo):
-                    semaforo = obj
-                elif isinstance(obj, Coche):
-                    coche = obj
-                elif isinstance(obj, Destino):
-                    destino = obj
-
-            # Prioriza destino
-            if destino == self.destino:
-                new_pos = self.destino.pos
-                break      
-
-            # Respetar el semáforo si está en rojo
-            if semaforo and not semaforo.green:
-                continue  # No avanzar si el semáforo está en rojo
-
-            if calle and not coche:
-                add_possible_step(calle, direction, self.pos, self.last_pos)
+        for paso, semaforo in sucesores:
+            if not self.libre(paso, semaforo):
+                continue
+            if paso in self.recent_positions:
+                visited_steps.append(paso)
+            else:
+                possible_steps.append(paso)
 
         # Calcular distancias a posibles pasos
-        if new_pos is None:
-            if possible_steps:
-                for paso in possible_steps:
-                    distancia = self.euc(paso, self.destino.pos)
-                    distancias.append(distancia)
-                new_pos = possible_steps[distancias.index(min(distancias))]
-            elif visited_steps:
-                distancias = []
-                for paso in visited_steps:
-                    distancia = self.euc(paso, self.destino.pos)
-                    distancias.append(distancia)
-                new_pos = visited_steps[distancias.index(min(distancias))]
-            else:
-                return
-
-        # Verificar si la nueva posición ya está ocupada o reservada por otro coche
-        if new_pos in self.model.reservas and self.model.reservas[new_pos] != self.unique_id:
-            return
-        
-        # Mover el coche a la nueva posición
-        self.model.reservas[new_pos] = self.unique_id  # Reservar la nueva posición
-        if current_pos in self.model.reservas:
-            del self.model.reservas[current_pos]  # Liberar la reserva actual
-        self.model.grid.move_agent(self, new_pos)
+        if possible_steps:
+            for paso in possible_steps:
+                distancia = self.euc(paso, self.destino.pos)
+                distancias.append(distancia)
+            return possible_steps[distancias.index(min(distancias))]
+        elif visited_steps:
+            for paso in visited_steps:
+                distancia = self.euc(paso, self.destino.pos)
+                distancias.append(distancia)
+            return visited_steps[distancias.index(min(distancias))]
+        return None
+
+    def en_destino(self):
+        """Indica si el coche está en un destino (el suyo o uno ajeno) y debe salir de la simulación."""
+        return self.pos in self.model.destinos_por_pos
+
+    def proponer(self):
+        """Elige la celda a la que quiere avanzar en este paso, o None si se queda.
+
+        Sólo lee el estado del modelo (semáforos y ocupación al inicio del paso),
+        así que todos los coches pueden proponer en cualquier orden.
+        """
+        current_pos = self.pos
+
+        # Movimientos legales precalculados por el modelo para la calle actual
+        sucesores, destinos_vecinos = self.model.transiciones_de(current_pos)
+
+        # Prioriza destino
+        if self.destino.pos in destinos_vecinos:
+            return self.destino.pos if self.model.celda_libre(self.destino.pos) else None
+
+        ruta = self.model.ruta_hacia(self.destino)
+        distancia_actual = ruta.distancia_a(current_pos)
+        if distancia_actual < 0:
+            # Sin camino conocido: avanzar hacia el paso más cercano al destino
+            return self.paso_voraz(sucesores)
+        return self.paso_ruteado(sucesores, ruta, distancia_actual)
+
+    def avanzar(self, new_pos):
+        """Mueve el coche a la celda que le asignó el modelo."""
+        current_pos = self.pos
+        self.model._mover_coche(self, new_pos)
         self.last_pos = current_pos
+        self.paso_entrada = self.model.step_counter
 
         # Actualizar historial de posiciones recientes
-        self.recent_positions.append(current_pos)
\ No newline at end of file
+        self.recent_positions.append(current_pos)
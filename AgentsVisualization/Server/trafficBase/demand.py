@@ -0,0 +1,202 @@
+import numpy as np
+
+ORIGENES = ("bordes", "destinos", "todos")
+
+
+class TablaAlias:
+    """ Muestreo de una distribución discreta en tiempo constante por muestra (método de alias de Vose).
+
+    La tabla se arma una vez en O(n); después cada muestra es un entero y un
+    número aleatorio, así que se pueden sacar miles de muestras con dos
+    operaciones de arreglos.
+    """
+    def __init__(self, pesos):
+        pesos = np.asarray(pesos, dtype=np.float64).ravel()
+        if len(pesos) == 0 or (pesos < 0).any() or not np.isfinite(pesos).all() or pesos.sum() <= 0:
+            raise ValueError("Los pesos deben ser no negativos, finitos y con suma positiva.")
+        n = len(pesos)
+        escalado = pesos * n / pesos.sum()
+        self.probabilidad = np.ones(n)
+        self.alias = np.arange(n)
+
+        pequenos = np.flatnonzero(escalado < 1).tolist()
+        grandes = np.flatnonzero(escalado >= 1).tolist()
+        escalado = escalado.tolist()
+        while pequenos and grandes:
+            chico = pequenos.pop()
+            grande = grandes.pop()
+            self.probabilidad[chico] = escalado[chico]
+            self.alias[chico] = grande
+            escalado[grande] += escalado[chico] - 1
+            (pequenos if escalado[grande] < 1 else grandes).append(grande)
+        # Lo que sobra tiene probabilidad 1 salvo por redondeo
+
+    def muestrear(self, rng, cantidad):
+        """Devuelve cantidad índices con probabilidad proporcional a los pesos."""
+        columnas = rng.integers(0, len(self.probabilidad), cantidad)
+        return np.where(rng.random(cantidad) < self.probabilidad[columnas], columnas, self.alias[columnas])
+
+
+def puntos_aparicion(compilado, origenes="todos"):
+    """Celdas de calle donde pueden aparecer coches, ordenadas por celda (y * width + x).
+
+    "bordes": calles en el borde del mapa desde las que se puede avanzar.
+    "destinos": calles desde las que se entra a un destino (los coches salen de ahí).
+    "todos": ambas. También acepta una lista de posiciones [x, y] de calles.
+    """
+    width, height = compilado.width, compilado.height
+    calles = compilado.tipos == 2
+    if not isinstance(origenes, str):
+        celdas = np.array([y * width + x for x, y in origenes], dtype=np.int64)
+        validas = (celdas >= 0) & (celdas < width * height)
+        if len(celdas) == 0 or not validas.all() or not calles[celdas].all():
+            raise ValueError("Los orígenes deben ser posiciones [x, y] de calles dentro del mapa.")
+        return np.unique(celdas)
+    if origenes not in ORIGENES:
+        raise ValueError(f"Orígenes desconocidos: {origenes}")
+
+    puntos = []
+    if origenes in ("bordes", "todos"):
+        x = np.arange(width * height) % width
+        y = np.arange(width * height) // width
+        borde = (x == 0) | (x == width - 1) | (y == 0) | (y == height - 1)
+        puntos.append(np.flatnonzero(calles & borde & compilado.legal.any(axis=1)))
+    if origenes in ("destinos", "todos"):
+        puntos.append(np.flatnonzero(calles & compilado.a_destino.any(axis=1)))
+    celdas = np.unique(np.concatenate(puntos))
+    if len(celdas) == 0:
+        raise ValueError("El mapa no tiene puntos de aparición.")
+    return celdas
+
+
+class Demanda:
+    """ Generador de demanda con matrices origen-destino y perfiles por hora del día.
+
+    config es un diccionario (se recibe tal cual en /init):
+    - "origenes": "bordes", "destinos", "todos" (por defecto) o lista de [x, y]
+      (ver puntos_aparicion). Los orígenes quedan ordenados por celda.
+    - "componentes": lista de flujos. Cada uno tiene "tasa" (coches por paso en
+      la hora pico), "perfil" (multiplicador por tramo del día, por defecto [1])
+      y los pesos del viaje: "matriz" (orígenes x destinos) o "pesos_origen" y
+      "pesos_destino" (la matriz es su producto). Sin pesos todos los pares son
+      igual de probables. Nunca se pide ir al destino que está junto al origen.
+    - "duracion_dia": pasos que dura un día (los tramos del perfil lo dividen).
+    - "cola_max": coches esperando como máximo; los que no caben se descartan.
+
+    Cada paso la cantidad de coches de cada componente es Poisson con media
+    tasa * perfil[tramo] y los pares origen-destino se sacan de una TablaAlias.
+    Los coches pedidos esperan en la cola de su origen y salen, el más antiguo
+    primero, cuando la celda del origen está libre: un origen bloqueado sólo
+    hace crecer su cola, ya no detiene la simulación.
+    """
+    def __init__(self, compilado, config, semilla):
+        self.config = config
+        self.rng = np.random.default_rng(semilla)
+        self.origenes = puntos_aparicion(compilado, config.get("origenes", "todos"))
+        self.duracion_dia = int(config.get("duracion_dia", 1440))
+        self.cola_max = int(config.get("cola_max", 100000))
+        if self.duracion_dia < 1 or self.cola_max < 0:
+            raise ValueError("duracion_dia debe ser positiva y cola_max no negativa.")
+
+        width = compilado.width
+        destinos = np.array([y * width + x for x, y in compilado.destinos], dtype=np.int64)
+        if len(destinos) == 0:
+            raise ValueError("El mapa no tiene destinos.")
+        self.num_destinos = len(destinos)
+
+        # Pares imposibles: el origen está junto a su destino
+        junto = np.zeros((len(self.origenes), len(destinos)), dtype=bool)
+        indice_destino = {celda: k for k, celda in enumerate(destinos.tolist())}
+        for k, celda in enumerate(self.origenes.tolist()):
+            for vecino in compilado.vecinos[celda][compilado.a_destino[celda]].tolist():
+                junto[k, indice_destino[vecino]] = True
+
+        self.componentes = []  # (TablaAlias de pares, tasa, perfil)
+        for componente in config.get("componentes", []):
+            tasa = float(componente.get("tasa", 0))
+            perfil = np.asarray(componente.get("perfil", [1.0]), dtype=np.float64)
+            if tasa < 0 or len(perfil) == 0 or (perfil < 0).any():
+                raise ValueError("La tasa y el perfil de cada componente deben ser no negativos.")
+            matriz = self._matriz(componente, len(self.origenes), len(destinos))
+            matriz[junto] = 0
+            self.componentes.append((TablaAlias(matriz), tasa, perfil))
+
+        # Cola de coches pedidos en orden de llegada
+        self.cola_origen = np.zeros(0, dtype=np.int64)
+        self.cola_destino = np.zeros(0, dtype=np.int64)
+        self.cola_pedido = np.zeros(0, dtype=np.int64)
+        self.descartados = 0
+        self.liberados = 0
+        self.espera_total = 0  # Pasos que esperaron en la cola los coches que ya salieron
+
+    @staticmethod
+    def _matriz(componente, num_origenes, num_destinos):
+        """Pesos origen-destino de un componente, arreglo (orígenes, destinos)."""
+        if "matriz" in componente:
+            matriz = np.array(componente["matriz"], dtype=np.float64)
+            if matriz.shape != (num_origenes, num_destinos):
+                raise ValueError(f"La matriz debe ser de {num_origenes} orígenes x {num_destinos} destinos.")
+            return matriz
+        origen = np.asarray(componente.get("pesos_origen", np.ones(num_origenes)), dtype=np.float64)
+        destino = np.asarray(componente.get("pesos_destino", np.ones(num_destinos)), dtype=np.float64)
+        if origen.shape != (num_origenes,) or destino.shape != (num_destinos,):
+            raise ValueError(f"Se esperan {num_origenes} pesos de origen y {num_destinos} de destino.")
+        return np.outer(origen, destino)
+
+    @property
+    def en_espera(self):
+        return len(self.cola_origen)
+
+    def tasa(self, paso):
+        """Coches pedidos por paso en promedio durante el paso dado."""
+        tramo = paso % self.duracion_dia
+        return sum(tasa * perfil[tramo * len(perfil) // self.duracion_dia] for _, tasa, perfil in self.componentes)
+
+    def _pedir(self, paso):
+        """Saca los viajes pedidos en este paso y los agrega a la cola."""
+        tramo = paso % self.duracion_dia
+        origenes = [self.cola_origen]
+        destinos = [self.cola_destino]
+        for tabla, tasa, perfil in self.componentes:
+            cantidad = self.rng.poisson(tasa * perfil[tramo * len(perfil) // self.duracion_dia])
+            if cantidad == 0:
+                continue
+            pares = tabla.muestrear(self.rng, cantidad)
+            origenes.append(pares // self.num_destinos)
+            destinos.append(pares % self.num_destinos)
+        nuevos = sum(len(o) for o in origenes[1:])
+        if nuevos == 0:
+            return
+
+        # Si la cola se llena se descartan los pedidos más nuevos
+        sobran = max(0, len(self.cola_origen) + nuevos - self.cola_max)
+        total = len(self.cola_origen) + nuevos - sobran
+        self.descartados += sobran
+        self.cola_origen = np.concatenate(origenes)[:total]
+        self.cola_destino = np.concatenate(destinos)[:total]
+        self.cola_pedido = np.concatenate([self.cola_pedido, np.full(nuevos - sobran, paso, dtype=np.int64)])
+
+    def step(self, paso, ocupada):
+        """Pide los viajes del paso y devuelve (celdas, índices de destino) de los coches que salen.
+
+        ocupada es un arreglo por celda, distinto de cero si hay un coche. Sale a
+        lo más un coche por origen: el primero de su cola, si la celda está libre.
+        """
+        self._pedir(paso)
+        if len(self.cola_origen) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        _, primeros = np.unique(self.cola_origen, return_index=True)
+        celdas = self.origenes[self.cola_origen[primeros]]
+        libres = ocupada[celdas] == 0
+        salen = primeros[libres]
+        destinos = self.cola_destino[salen]
+        self.liberados += len(salen)
+        self.espera_total += int((paso - self.cola_pedido[salen]).sum())
+
+        quedan = np.ones(len(self.cola_origen), dtype=bool)
+        quedan[salen] = False
+        self.cola_origen = self.cola_origen[quedan]
+        self.cola_destino = self.cola_destino[quedan]
+        self.cola_pedido = self.cola_pedido[quedan]
+        return celdas[libres], destinos
@@ -0,0 +1,344 @@
+import numpy as np
+from trafficBase.rerouting import observar_tiempos
+from trafficBase.routing import ESPERA_DESVIO
+
+
+class ReglasMovimiento:
+    """ Reglas de movimiento de los coches sobre arreglos.
+
+    La usan MotorVectorizado y las franjas de MotorParticionado. Necesita los
+    arreglos de coches (celda, destino, ultima, ids, entrada), las tablas del
+    mapa (vecinos, legal, a_destino, distancias, destino_celda, destino_x,
+    destino_y), el estado de las celdas (ocupada, rojo) y width. Con reruteo
+    también peso, tiempo y siguiente (ver Reruteo); si no, peso es None.
+    """
+    def _proponer(self, paso):
+        """Elige la celda a la que quiere avanzar cada coche contra la foto fija del paso.
+
+        Devuelve (índices de los coches que quieren moverse, celdas objetivo).
+        """
+        n = len(self.celda)
+        filas = np.arange(n)
+        candidatos = self.vecinos[self.celda]  # (n, 4)
+        existe = candidatos >= 0
+        seguros = np.where(existe, candidatos, 0)
+
+        libres = existe & ~self.ocupada[seguros] & (candidatos != self.ultima[:, None])
+        validos = self.legal[self.celda] & libres & ~self.rojo[seguros]
+        al_destino = self.a_destino[self.celda] & libres & (candidatos == self.destino_celda[self.destino][:, None])
+
+        distancias = self.distancias[self.destino[:, None], seguros]
+        distancia_actual = self.distancias[self.destino, self.celda]
+        ruteado = distancia_actual >= 0
+
+        # Coches con ruta: siguen la tabla sin alejarse del destino, salvo los que
+        # llevan más de ESPERA_DESVIO pasos detenidos (aceptan un desvío)
+        puntaje = distancias.astype(np.float64)
+        if self.peso is not None:
+            # Con reruteo: tiempo de la arista más el que falta desde la vecina
+            puntaje += self.peso[self.celda]
+        desvio = paso - self.entrada > ESPERA_DESVIO
+        validos_ruta = validos & (distancias >= 0) & ((distancias <= distancia_actual[:, None]) | desvio[:, None])
+
+        # Coches sin ruta conocida: paso más cercano en línea recta
+        cx = seguros % self.width
+        cy = seguros // self.width
+        dx = cx - self.destino_x[self.destino][:, None]
+        dy = cy - self.destino_y[self.destino][:, None]
+        puntaje = np.where(ruteado[:, None], puntaje, np.sqrt(dx * dx + dy * dy))
+        validos = np.where(ruteado[:, None], validos_ruta, validos)
+
+        validos |= al_destino
+        puntaje[al_destino] = -1.0
+        puntaje[~validos] = np.inf
+
+        eleccion = puntaje.argmin(axis=1)
+        se_mueve = np.isfinite(puntaje[filas, eleccion])
+        moviles = filas[se_mueve]
+        return moviles, candidatos[moviles, eleccion[se_mueve]]
+
+    @staticmethod
+    def _ganadores(ids, objetivos):
+        """Índices de las propuestas ganadoras: por cada celda objetivo gana el menor id.
+
+        Las propuestas sólo van a celdas libres, así que un intercambio o un ciclo
+        de coches no se resuelve aquí sino con el desvío de _proponer.
+        """
+        orden = np.lexsort((ids, objetivos))
+        primero = np.ones(len(orden), dtype=bool)
+        primero[1:] = objetivos[orden[1:]] != objetivos[orden[:-1]]
+        return orden[primero]
+
+    def _observar(self, paso, moviles, objetivos):
+        """Pasa a los tiempos por arista los coches que salen (moviles, objetivos) y los que se quedan."""
+        if self.peso is None:
+            return
+        quietos = np.ones(len(self.celda), dtype=bool)
+        quietos[moviles] = False
+        observar_tiempos(self.tiempo, self.siguiente, self.width, paso,
+                         (self.celda[moviles], objetivos, self.entrada[moviles]),
+                         (self.celda[quietos], self.destino[quietos], self.entrada[quietos]))
+
+
+class MotorVectorizado(ReglasMovimiento):
+    """ Motor alternativo que avanza todos los coches y semáforos con operaciones de arreglos.
+
+    Los coches y semáforos no son agentes de mesa: se guardan como arreglos
+    (celda actual, destino, última celda, temporizadores) y se actualizan en
+    bloque. Las celdas se indexan como y * width + x.
+
+    Reglas de cada paso:
+    - Los coches que están en su destino se cuentan y se eliminan.
+    - Cada coche propone un movimiento contra una foto fija de semáforos y
+      ocupación al inicio del paso (sólo puede entrar a celdas libres). Un coche
+      que lleva más de ESPERA_DESVIO pasos detenido acepta un desvío.
+    - Si varios coches proponen la misma celda, gana el más antiguo (menor id).
+    - Después de mover los coches se actualizan los semáforos.
+    """
+    nombre = "vectorizado"
+
+    def __init__(self, model):
+        self.model = model
+        width, height = model.width, model.height
+        self.width = width
+        celdas = width * height
+
+        # Vecinos y movimientos legales por celda (compartidos con el mapa compilado)
+        compilado = model.mapa_compilado
+        self.vecinos = compilado.vecinos
+        self.legal = compilado.legal
+        self.a_destino = compilado.a_destino
+
+        # Destinos y sus tablas de distancia (una fila por destino)
+        self.destino_celda = np.array([d.pos[1] * width + d.pos[0] for d in model.destinos], dtype=np.int32)
+        self.destino_x = np.array([d.pos[0] for d in model.destinos], dtype=np.int32)
+        self.destino_y = np.array([d.pos[1] for d in model.destinos], dtype=np.int32)
+        self.es_destino = np.zeros(celdas, dtype=bool)  # Celdas de destino (los coches que están ahí salen)
+        self.es_destino[self.destino_celda] = True
+        reruteo = model.reruteo
+        if reruteo is not None:
+            # Compartidas con el reruteo, que las repara en su lugar
+            self.distancias = reruteo.distancias
+            self.siguiente = reruteo.siguiente
+            self.peso = reruteo.peso
+            self.tiempo = reruteo.tiempo
+        elif model.destinos:
+            self.distancias = np.stack([model.ruta_hacia(d).distancia for d in model.destinos])
+            self.peso = None
+        else:
+            self.distancias = np.full((0, celdas), -1, dtype=np.int32)
+            self.peso = None
+
+        # Semáforos: se sacan del schedule, el estado lo lleva el controlador de cruces
+        semaforos = list(model.semaforos.items())
+        self.semaforo_ids = [s.unique_id for _, s in semaforos]
+        self.semaforo_indice = {unique_id: k for k, unique_id in enumerate(self.semaforo_ids)}
+        self.semaforo_direccion = [s.direction for _, s in semaforos]
+        self.semaforo_celda = np.array([y * width + x for (x, y), _ in semaforos], dtype=np.int32)
+        self.semaforo_verde = model.controlador.verde  # Compartido: el controlador lo actualiza en su lugar
+        for _, semaforo in semaforos:
+            model.schedule.remove(semaforo)
+        self.rojo = np.zeros(celdas, dtype=bool)
+        self.rojo[self.semaforo_celda[~self.semaforo_verde]] = True
+
+        # Coches (en orden de creación)
+        self.celda = np.zeros(0, dtype=np.int32)
+        self.destino = np.zeros(0, dtype=np.int32)
+        self.ultima = np.zeros(0, dtype=np.int32)
+        self.creado = np.zeros(0, dtype=np.int32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.entrada = np.zeros(0, dtype=np.int32)  # Paso en el que cada coche entró a su celda
+        self.ocupada = np.zeros(celdas, dtype=bool)
+
+    @property
+    def num_coches(self):
+        return len(self.celda)
+
+    def _agregar_coches(self):
+        """Crea coches en las esquinas libres con la misma regla que el modelo de mesa."""
+        model = self.model
+        nuevas = []
+        destinos = []
+        for x, y in model._esquinas():
+            indice = y * self.width + x
+            if self.ocupada[indice] or indice in nuevas:
+                continue
+            destinos.append(model.random.randrange(len(model.destinos)))
+            nuevas.append(indice)
+        self._agregar_lote(np.array(nuevas, dtype=np.int64), np.array(destinos, dtype=np.int64))
+        return bool(nuevas)
+
+    def _agregar_lote(self, celdas, destinos):
+        """Crea un coche en cada celda (libre) hacia el destino con el mismo índice, con ids consecutivos."""
+        model = self.model
+        cantidad = len(celdas)
+        ids = np.arange(model.next_id, model.next_id + cantidad, dtype=np.int64)
+        self.ocupada[celdas] = True
+        paso = np.full(cantidad, model.step_counter)
+        self._anexar(celdas, destinos, np.full(cantidad, -1), paso, ids, paso)
+        if not model._rapido:
+            for ident in ids.tolist():
+                model._marcar_cambio(f"Coche-{ident}")
+        model.next_id += cantidad
+        model.coches_creados += cantidad
+
+    def _anexar(self, celda, destino, ultima, creado, ids, entrada):
+        """Agrega coches al final de los arreglos."""
+        self.celda = np.concatenate([self.celda, celda.astype(np.int32)])
+        self.destino = np.concatenate([self.destino, destino.astype(np.int32)])
+        self.ultima = np.concatenate([self.ultima, ultima.astype(np.int32)])
+        self.creado = np.concatenate([self.creado, creado.astype(np.int32)])
+        self.ids = np.concatenate([self.ids, ids.astype(np.int64)])
+        self.entrada = np.concatenate([self.entrada, entrada.astype(np.int32)])
+
+    def _registrar_llegadas(self):
+        """Elimina los coches que están en un destino y cuenta los que llegaron al suyo (como RandomModel)."""
+        llegaron = self.es_destino[self.celda]
+        if not llegaron.any():
+            return
+        propios = self.celda == self.destino_celda[self.destino]
+        self.model.coches_destino += int(propios.sum())
+        self.model.pasos_totales += int((self.model.step_counter - self.creado[propios]).sum())
+        self.ocupada[self.celda[llegaron]] = False
+        for ident in self.ids[llegaron].tolist():
+            self.model._marcar_baja(f"Coche-{ident}")
+        quedan = ~llegaron
+        self.celda = self.celda[quedan]
+        self.destino = self.destino[quedan]
+        self.ultima = self.ultima[quedan]
+        self.creado = self.creado[quedan]
+        self.ids = self.ids[quedan]
+        self.entrada = self.entrada[quedan]
+
+    def _mover_coches(self):
+        """Propone un movimiento por coche y resuelve los conflictos de forma determinista."""
+        if self.num_coches == 0:
+            return
+        paso = self.model.step_counter
+        moviles, objetivos = self._proponer(paso)
+
+        # Conflictos: por cada celda objetivo gana el coche más antiguo
+        ganadores = self._ganadores(self.ids[moviles], objetivos)
+        moviles = moviles[ganadores]
+        objetivos = objetivos[ganadores]
+        self._observar(paso, moviles, objetivos)
+
+        self.ocupada[self.celda[moviles]] = False
+        self.ocupada[objetivos] = True
+        self.ultima[moviles] = self.celda[moviles]
+        self.celda[moviles] = objetivos
+        self.entrada[moviles] = paso
+        for ident in self.ids[moviles].tolist():
+            self.model._marcar_cambio(f"Coche-{ident}")
+
+    def _actualizar_semaforos(self):
+        """Avanza el controlador de cruces y actualiza las celdas en rojo."""
+        for k in self.model.controlador.step(self.ocupada).tolist():
+            self.model._marcar_cambio(self.semaforo_ids[k])
+        self.rojo[:] = False
+        self.rojo[self.semaforo_celda[~self.semaforo_verde]] = True
+
+    def step(self):
+        """Avanza un paso del motor (el modelo ya incrementó step_counter)."""
+        model = self.model
+        perfil = model.perfil
+        if model.demanda is not None:
+            self._agregar_lote(*model.demanda.step(model.step_counter, self.ocupada))
+        elif model.step_counter % model.periodo_aparicion == 0:
+            # Detener la simulación si no se agregaron coches
+            if not self._agregar_coches():
+                model.running = False
+        if perfil:
+            perfil.marcar("aparicion")
+
+        self._registrar_llegadas()
+        if perfil:
+            perfil.marcar("llegadas")
+        self._mover_coches()
+        if perfil:
+            perfil.marcar("coches", self.num_coches)
+        self._actualizar_semaforos()
+        if perfil:
+            perfil.marcar("semaforos", len(self.semaforo_ids))
+
+        # Los coches sólo entran a celdas libres y cada celda tiene un solo ganador,
+        # así que nunca hay dos coches en la misma celda
+        model.accidentes = 0
+
+    def coches(self):
+        """Arreglos de los coches en orden de creación (ver snapshot.py)."""
+        return {"celda": self.celda, "destino": self.destino, "ultima": self.ultima,
+                "creado": self.creado, "ids": self.ids, "entrada": self.entrada}
+
+    def cargar_coches(self, celda, destino, ultima, creado, ids, entrada):
+        """Reemplaza todos los coches (al restaurar una instantánea) y recalcula las celdas ocupadas y en rojo."""
+        self.celda = celda
+        self.destino = destino
+        self.ultima = ultima
+        self.creado = creado
+        self.ids = ids
+        self.entrada = entrada
+        self.ocupada[:] = False
+        self.ocupada[celda] = True
+        self.rojo[:] = False
+        self.rojo[self.semaforo_celda[~self.semaforo_verde]] = True
+
+    def cerrar(self):
+        """Libera los recursos del motor (este no tiene ninguno)."""
+        pass
+
+    def agentes_dinamicos(self, ids=None, historial=True):
+        """Devuelve coches y semáforos con el mismo formato que /getDynamicAgents.
+
+        Con ids sólo se incluyen esos agentes. El motor no guarda historial, así
+        que recent_positions siempre va vacío.
+        """
+        model = self.model
+        coches = np.arange(self.num_coches)
+        semaforos = range(len(self.semaforo_ids))
+        if ids is not None:
+            numeros = [int(i[len("Coche-"):]) for i in ids if i.startswith("Coche-")]
+            coches = np.flatnonzero(np.isin(self.ids, numeros))
+            semaforos = sorted(self.semaforo_indice[i] for i in ids if i in self.semaforo_indice)
+
+        agentes = []
+        for ident, celda, destino in zip(self.ids[coches].tolist(), self.celda[coches].tolist(),
+                                         self.destino[coches].tolist()):
+            agente = {
+                "id": f"Coche-{ident}",
+                "type": "Coche",
+                "pos": (celda % self.width, celda // self.width),
+                "destination": model.destinos[destino].unique_id,
+            }
+            if historial:
+                agente["recent_positions"] = []
+            agentes.append(agente)
+        for k in semaforos:
+            celda = int(self.semaforo_celda[k])
+            agentes.append({
+                "id": self.semaforo_ids[k],
+                "type": "Semaforo",
+                "pos": (celda % self.width, celda // self.width),
+                "state": bool(self.semaforo_verde[k]),
+                "direction": self.semaforo_direccion[k],
+            })
+        return agentes
+
+    def arreglos_dinamicos(self, ids=None):
+        """Devuelve coches y semáforos como arreglos (ver RandomModel.arreglos_dinamicos)."""
+        coches = slice(None)
+        semaforos = np.arange(len(self.semaforo_ids))
+        if ids is not None:
+            numeros = [int(i[len("Coche-"):]) for i in ids if i.startswith("Coche-")]
+            coches = np.isin(self.ids, numeros)
+            semaforos = np.array(sorted(self.semaforo_indice[i] for i in ids if i in self.semaforo_indice),
+                                 dtype=np.int64)
+
+        celdas = self.celda[coches]
+        return {
+            "coche_ids": self.ids[coches].astype(np.uint32),
+            "coche_pos": np.stack([celdas % self.width, celdas // self.width], axis=1).astype(np.uint16),
+            "coche_destinos": self.destino[coches].astype(np.uint16),
+            "semaforo_indices": semaforos.astype(np.uint16),
+            "semaforo_verde": self.semaforo_verde[semaforos],
+        }
@@ -0,0 +1,44 @@
+class RejillaDispersa:
+    """ Rejilla con la interfaz de mesa.space.MultiGrid que sólo guarda las celdas con agentes.
+
+    MultiGrid crea una lista por celda aunque esté vacía; en el modelo sólo hay
+    agentes en semáforos, destinos y coches (el terreno vive en el mapa
+    compilado), así que aquí cada celda ocupada es una entrada de un
+    diccionario posición -> lista de agentes. Tiene lo que usan el modelo y
+    CanvasGrid de la visualización de mesa (ver server.py).
+    """
+    def __init__(self, width, height, torus=False):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self._celdas = {}
+
+    def place_agent(self, agent, pos):
+        self._celdas.setdefault(pos, []).append(agent)
+        agent.pos = pos
+
+    def remove_agent(self, agent):
+        agentes = self._celdas[agent.pos]
+        agentes.remove(agent)
+        if not agentes:
+            del self._celdas[agent.pos]
+        agent.pos = None
+
+    def move_agent(self, agent, pos):
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def get_cell_list_contents(self, cell_list):
+        """Agentes en una posición (x, y) o en una lista de posiciones."""
+        if isinstance(cell_list, tuple) and len(cell_list) == 2 and isinstance(cell_list[0], int):
+            cell_list = [cell_list]
+        return [agent for pos in cell_list for agent in self._celdas.get(tuple(pos), ())]
+
+    def is_cell_empty(self, pos):
+        return pos not in self._celdas
+
+    def coord_iter(self):
+        """Recorre todas las celdas como MultiGrid: (agentes, (x, y))."""
+        for x in range(self.width):
+            for y in range(self.height):
+                yield list(self._celdas.get((x, y), ())), (x, y)
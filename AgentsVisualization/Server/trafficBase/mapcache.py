@@ -0,0 +1,142 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Tipos de celda estática (el índice es el código guardado en MapaCompilado.tipos)
+TIPOS_CELDA = ["", "Edificio", "Calle", "Destino"]
+SIN_DIRECCION = 255
+
+# Caracter del mapa -> (tipo, dirección de la calle)
+_CARACTERES = {
+    "#": (1, SIN_DIRECCION),
+    "^": (2, 0), ">": (2, 1), "v": (2, 2), "<": (2, 3),
+    "A": (2, 0), "d": (2, 1), "B": (2, 2), "i": (2, 3),
+    "D": (3, SIN_DIRECCION),
+}
+# Semáforos: caracter -> verde al inicio
+_SEMAFOROS = {"A": True, "B": True, "i": False, "d": False}
+
+_TABLA_TIPOS = np.zeros(256, dtype=np.uint8)
+_TABLA_DIRECCIONES = np.full(256, SIN_DIRECCION, dtype=np.uint8)
+for _caracter, (_tipo, _direccion) in _CARACTERES.items():
+    _TABLA_TIPOS[ord(_caracter)] = _tipo
+    _TABLA_DIRECCIONES[ord(_caracter)] = _direccion
+
+# Orden de los movimientos en las tablas por celda: (dx, dy, dirección que impide el movimiento)
+MOVIMIENTOS = ((1, 0, 3), (-1, 0, 1), (0, 1, 2), (0, -1, 0))
+
+MAX_MAPAS = 32  # Mapas compilados que se conservan en memoria
+
+
+def hash_mapa(mapa):
+    """Hash del contenido del mapa, usado como llave del caché y como ETag."""
+    return hashlib.sha1("\n".join(mapa).encode("utf-8")).hexdigest()
+
+
+class MapaCompilado:
+    """ Mapa interpretado una sola vez y compartido por todos los modelos que lo usan.
+
+    Guarda el tipo y la dirección de cada celda en arreglos (celda = y * width + x,
+    con y = 0 en la fila de abajo), las listas de semáforos y destinos, y tablas
+    que sólo dependen de la red de calles. Para cada celda y movimiento k de
+    MOVIMIENTOS: vecinos[celda, k] es la celda vecina (-1 fuera del mapa),
+    legal[celda, k] indica si se puede avanzar a esa calle, a_destino[celda, k]
+    si la vecina es un destino y previos[celda, k] la celda desde la que se llega
+    con el movimiento k (-1 si no hay). También guarda las rutas por destino y
+    las respuestas estáticas ya serializadas. Nada de esto se modifica después
+    de calcularse.
+    """
+    def __init__(self, mapa):
+        self.hash = hash_mapa(mapa)
+        self.filas = list(mapa)  # Texto original (para instantáneas)
+        self.height = len(mapa)
+        self.width = len(mapa[0]) if mapa else 0
+
+        # Invertir el mapa para que (0, 0) sea la esquina inferior izquierda
+        texto = "".join(fila[:self.width].ljust(self.width) for fila in reversed(mapa))
+        caracteres = np.frombuffer(texto.encode("ascii", "replace"), dtype=np.uint8)
+        self.tipos = _TABLA_TIPOS[caracteres]
+        self.direcciones = _TABLA_DIRECCIONES[caracteres]
+
+        # Semáforos y destinos en orden de celda: (x, y, dirección, verde) y (x, y)
+        self.semaforos = []
+        for caracter in _SEMAFOROS:
+            for indice in np.flatnonzero(caracteres == ord(caracter)).tolist():
+                x, y = indice % self.width, indice // self.width
+                self.semaforos.append((x, y, int(self.direcciones[indice]), _SEMAFOROS[caracter]))
+        self.semaforos.sort(key=lambda s: (s[1], s[0]))
+        self.destinos = [
+            (indice % self.width, indice // self.width)
+            for indice in np.flatnonzero(self.tipos == 3).tolist()
+        ]
+
+        self._construir_movimientos()
+
+        self.lock = threading.Lock()
+        self.rutas = {}  # Posición del destino -> Ruta
+        self._cargas = {}
+
+    def _construir_movimientos(self):
+        """Calcula vecinos, movimientos legales, destinos vecinos y predecesores de todas las celdas."""
+        celdas = self.width * self.height
+        indices = np.arange(celdas, dtype=np.int32)
+        x, y = indices % self.width, indices // self.width
+        calle = self.tipos == 2
+
+        self.vecinos = np.full((celdas, 4), -1, dtype=np.int32)
+        self.legal = np.zeros((celdas, 4), dtype=bool)
+        self.a_destino = np.zeros((celdas, 4), dtype=bool)
+        self.previos = np.full((celdas, 4), -1, dtype=np.int32)
+        for k, (dx, dy, prohibida) in enumerate(MOVIMIENTOS):
+            existe = (x + dx >= 0) & (x + dx < self.width) & (y + dy >= 0) & (y + dy < self.height)
+            origen = indices[existe]
+            vecino = origen + dy * self.width + dx
+            self.vecinos[origen, k] = vecino
+            # Se puede avanzar entre calles si ninguna de las dos va en sentido contrario
+            self.legal[origen, k] = (calle[origen] & calle[vecino] & (self.direcciones[origen] != prohibida)
+                                     & (self.direcciones[vecino] != prohibida))
+            self.a_destino[origen, k] = calle[origen] & (self.tipos[vecino] == 3)
+            desde = origen[self.legal[origen, k] | self.a_destino[origen, k]]
+            self.previos[desde + dy * self.width + dx, k] = desde
+
+    def tipo_celda(self, pos):
+        """Nombre del tipo de celda estática en pos ("" si está vacía)."""
+        return TIPOS_CELDA[self.tipos[pos[1] * self.width + pos[0]]]
+
+    def direccion_calle(self, pos):
+        """Dirección de la calle en pos, o None si no es calle."""
+        direccion = int(self.direcciones[pos[1] * self.width + pos[0]])
+        return None if direccion == SIN_DIRECCION else direccion
+
+    def carga(self, nombre, generar):
+        """Devuelve una respuesta serializada, generándola con generar() la primera vez."""
+        with self.lock:
+            datos = self._cargas.get(nombre)
+        if datos is None:
+            datos = generar()
+            with self.lock:
+                datos = self._cargas.setdefault(nombre, datos)
+        return datos
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compilar_mapa(mapa):
+    """Devuelve el MapaCompilado del mapa, reutilizando el del caché si ya existe."""
+    llave = hash_mapa(mapa)
+    with _cache_lock:
+        compilado = _cache.get(llave)
+        if compilado is not None:
+            _cache.move_to_end(llave)
+            return compilado
+
+    compilado = MapaCompilado(mapa)
+    with _cache_lock:
+        compilado = _cache.setdefault(llave, compilado)
+        _cache.move_to_end(llave)
+        while len(_cache) > MAX_MAPAS:
+            _cache.popitem(last=False)
+    return compilado
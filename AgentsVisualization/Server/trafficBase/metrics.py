@@ -0,0 +1,114 @@
+import csv
+import numpy as np
+
+
+class RegistroMetricas:
+    """ Almacén columnar de métricas con memoria acotada.
+
+    Reemplaza al DataCollector de mesa: cada métrica es una columna en un
+    arreglo preasignado que funciona como buffer circular, así que sólo se
+    conservan las últimas `capacidad` filas. Con `cada` > 1 se guarda una fila
+    cada tantos pasos. Todas las columnas comparten el tipo `dtype` (enteros por
+    defecto, porque las métricas del modelo son conteos). Opcionalmente las
+    filas se exportan por bloques a disco (CSV o archivos .npz numerados)
+    conforme avanza la simulación.
+    """
+    def __init__(self, model_reporters, capacidad=10000, cada=1, dtype=np.int64):
+        if capacidad < 1 or cada < 1:
+            raise ValueError("capacidad y cada deben ser mayores que cero.")
+        self.model_reporters = model_reporters
+        self.columnas = list(model_reporters)
+        self.capacidad = capacidad
+        self.cada = cada
+        self.datos = np.zeros((capacidad, len(self.columnas)), dtype=dtype)
+        self.pasos = np.zeros(capacidad, dtype=np.int64)
+        self.filas = 0  # Filas escritas desde el inicio (incluye las descartadas)
+        self.llamadas = 0
+
+        # Exportación por bloques
+        self._ruta = None
+        self._formato = None
+        self._tam_bloque = None
+        self._exportadas = 0  # Filas ya escritas a disco
+        self._bloques = 0
+
+    def collect(self, model):
+        """Guarda una fila con el valor actual de cada métrica."""
+        self.llamadas += 1
+        if (self.llamadas - 1) % self.cada:
+            return
+        fila = self.filas % self.capacidad
+        for k, reporter in enumerate(self.model_reporters.values()):
+            self.datos[fila, k] = reporter(model)
+        self.pasos[fila] = model.step_counter
+        self.filas += 1
+
+        if self._ruta is not None and self.filas - self._exportadas >= self._tam_bloque:
+            self.volcar()
+
+    def _indices(self, desde, hasta):
+        """Índices en el buffer de las filas [desde, hasta) en orden cronológico."""
+        return np.arange(desde, hasta) % self.capacidad
+
+    def _primera_fila(self):
+        return max(0, self.filas - self.capacidad)
+
+    def rango(self, desde=None, hasta=None):
+        """Devuelve las filas conservadas con desde <= paso <= hasta como columnas."""
+        indices = self._indices(self._primera_fila(), self.filas)
+        pasos = self.pasos[indices]
+        mascara = np.ones(len(indices), dtype=bool)
+        if desde is not None:
+            mascara &= pasos >= desde
+        if hasta is not None:
+            mascara &= pasos <= hasta
+        indices = indices[mascara]
+        resultado = {"pasos": self.pasos[indices].tolist()}
+        for k, columna in enumerate(self.columnas):
+            resultado[columna] = self.datos[indices, k].tolist()
+        return resultado
+
+    def get_model_vars_dataframe(self):
+        """Devuelve las filas conservadas como DataFrame de pandas (igual que DataCollector)."""
+        import pandas as pd
+
+        datos = self.rango()
+        return pd.DataFrame({columna: datos[columna] for columna in self.columnas}, index=datos["pasos"])
+
+    def exportar_a(self, ruta, formato="csv", tam_bloque=1000):
+        """Activa la exportación por bloques de tam_bloque filas a ruta.
+
+        En formato "csv" los bloques se agregan a un solo archivo; en "npz" cada
+        bloque se escribe como ruta_00000.npz, ruta_00001.npz, ...
+        """
+        if formato not in ("csv", "npz"):
+            raise ValueError(f"Formato desconocido: {formato}")
+        self._ruta = ruta
+        self._formato = formato
+        # Un bloque nunca puede ser mayor que lo que cabe en el buffer
+        self._tam_bloque = max(1, min(tam_bloque, self.capacidad))
+        self._exportadas = self._primera_fila()
+        self._bloques = 0
+        if formato == "csv":
+            with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+                csv.writer(archivo).writerow(["pasos"] + self.columnas)
+
+    def volcar(self):
+        """Escribe a disco las filas pendientes de exportar."""
+        if self._ruta is None or self._exportadas >= self.filas:
+            return
+        indices = self._indices(self._exportadas, self.filas)
+        if self._formato == "csv":
+            with open(self._ruta, "a", newline="", encoding="utf-8") as archivo:
+                escritor = csv.writer(archivo)
+                for paso, fila in zip(self.pasos[indices].tolist(), self.datos[indices].tolist()):
+                    escritor.writerow([paso] + fila)
+        else:
+            np.savez(
+                f"{self._ruta}_{self._bloques:05d}.npz",
+                pasos=self.pasos[indices],
+                datos=self.datos[indices],
+                columnas=np.array(self.columnas),
+            )
+        self._bloques += 1
+        self._exportadas = self.filas
@@ -1,20 +1,80 @@
 from mesa import Model
-from mesa.time import RandomActivation
-from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
+from mesa.time import BaseScheduler
+from collections import deque
+import numpy as np
 from trafficBase.agent import *
+from trafficBase.grid import RejillaDispersa
+from trafficBase.routing import calcular_ruta
+from trafficBase.mapcache import compilar_mapa, MOVIMIENTOS
+from trafficBase.engine import MotorVectorizado
+from trafficBase.partition import MotorParticionado
+from trafficBase.metrics import RegistroMetricas
+from trafficBase.signals import ControladorCruces
+from trafficBase.demand import Demanda
+from trafficBase.rerouting import Reruteo, observar_tiempos
+
+MOTORES = ("mesa", "vectorizado", "particionado")
 
 class RandomModel(Model):
-    def __init__(self, width, height, mapa):
+    """Modelo de tráfico de la ciudad.
+
+    motor="mesa" avanza los agentes de mesa por fases (ver _mover_coches); motor="vectorizado"
+    usa MotorVectorizado, que guarda coches y semáforos en arreglos de NumPy, y
+    motor="particionado" reparte ese motor en trabajadores procesos por franjas
+    del mapa (ver MotorParticionado; hay que llamar a cerrar() al terminar).
+    Las métricas se guardan en un RegistroMetricas que conserva las últimas
+    metricas_capacidad filas, una cada metricas_cada pasos; con exportar_metricas
+    además se escriben por bloques a ese archivo en formato_metricas ("csv" o
+    "npz", ver RegistroMetricas.exportar_a) y cerrar() escribe lo que falte,
+    así que las corridas largas no pierden filas. Cada coche recuerda
+    sus últimas historial_max posiciones y el modelo conserva los cambios de los
+    últimos cambios_max pasos para enviar sólo diferencias al cliente.
+    Cada periodo_aparicion pasos aparecen coches en las esquinas (y la simulación
+    se detiene cuando todas están ocupadas), salvo que se pase demanda: la
+    configuración de un generador con matrices origen-destino y colas por
+    origen (ver Demanda). Los semáforos se controlan por cruces con fases de
+    intervalo_semaforo pasos en el modo control_semaforos ("fijo", "onda" o
+    "actuado", ver ControladorCruces); seed fija el generador aleatorio.
+    Con periodo_reruteo los coches eligen su camino por tiempo estimado de
+    viaje en vez de por distancia: el modelo mide cuánto tardan en cada arista
+    y cada periodo_reruteo pasos repara las rutas (ver Reruteo).
+    """
+    def __init__(self, width, height, mapa, motor="mesa", metricas_capacidad=10000, metricas_cada=1,
+                 historial_max=20, cambios_max=100, periodo_aparicion=10, intervalo_semaforo=5,
+                 control_semaforos="fijo", seed=None, trabajadores=None, demanda=None, periodo_reruteo=None,
+                 umbral_reruteo=0.25, exportar_metricas=None, formato_metricas="csv"):
         super().__init__()
-        self.grid = MultiGrid(width, height, torus=False)
-        self.schedule = RandomActivation(self)
+        self.grid = RejillaDispersa(width, height)  # Sólo guarda celdas con semáforos, destinos o coches
+        self.schedule = BaseScheduler(self)  # Registro de agentes; el paso lo ordena step()
         self.running = True
+        self.periodo_aparicion = periodo_aparicion
+        self.intervalo_semaforo = intervalo_semaforo
+        self.trabajadores = trabajadores
         self.width = width
         self.height = height
         self.destinos = []
-        self.reservas = {}
+        self.reruteo = None  # Reruteo opcional; mientras no exista las rutas son las BFS del mapa
+
+        # Ocupación: celda (y * width + x) -> número del coche que la ocupa, 0 si está libre
+        self.ocupacion = np.zeros(width * height, dtype=np.int32)
+
+        # Tablas de la red de calles. Edificios y calles no son agentes: viven en
+        # los arreglos de self.mapa_compilado (ver tipo_celda y direccion_calle).
+        self.semaforos = {}  # Posición -> semáforo
+        self.destinos_por_pos = {}  # Posición -> destino
+        self.transiciones = {}  # Posición -> (sucesores legales, destinos vecinos), se llena al primer uso
+
         self.next_id = 1
+        self.historial_max = historial_max
+
+        # Registro de cambios por paso: (paso, ids cambiados, ids eliminados)
+        self.dinamicos = {}  # Id -> coche o semáforo
+        self.registro_cambios = deque(maxlen=cambios_max)
+        self._cambiados = set()
+        self._eliminados = set()
+        self._rapido = False  # En avanzar_rapido no se guardan métricas ni cambios
+        self.perfil = None  # PerfilPasos opcional con el tiempo de cada fase del paso
+
 
         # Contadores para métricas
         self.step_counter = 0
@@ -24,121 +84,308 @@ class RandomModel(Model):
         self.accidentes = 0
         self.total_accidentes = 0
 
-        self.datacollector = DataCollector(
+        # Estado incremental de las métricas (se actualiza con cada evento)
+        self.num_coches = 0  # Coches actualmente en el grid
+
+        self.datacollector = RegistroMetricas(
             model_reporters={
                 "Pasos Simulación": lambda m: m.step_counter,
                 "Coches Creados": lambda m: m.coches_creados,
                 "Coches al Destino": lambda m: m.coches_destino,
                 "Accidentes": lambda m: m.total_accidentes,
-                "Coches en el Grid": self._contar_coches,
-            }
+                "Coches en el Grid": lambda m: m._contar_coches(),
+            },
+            capacidad=metricas_capacidad,
+            cada=metricas_cada,
         )
+        if exportar_metricas is not None:
+            self.datacollector.exportar_a(exportar_metricas, formato_metricas)
 
-        # Inicializar edificios y semáforos basados en el mapa
-        self._initialize_canvas(mapa)
-
-    def _initialize_canvas(self, mapa):
-        """Coloca los respectivos agentes en las posiciones marcadas en el mapa."""
-        # Invertir el mapa para que (0, 0) sea la esquina inferior izquierda
-        mapa_invertido = mapa[::-1]
-
-        for y, row in enumerate(mapa_invertido):  # Recorrer filas del mapa invertido
-            for x, cell in enumerate(row):  # Recorrer columnas
-                if cell == '#':  # Si la celda tiene un edificio
-                    edificio = Edificio(f"Edificio-{x}-{y}", self)
-                    self.grid.place_agent(edificio, (x, y))
-                elif cell == "A" or cell == "B" or cell == "i" or cell == "d":  # Si la celda tiene un semáforo
-                    interval = 5 if cell == "A" or cell == "B" else 5  # Intervalo personalizado según el tipo de semáforo
-                    if cell == "A":
-                        street = Calle(f"Calle-{x}-{y}", self, direction=0)
-                        semaforo = Semaforo(f"Semaforo-{x}-{y}", self, change_interval=interval, direction=0)
-                        semaforo.green = True # Estado inicial
-                        self.grid.place_agent(semaforo, (x, y))
-                        self.schedule.add(semaforo)
-                        self.grid.place_agent(street, (x, y))
-                    elif cell == "B":
-                        street = Calle(f"Calle-{x}-{y}", self, direction=2)
-                        semaforo = Semaforo(f"Semaforo-{x}-{y}", self, change_interval=interval, direction=2)
-                        semaforo.green = True # Estado inicial
-                        self.grid.place_agent(semaforo, (x, y))
-                        self.schedule.add(semaforo)
-                        self.grid.place_agent(street, (x, y))
-                    if cell == "i":
-                        street = Calle(f"Calle-{x}-{y}", self, direction=3)
-                        semaforo = Semaforo(f"Semaforo-{x}-{y}", self, change_interval=interval, direction=3)
-                        semaforo.green = False # Estado inicial
-                        self.grid.place_agent(semaforo, (x, y))
-                        self.schedule.add(semaforo)
-                        self.grid.place_agent(street, (x, y))
-                    if cell == "d":
-                        street = Calle(f"Calle-{x}-{y}", self, direction=1)
-                        semaforo = Semaforo(f"Semaforo-{x}-{y}", self, change_interval=interval, direction=1)
-                        semaforo.green = False # Estado inicial
-                        self.grid.place_agent(semaforo, (x, y))
-                        self.schedule.add(semaforo)
-                        self.grid.place_agent(street, (x, y))
-                elif cell in ["^", ">", "v", "<"]:  # Si la celda tiene una calle
-                    direction = {"^": 0, ">": 1, "v": 2, "<": 3}[cell]  # Dirección según el símbolo
-                    street = Calle(f"Calle-{x}-{y}", self, direction=direction)
-                    self.grid.place_agent(street, (x, y)) 
-                elif cell == 'D':  # Si la celda tiene un edificio
-                    destino = Destino(f"Destino-{x}-{y}", self)
-                    self.grid.place_agent(destino, (x, y)) 
-                    self.destinos.append(destino)
-                    
-
-
-                
-    def _add_random_coche(self, corner):
-        """Añade un coche en una esquina aleatoria con un destino aleatorio."""
-        corners = [
+        # Inicializar edificios y semáforos basados en el mapa (compilado una vez por contenido)
+        self.mapa_compilado = compilar_mapa(mapa)
+        self._initialize_canvas(self.mapa_compilado)
+        self.controlador = ControladorCruces(self.mapa_compilado, control_semaforos, intervalo_semaforo)
+        self._lista_semaforos = list(self.semaforos.values())  # En el orden del controlador
+        # La demanda tiene su propio generador (de NumPy) sembrado desde el del modelo
+        self.demanda = Demanda(self.mapa_compilado, demanda, self.random.getrandbits(64)) if demanda else None
+        for semaforo in self.semaforos.values():
+            self.dinamicos[semaforo.unique_id] = semaforo
+
+        # Índices estables de semáforos y destinos (para formatos compactos)
+        self.indice_semaforo = {s.unique_id: k for k, s in enumerate(self.semaforos.values())}
+        self.indice_destino = {d.unique_id: k for k, d in enumerate(self.destinos)}
+        if periodo_reruteo:
+            if int(periodo_reruteo) < 1 or umbral_reruteo < 0:
+                raise ValueError("periodo_reruteo debe ser positivo y umbral_reruteo no negativo.")
+            self.reruteo = Reruteo(self, int(periodo_reruteo), umbral_reruteo)
+
+        # Motor opcional basado en arreglos
+        if motor == "vectorizado":
+            self.motor = MotorVectorizado(self)
+        elif motor == "particionado":
+            self.motor = MotorParticionado(self, trabajadores)
+        elif motor == "mesa":
+            self.motor = None
+        else:
+            raise ValueError(f"Motor desconocido: {motor}")
+
+    def _initialize_canvas(self, compilado):
+        """Coloca semáforos y destinos; el resto del mapa se consulta en los arreglos compilados."""
+        for x, y, direction, green in compilado.semaforos:
+            semaforo = Semaforo(f"Semaforo-{x}-{y}", self, direction=direction, green=green)
+            self.grid.place_agent(semaforo, (x, y))
+            self.schedule.add(semaforo)
+            self.semaforos[(x, y)] = semaforo
+
+        for x, y in compilado.destinos:
+            destino = Destino(f"Destino-{x}-{y}", self)
+            self.grid.place_agent(destino, (x, y))
+            self.destinos.append(destino)
+            self.destinos_por_pos[(x, y)] = destino
+
+    def tipo_celda(self, pos):
+        """Tipo de celda estática en pos: "Edificio", "Calle", "Destino" o "" si está vacía."""
+        return self.mapa_compilado.tipo_celda(pos)
+
+    def direccion_calle(self, pos):
+        """Dirección de la calle en pos (0: arriba, 1: derecha, 2: abajo, 3: izquierda), o None."""
+        return self.mapa_compilado.direccion_calle(pos)
+
+    def transiciones_de(self, pos):
+        """Movimientos legales desde pos: (sucesores con su semáforo, destinos vecinos).
+
+        La red de calles no cambia, así que cada celda se arma una sola vez a partir
+        de las tablas del mapa compilado y sólo para las celdas que visitan los coches.
+        Los coches sólo tienen que revisar el estado dinámico: color del semáforo y
+        ocupación.
+        """
+        transicion = self.transiciones.get(pos)
+        if transicion is None:
+            compilado = self.mapa_compilado
+            indice = pos[1] * self.width + pos[0]
+            sucesores = []
+            destinos_vecinos = []
+            for k, (dx, dy, _) in enumerate(MOVIMIENTOS):
+                vecino = (pos[0] + dx, pos[1] + dy)
+                if compilado.legal[indice, k]:
+                    sucesores.append((vecino, self.semaforos.get(vecino)))
+                elif compilado.a_destino[indice, k]:
+                    destinos_vecinos.append(vecino)
+            transicion = (tuple(sucesores), tuple(destinos_vecinos))
+            self.transiciones[pos] = transicion
+        return transicion
+
+    def ruta_hacia(self, destino):
+        """Devuelve la tabla de siguiente salto hacia un destino, calculándola si hace falta."""
+        if self.reruteo is not None:
+            return self.reruteo.rutas[self.indice_destino[destino.unique_id]]
+        compilado = self.mapa_compilado  # Las rutas sólo dependen del mapa y se comparten entre modelos
+        ruta = compilado.rutas.get(destino.pos)
+        if ruta is None:
+            ruta = compilado.rutas.setdefault(
+                destino.pos, calcular_ruta(self.width, self.height, compilado.previos, destino.pos))
+        return ruta
+
+    def _esquinas(self):
+        """Posiciones donde aparecen los coches."""
+        return [
             (0, 0),  # Esquina superior izquierda
             (0, self.width - 1),  # Esquina superior derecha
             (self.height - 1, 0),  # Esquina inferior izquierda
             (self.height - 1, self.width - 1)  # Esquina inferior derecha
         ]
 
-        position = corners[corner]
+    def _add_random_coche(self, corner):
+        """Añade un coche en una esquina aleatoria con un destino aleatorio."""
+        position = self._esquinas()[corner]
 
-        # Checar si esta reservado
-        if position in self.reservas:
+        # Checar si esta ocupada
+        if not self.celda_libre(position):
             return
 
         #Se le asigna un destino aleatorio
-        destino_coche = self.random.choice(self.destinos)
-        coche = Coche(f"Coche-{self.next_id}", self, destino_coche)
+        self._crear_coche(position, self.random.choice(self.destinos))
+        return True
+
+    def _crear_coche(self, position, destino_coche):
+        """Crea un coche en una celda libre con el destino dado."""
+        coche = Coche(f"Coche-{self.next_id}", self, destino_coche, self.next_id)
         self.next_id += 1
         self.grid.place_agent(coche, position)
         self.schedule.add(coche)
         self.coches_creados += 1
-        self.reservas[position] = coche.unique_id # Reservar la posición inicial
-        return True
+        self.num_coches += 1
+        self._ocupar(coche, position)
+        self.dinamicos[coche.unique_id] = coche
+        self._marcar_cambio(coche.unique_id)
+
+    def celda_libre(self, pos):
+        """Indica si ningún coche ocupa la celda."""
+        return self.ocupacion[pos[1] * self.width + pos[0]] == 0
+
+    def _ocupar(self, coche, pos):
+        """Registra que un coche entró a una celda."""
+        self.ocupacion[pos[1] * self.width + pos[0]] = coche.numero
+
+    def _desocupar(self, pos):
+        """Registra que un coche salió de una celda."""
+        self.ocupacion[pos[1] * self.width + pos[0]] = 0
+
+    def _mover_coche(self, coche, new_pos):
+        """Mueve un coche en el grid manteniendo la ocupación."""
+        self._desocupar(coche.pos)
+        self.grid.move_agent(coche, new_pos)
+        self._ocupar(coche, new_pos)
+        self._marcar_cambio(coche.unique_id)
+
+    def _mover_coches(self):
+        """Mueve todos los coches en dos fases para que el resultado no dependa del orden.
+
+        1. Cada coche propone una celda contra una foto fija del paso: nadie se mueve
+           y los semáforos no cambian mientras se proponen, así que las propuestas
+           son independientes entre sí (se pueden calcular en lotes o en paralelo).
+        2. Si varios coches proponen la misma celda gana el más antiguo (menor
+           número de id); los demás se quedan en su lugar este paso.
+        Es la misma regla que usa MotorVectorizado. Como sólo se proponen celdas
+        libres, dos coches que necesitan cada uno la celda del otro (o un ciclo
+        de coches) no se resuelven aquí: los rompe el desvío que aceptan los
+        coches detenidos más de ESPERA_DESVIO pasos (ver Coche.paso_ruteado).
+        """
+        coches = [a for a in self.schedule.agents if isinstance(a, Coche)]
+        propuestas = {}  # Celda -> coche ganador
+        for coche in coches:
+            new_pos = coche.proponer()
+            if new_pos is None:
+                continue
+            ganador = propuestas.get(new_pos)
+            if ganador is None or coche.numero < ganador.numero:
+                propuestas[new_pos] = coche
+
+        if self.reruteo is not None:
+            self._observar_tiempos(coches, propuestas)
+        for new_pos, coche in sorted(propuestas.items(), key=lambda p: p[1].numero):
+            coche.avanzar(new_pos)
+
+    def _observar_tiempos(self, coches, propuestas):
+        """Pasa al reruteo los coches que salen de su celda (propuestas ganadoras) y los que se quedan."""
+        width = self.width
+        ganadores = {coche.numero for coche in propuestas.values()}
+        salen = [(c.pos[1] * width + c.pos[0], p[1] * width + p[0], c.paso_entrada) for p, c in propuestas.items()]
+        quietos = [(c.pos[1] * width + c.pos[0], self.indice_destino[c.destino.unique_id], c.paso_entrada)
+                   for c in coches if c.numero not in ganadores]
+        observar_tiempos(self.reruteo.tiempo, self.reruteo.siguiente, width, self.step_counter,
+                         tuple(np.array(salen, dtype=np.int64).reshape(-1, 3).T),
+                         tuple(np.array(quietos, dtype=np.int64).reshape(-1, 3).T))
+
+    def _registrar_llegada(self, coche):
+        """Retira un coche que está en un destino; sólo cuenta como llegada si es el suyo.
+
+        Un coche que aparece sobre un destino ajeno también sale de la
+        simulación, pero no entra en coches_destino ni en el promedio de pasos.
+        """
+        if coche.pos == coche.destino.pos:
+            self.coches_destino += 1
+            self.pasos_totales += self.step_counter - coche.paso_creacion
+        self.num_coches -= 1
+        self._desocupar(coche.pos)
+        self.schedule.remove(coche)
+        self.grid.remove_agent(coche)
+        del self.dinamicos[coche.unique_id]
+        self._marcar_baja(coche.unique_id)
+
+    def _actualizar_semaforos(self):
+        """Avanza el controlador de cruces y copia su estado a los semáforos que cambiaron."""
+        verde = self.controlador.verde
+        for k in self.controlador.step(self.ocupacion).tolist():
+            semaforo = self._lista_semaforos[k]
+            semaforo.green = bool(verde[k])
+            self._marcar_cambio(semaforo.unique_id)
+
+    def _marcar_cambio(self, unique_id):
+        """Registra que un coche o semáforo apareció, se movió o cambió de estado en este paso."""
+        if self._rapido:
+            return
+        self._cambiados.add(unique_id)
+
+    def _marcar_baja(self, unique_id):
+        """Registra que un coche salió de la simulación en este paso."""
+        if self._rapido:
+            return
+        self._cambiados.discard(unique_id)
+        self._eliminados.add(unique_id)
+
+    def _cerrar_cambios(self):
+        """Guarda los cambios del paso actual en el registro."""
+        # Tuplas en vez de conjuntos: el registro guarda cambios_max pasos y una
+        # tupla ocupa varias veces menos que un conjunto con los mismos ids
+        self.registro_cambios.append((self.step_counter, tuple(self._cambiados), tuple(self._eliminados)))
+        self._cambiados = set()
+        self._eliminados = set()
+
+    def cambios_desde(self, paso):
+        """Devuelve (ids cambiados, ids eliminados) después de paso.
+
+        Regresa None si el registro ya no cubre ese paso; en ese caso el cliente
+        necesita la foto completa.
+        """
+        if paso > self.step_counter:
+            return None
+        if paso < self.step_counter and (not self.registro_cambios or self.registro_cambios[0][0] > paso + 1):
+            return None
+
+        cambiados = set()
+        eliminados = set()
+        for paso_registro, cambiados_paso, eliminados_paso in self.registro_cambios:
+            if paso_registro > paso:
+                cambiados.update(cambiados_paso)
+                eliminados.update(eliminados_paso)
+        return cambiados - eliminados, eliminados
 
     def _contar_coches(self):
         """Cuenta cuántos coches están en el grid."""
-        return sum(1 for agent in self.schedule.agents if isinstance(agent, Coche))
+        if self.motor is not None:
+            return self.motor.num_coches
+        return self.num_coches
 
     def _calcular_promedio_pasos(self):
         """Calcula el promedio de pasos hacia el destino."""
         return self.pasos_totales / self.coches_destino if self.coches_destino > 0 else 0
 
     def _contar_accidentes(self):
-        """Cuenta celdas con más de un coche en el paso actual."""
-        accidentes_en_paso = 0  # Accidentes solo de este paso
-        for cell in self.grid.coord_iter():
-            agentes, (x, y) = cell
-            coches = [a for a in agentes if isinstance(a, Coche)]
-            if len(coches) > 1:  # Más de un coche en la misma celda
-                accidentes_en_paso += 1
+        """Cuenta accidentes del paso actual.
 
-        self.accidentes = accidentes_en_paso  # Actualizar accidentes del paso actual
-        self.total_accidentes += accidentes_en_paso  # Accidentes acumulados
+        Los coches sólo entran a celdas libres y cada celda tiene un solo ganador,
+        así que la ocupación nunca tiene dos coches en la misma celda.
+        """
+        self.accidentes = 0  # Actualizar accidentes del paso actual
+        self.total_accidentes += self.accidentes  # Accidentes acumulados
 
     def step(self):
         """Avanza la simulación un paso."""
+        perfil = self.perfil
+        if perfil:
+            perfil.iniciar()
         self.step_counter += 1
+        if self.reruteo is not None and self.step_counter % self.reruteo.periodo == 0:
+            self.reruteo.actualizar()
+            if perfil:
+                perfil.marcar("reruteo")
+        if self.motor is not None:
+            self.motor.step()
+            if not self._rapido:
+                self._cerrar_cambios()
+                self.datacollector.collect(self)
+            if perfil:
+                perfil.marcar("metricas")
+                perfil.terminar()
+            return
+
         coches_agregados = False
-        if self.step_counter % 10 == 0:
+        if self.demanda is not None:
+            celdas, destinos = self.demanda.step(self.step_counter, self.ocupacion)
+            for celda, destino in zip(celdas.tolist(), destinos.tolist()):
+                self._crear_coche((celda % self.width, celda // self.width), self.destinos[destino])
+        elif self.step_counter % self.periodo_aparicion == 0:
             for corner in range(4):
                 if self._add_random_coche(corner):
                     coches_agregados = True
@@ -146,20 +393,53 @@ class RandomModel(Model):
             # Detener la simulación si no se agregaron coches
             if not coches_agregados:
                 self.running = False
+        if perfil:
+            perfil.marcar("aparicion")
 
-        
-        #Registrar pasos totales al destino
-        for agent in self.schedule.agents:
-            if isinstance(agent, Coche) and agent.pos == agent.destino.pos:
-                self.coches_destino += 1
-                self.pasos_totales += self.step_counter
-
-        # Avanzar la simulación
-        self.schedule.step()
+        # Avanzar la simulación por fases: llegadas, movimientos y semáforos
+        for coche in [a for a in self.schedule.agents if isinstance(a, Coche) and a.en_destino()]:
+            self._registrar_llegada(coche)
+        if perfil:
+            perfil.marcar("llegadas")
+        self._mover_coches()
+        if perfil:
+            perfil.marcar("coches", self.num_coches)
+        self._actualizar_semaforos()
+        if perfil:
+            perfil.marcar("semaforos", len(self._lista_semaforos))
 
         # Recolectar datos
         self._contar_accidentes()
-        self.datacollector.collect(self)
+        if not self._rapido:
+            self._cerrar_cambios()
+            self.datacollector.collect(self)
+        if perfil:
+            perfil.marcar("metricas")
+            perfil.terminar()
+
+    def cerrar(self):
+        """Escribe las métricas pendientes de exportar y libera los recursos del motor (los procesos del motor particionado)."""
+        self.datacollector.volcar()
+        if self.motor is not None:
+            self.motor.cerrar()
+
+    def avanzar_rapido(self, pasos):
+        """Avanza pasos pasos sin guardar métricas ni el registro de cambios.
+
+        La simulación es la misma que con step() (el historial de cada coche se
+        sigue guardando porque los coches sin ruta lo usan para decidir). Al
+        terminar se vacía el registro de cambios, así que el cliente necesita
+        la foto completa.
+        """
+        self._rapido = True
+        try:
+            for _ in range(pasos):
+                self.step()
+        finally:
+            self._rapido = False
+            self.registro_cambios.clear()
+            self._cambiados = set()
+            self._eliminados = set()
 
 # Método para obtener las estadísticas actuales
     def get_stats(self):
@@ -170,4 +450,58 @@ class RandomModel(Model):
             "coches_al_destino": self.coches_destino,
             "accidentes": self.total_accidentes,
             "coches_en_el_grid": self._contar_coches()
-        }
\ No newline at end of file
+        }
+
+    def agentes_dinamicos(self, ids=None, historial=True):
+        """Devuelve coches y semáforos como diccionarios listos para enviarse como JSON.
+
+        Con ids sólo se incluyen esos agentes; con historial=False se omite recent_positions.
+        """
+        if self.motor is not None:
+            return self.motor.agentes_dinamicos(ids, historial)
+
+        if ids is None:
+            agentes = self.schedule.agents
+        else:
+            agentes = [self.dinamicos[i] for i in ids if i in self.dinamicos]
+
+        dynamic_agents = []
+        for agent in agentes:
+            if isinstance(agent, (Coche, Semaforo)):
+                agent_data = {
+                    "id": agent.unique_id,
+                    "type": type(agent).__name__,
+                    "pos": agent.pos
+                }
+                if isinstance(agent, Semaforo):
+                    agent_data["state"] = agent.green  # Estado del semáforo
+                    agent_data["direction"] = agent.direction  # Dirección de la calle a la que pertenece
+                if isinstance(agent, Coche):
+                    agent_data["destination"] = agent.destino.unique_id if agent.destino else None
+                    if historial:
+                        agent_data["recent_positions"] = list(agent.recent_positions)  # Historial de posiciones recientes
+                dynamic_agents.append(agent_data)
+        return dynamic_agents
+
+    def arreglos_dinamicos(self, ids=None):
+        """Devuelve coches y semáforos como arreglos de NumPy (ver binary_format.py).
+
+        Con ids sólo se incluyen esos agentes.
+        """
+        if self.motor is not None:
+            return self.motor.arreglos_dinamicos(ids)
+
+        if ids is None:
+            agentes = self.dinamicos.values()
+        else:
+            agentes = [self.dinamicos[i] for i in ids if i in self.dinamicos]
+
+        coches = [a for a in agentes if isinstance(a, Coche)]
+        semaforos = [a for a in agentes if isinstance(a, Semaforo)]
+        return {
+            "coche_ids": np.array([int(c.unique_id[len("Coche-"):]) for c in coches], dtype=np.uint32),
+            "coche_pos": np.array([c.pos for c in coches], dtype=np.uint16).reshape(-1, 2),
+            "coche_destinos": np.array([self.indice_destino[c.destino.unique_id] for c in coches], dtype=np.uint16),
+            "semaforo_indices": np.array([self.indice_semaforo[s.unique_id] for s in semaforos], dtype=np.uint16),
+            "semaforo_verde": np.array([s.green for s in semaforos], dtype=bool),
+        }
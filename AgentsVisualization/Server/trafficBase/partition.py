@@ -0,0 +1,434 @@
+import multiprocessing as mp
+import os
+import traceback
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+from trafficBase.engine import MotorVectorizado, ReglasMovimiento
+from trafficBase.rerouting import observar_tiempos
+
+# forkserver evita hacer fork de un servidor con varios hilos; en Windows sólo existe spawn
+_CONTEXTO = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+
+# Segundos que un trabajador espera a los demás antes de darse por vencido
+ESPERA_BARRERA = 60
+
+
+def dividir_filas(compilado, partes):
+    """Divide las filas del mapa en hasta partes franjas contiguas con cantidades parecidas de calles.
+
+    Devuelve una lista de (fila_inicio, fila_fin); cada franja tiene al menos una fila.
+    """
+    calles = (compilado.tipos.reshape(compilado.height, compilado.width) != 1).sum(axis=1)
+    acumulado = np.cumsum(calles)
+    metas = acumulado[-1] * np.arange(1, partes) / partes
+    cortes = np.unique(np.clip(np.searchsorted(acumulado, metas, side="right"), 1, compilado.height - 1))
+    limites = [0] + cortes.tolist() + [compilado.height]
+    return list(zip(limites[:-1], limites[1:]))
+
+
+def _compartir(memorias, especificacion, nombre, arreglo):
+    """Copia arreglo a un bloque de memoria compartida nuevo y devuelve la vista."""
+    memoria = shared_memory.SharedMemory(create=True, size=max(arreglo.nbytes, 1))
+    memorias.append(memoria)
+    especificacion[nombre] = (memoria.name, arreglo.shape, arreglo.dtype.str)
+    vista = np.ndarray(arreglo.shape, dtype=arreglo.dtype, buffer=memoria.buf)
+    vista[...] = arreglo
+    return vista
+
+
+def _abrir(especificacion):
+    """Abre en un trabajador los bloques creados con _compartir."""
+    memorias = []
+    arreglos = {}
+    for nombre, (memoria_nombre, forma, tipo) in especificacion.items():
+        memoria = shared_memory.SharedMemory(name=memoria_nombre)
+        memorias.append(memoria)
+        arreglos[nombre] = np.ndarray(forma, dtype=tipo, buffer=memoria.buf)
+    return memorias, arreglos
+
+
+def _liberar(conexiones, procesos, memorias):
+    """Detiene los trabajadores y libera la memoria compartida."""
+    for conexion in conexiones:
+        try:
+            conexion.send(("fin", None))
+        except (OSError, EOFError):
+            pass
+    for proceso in procesos:
+        proceso.join(timeout=1)
+        if proceso.is_alive():
+            proceso.terminate()
+    for conexion in conexiones:
+        conexion.close()
+    for memoria in memorias:
+        try:
+            memoria.close()
+        except BufferError:
+            pass  # Todavía hay vistas del motor; el bloque se libera cuando desaparezcan
+        memoria.unlink()
+
+
+class Franja(ReglasMovimiento):
+    """ Coches de las filas [fila_inicio, fila_fin) del mapa; vive en un proceso trabajador.
+
+    Las tablas del mapa, la ocupación y las celdas en rojo son arreglos en memoria
+    compartida con todo el mapa, así que la franja lee directamente la fila vecina
+    de arriba y de abajo (su halo) y sólo escribe en sus propias celdas.
+
+    Los coches que cruzan a otra franja se proponen en el halo de entrada de la
+    franja destino: propuesta_id[franja, sentido, x], donde sentido 0 es "entra
+    por abajo a la primera fila" y 1 "entra por arriba a la última fila". Cada
+    celda de borde tiene una sola celda vecina del otro lado, así que nunca hay
+    dos franjas escribiendo en la misma posición. La franja destino decide el
+    ganador junto con sus propias propuestas (gana el menor id, como en
+    MotorVectorizado), borra las propuestas perdedoras y adopta los coches
+    ganadores; la franja de origen suelta los coches cuya propuesta sigue ahí.
+
+    Con reruteo, los tiempos por arista también son compartidos: cada franja
+    observa sólo los coches que estaban en sus celdas, así que sólo escribe en
+    sus filas.
+    """
+    def __init__(self, arreglos, indice, width, fila_inicio, fila_fin):
+        self.indice = indice
+        self.width = width
+        self.inicio = fila_inicio * width
+        self.fin = fila_fin * width
+        for nombre in ("vecinos", "legal", "a_destino", "distancias", "destino_celda", "destino_x", "destino_y",
+                       "es_destino", "ocupada", "rojo", "propuesta_id", "propuesta_destino", "propuesta_creado"):
+            setattr(self, nombre, arreglos[nombre])
+        for nombre in ("tiempo", "peso", "siguiente"):
+            setattr(self, nombre, arreglos.get(nombre))
+
+        self.celda = np.zeros(0, dtype=np.int32)
+        self.destino = np.zeros(0, dtype=np.int32)
+        self.ultima = np.zeros(0, dtype=np.int32)
+        self.creado = np.zeros(0, dtype=np.int32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.entrada = np.zeros(0, dtype=np.int32)
+        self._propias = None
+        self._salientes = None
+        self._antes = None
+
+    def agregar(self, celda, destino, ultima, creado, ids, entrada):
+        """Agrega coches a la franja (la ocupación ya la marcó quien los creó)."""
+        self.celda = np.concatenate([self.celda, celda.astype(np.int32)])
+        self.destino = np.concatenate([self.destino, destino.astype(np.int32)])
+        self.ultima = np.concatenate([self.ultima, ultima.astype(np.int32)])
+        self.creado = np.concatenate([self.creado, creado.astype(np.int32)])
+        self.ids = np.concatenate([self.ids, ids.astype(np.int64)])
+        self.entrada = np.concatenate([self.entrada, entrada.astype(np.int32)])
+
+    def _quitar(self, quitar):
+        """Quita de los arreglos los coches marcados en quitar."""
+        quedan = ~quitar
+        self.celda = self.celda[quedan]
+        self.destino = self.destino[quedan]
+        self.ultima = self.ultima[quedan]
+        self.creado = self.creado[quedan]
+        self.ids = self.ids[quedan]
+        self.entrada = self.entrada[quedan]
+
+    def registrar_llegadas(self, paso):
+        """Quita los coches que están en un destino.
+
+        Devuelve (cuántos llegaron al suyo, pasos que tardaron, ids de todos los que salieron).
+        """
+        llegaron = self.es_destino[self.celda]
+        if not llegaron.any():
+            return 0, 0, np.zeros(0, dtype=np.int64)
+        propios = self.celda == self.destino_celda[self.destino]
+        resultado = (int(propios.sum()), int((paso - self.creado[propios]).sum()), self.ids[llegaron])
+        self.ocupada[self.celda[llegaron]] = False
+        self._quitar(llegaron)
+        return resultado
+
+    def proponer(self, paso):
+        """Calcula las propuestas y escribe las que salen de la franja en el halo de la vecina."""
+        moviles, objetivos = self._proponer(paso)
+        propias = (objetivos >= self.inicio) & (objetivos < self.fin)
+        self._propias = (moviles[propias], objetivos[propias])
+
+        moviles, objetivos = moviles[~propias], objetivos[~propias]
+        sentido = (objetivos < self.inicio).astype(np.int64)  # 0: sube a la franja siguiente, 1: baja
+        vecina = np.where(sentido == 0, self.indice + 1, self.indice - 1)
+        x = objetivos % self.width
+        self.propuesta_id[vecina, sentido, x] = self.ids[moviles]
+        self.propuesta_destino[vecina, sentido, x] = self.destino[moviles]
+        self.propuesta_creado[vecina, sentido, x] = self.creado[moviles]
+        self._salientes = (moviles, objetivos, vecina, sentido, x)
+
+    def resolver(self, paso):
+        """Decide los ganadores de las celdas de la franja, mueve los coches propios y adopta los entrantes.
+
+        Devuelve los ids de los coches que se movieron a una celda de la franja.
+        """
+        moviles, objetivos = self._propias
+        entrantes = []
+        for sentido, fila in ((0, self.inicio), (1, self.fin - self.width)):
+            x = np.flatnonzero(self.propuesta_id[self.indice, sentido])
+            entrantes.append((np.full(len(x), sentido), x, fila + x))
+        sentidos = np.concatenate([e[0] for e in entrantes])
+        xs = np.concatenate([e[1] for e in entrantes])
+        celdas = np.concatenate([e[2] for e in entrantes])
+        ids_entrantes = self.propuesta_id[self.indice, sentidos, xs]
+
+        ganadores = self._ganadores(np.concatenate([self.ids[moviles], ids_entrantes]),
+                                    np.concatenate([objetivos, celdas]))
+        propios = ganadores[ganadores < len(moviles)]
+        adoptados = np.zeros(len(celdas), dtype=bool)
+        adoptados[ganadores[ganadores >= len(moviles)] - len(moviles)] = True
+
+        # Las propuestas perdedoras se borran; las ganadoras quedan para que el origen las vea
+        self.propuesta_id[self.indice, sentidos[~adoptados], xs[~adoptados]] = 0
+
+        moviles, objetivos = moviles[propios], objetivos[propios]
+        # Los coches adoptados van al final, así que los de antes conservan su índice hasta confirmar()
+        if self.peso is not None:
+            self._antes = (paso, self.celda.copy(), self.entrada.copy(), moviles, objetivos)
+        self.ocupada[self.celda[moviles]] = False
+        self.ocupada[objetivos] = True
+        self.ultima[moviles] = self.celda[moviles]
+        self.celda[moviles] = objetivos
+        self.entrada[moviles] = paso
+        movidos = self.ids[moviles]
+
+        sentidos, xs, celdas = sentidos[adoptados], xs[adoptados], celdas[adoptados]
+        ids = self.propuesta_id[self.indice, sentidos, xs]
+        self.ocupada[celdas] = True
+        ultimas = np.where(sentidos == 0, celdas - self.width, celdas + self.width)
+        self.agregar(celdas, self.propuesta_destino[self.indice, sentidos, xs], ultimas,
+                     self.propuesta_creado[self.indice, sentidos, xs], ids, np.full(len(ids), paso))
+        return np.concatenate([movidos, ids])
+
+    def _observar(self, salen, destinos):
+        """Pasa a los tiempos por arista los coches que estaban en la franja al empezar el paso."""
+        paso, celdas, entradas, moviles, objetivos = self._antes
+        moviles = np.concatenate([moviles, salen[0]])
+        objetivos = np.concatenate([objetivos, salen[1]])
+        quietos = np.ones(len(celdas), dtype=bool)
+        quietos[moviles] = False
+        observar_tiempos(self.tiempo, self.siguiente, self.width, paso,
+                         (celdas[moviles], objetivos, entradas[moviles]),
+                         (celdas[quietos], destinos[:len(celdas)][quietos], entradas[quietos]))
+
+    def confirmar(self):
+        """Suelta los coches que ganaron una celda en otra franja y limpia sus propuestas."""
+        moviles, objetivos, vecina, sentido, x = self._salientes
+        ganaron = self.propuesta_id[vecina, sentido, x] == self.ids[moviles]
+        self.propuesta_id[vecina, sentido, x] = 0
+        if self.peso is not None:
+            self._observar((moviles[ganaron], objetivos[ganaron]), self.destino)
+        salen = np.zeros(len(self.celda), dtype=bool)
+        salen[moviles[ganaron]] = True
+        self.ocupada[self.celda[salen]] = False
+        self._quitar(salen)
+
+    def coches(self):
+        return self.celda, self.destino, self.ultima, self.creado, self.ids, self.entrada
+
+
+def _trabajador(conexion, barrera, especificacion, indice, width, fila_inicio, fila_fin):
+    """Ciclo de un proceso trabajador: ejecuta las órdenes que manda MotorParticionado."""
+    memorias, arreglos = _abrir(especificacion)
+    franja = Franja(arreglos, indice, width, fila_inicio, fila_fin)
+    try:
+        while True:
+            orden, datos = conexion.recv()
+            try:
+                if orden == "fin":
+                    break
+                elif orden == "llegadas":
+                    paso, nuevos = datos
+                    franja.agregar(*nuevos)
+                    respuesta = franja.registrar_llegadas(paso)
+                elif orden == "mover":
+                    # Entre fases todas las franjas esperan a las demás: las propuestas se
+                    # leen de una foto fija y los halos se leen cuando ya están escritos
+                    paso, cambios = datos
+                    franja.proponer(paso)
+                    barrera.wait(ESPERA_BARRERA)
+                    movidos = franja.resolver(paso)
+                    barrera.wait(ESPERA_BARRERA)
+                    franja.confirmar()
+                    respuesta = (movidos if cambios else None, len(franja.celda))
+                elif orden == "coches":
+                    respuesta = franja.coches()
+                elif orden == "cargar":
+                    franja._quitar(np.ones(len(franja.celda), dtype=bool))
+                    franja.agregar(*datos)
+                    respuesta = None
+                else:
+                    raise ValueError(f"Orden desconocida: {orden}")
+            except Exception:
+                barrera.abort()
+                conexion.send(("error", traceback.format_exc()))
+                break
+            conexion.send(("ok", respuesta))
+    finally:
+        del franja, arreglos
+        for memoria in memorias:
+            memoria.close()
+
+
+class MotorParticionado(MotorVectorizado):
+    """ MotorVectorizado repartido en procesos trabajadores por franjas de filas.
+
+    El mapa se divide en franjas horizontales (ver dividir_filas) y cada una
+    vive en un proceso (ver Franja). Las franjas sólo tienen vecinas arriba y
+    abajo, así que el halo de cada una es una fila de cada lado. Tablas del
+    mapa, ocupación, celdas en rojo y halos de propuestas están en memoria
+    compartida; por la tubería de cada trabajador sólo viajan los coches
+    nuevos y los ids que cambiaron. Con reruteo también se comparten los
+    tiempos, pesos y árboles del Reruteo del modelo, que los sigue
+    actualizando entre pasos desde el proceso principal.
+
+    Cada paso el proceso principal crea los coches (usa el generador del
+    modelo), pide a las franjas que registren llegadas y luego que muevan sus
+    coches; al final avanza el controlador de cruces sobre la ocupación
+    compartida. Las reglas y el desempate son las de MotorVectorizado, así que
+    con la misma semilla los dos motores dan los mismos resultados.
+
+    Cada paso cuesta dos viajes de ida y vuelta a cada trabajador, así que sólo
+    conviene con mapas grandes, muchos coches y varios núcleos; en mapas chicos
+    MotorVectorizado es más rápido.
+
+    trabajadores es el número de procesos (por defecto uno por CPU). Hay que
+    llamar a cerrar() al terminar; si no, los procesos se detienen cuando el
+    motor se recolecta o al salir del intérprete.
+    """
+    nombre = "particionado"
+
+    def __init__(self, model, trabajadores=None):
+        super().__init__(model)
+        width = self.width
+        self.franjas = dividir_filas(model.mapa_compilado, trabajadores or os.cpu_count() or 1)
+        num_franjas = len(self.franjas)
+        self.franja_inicio = np.array([inicio * width for inicio, _ in self.franjas], dtype=np.int64)
+
+        memorias = []
+        especificacion = {}
+        for nombre in ("vecinos", "legal", "a_destino", "distancias", "destino_celda", "destino_x", "destino_y",
+                       "es_destino", "ocupada", "rojo"):
+            setattr(self, nombre, _compartir(memorias, especificacion, nombre, getattr(self, nombre)))
+        reruteo = model.reruteo
+        if reruteo is not None:
+            for nombre in ("siguiente", "peso", "tiempo"):
+                setattr(self, nombre, _compartir(memorias, especificacion, nombre, getattr(self, nombre)))
+                setattr(reruteo, nombre, getattr(self, nombre))
+            reruteo.distancias = self.distancias
+            reruteo._crear_rutas()
+        _compartir(memorias, especificacion, "propuesta_id", np.zeros((num_franjas, 2, width), dtype=np.int64))
+        _compartir(memorias, especificacion, "propuesta_destino", np.zeros((num_franjas, 2, width), dtype=np.int32))
+        _compartir(memorias, especificacion, "propuesta_creado", np.zeros((num_franjas, 2, width), dtype=np.int32))
+
+        # La barrera se guarda: sus semáforos desaparecen si se recolecta antes de que arranquen los trabajadores
+        self._barrera = barrera = _CONTEXTO.Barrier(num_franjas)
+        self._conexiones = []
+        procesos = []
+        for indice, (inicio, fin) in enumerate(self.franjas):
+            conexion, extremo = _CONTEXTO.Pipe()
+            proceso = _CONTEXTO.Process(target=_trabajador, daemon=True,
+                                        args=(extremo, barrera, especificacion, indice, width, inicio, fin))
+            proceso.start()
+            extremo.close()
+            self._conexiones.append(conexion)
+            procesos.append(proceso)
+        self._finalizador = weakref.finalize(self, _liberar, self._conexiones, procesos, memorias)
+
+        self._nuevos = [[] for _ in self.franjas]  # Coches creados en este paso por franja
+        self._num_coches = 0
+        self._recogidos = True  # self.celda, self.destino... están al día
+
+    @property
+    def num_coches(self):
+        return self._num_coches
+
+    def _ordenar(self, orden, datos=None):
+        """Manda la misma orden a todos los trabajadores (datos por franja o None) y junta las respuestas."""
+        for k, conexion in enumerate(self._conexiones):
+            conexion.send((orden, datos[k] if datos is not None else None))
+        respuestas = []
+        errores = []
+        for conexion in self._conexiones:
+            estado, respuesta = conexion.recv()
+            if estado == "error":
+                errores.append(respuesta)
+            respuestas.append(respuesta)
+        if errores:
+            self.cerrar()
+            raise RuntimeError("Falló un trabajador del motor particionado:\n" + errores[0])
+        return respuestas
+
+    def _anexar(self, celda, destino, ultima, creado, ids, entrada):
+        """Anota los coches nuevos para mandarlos a su franja en el siguiente paso."""
+        nuevos = np.stack([celda, destino, ultima, creado, ids, entrada], axis=1).astype(np.int64)
+        franja = np.searchsorted(self.franja_inicio, celda, side="right") - 1
+        for k in np.unique(franja).tolist():
+            self._nuevos[k].append(nuevos[franja == k])
+        self._num_coches += len(celda)
+
+    def _registrar_llegadas(self):
+        """Manda los coches nuevos a su franja y cuenta las llegadas de todas."""
+        model = self.model
+        nuevos = []
+        for pendientes in self._nuevos:
+            datos = np.concatenate(pendientes) if pendientes else np.zeros((0, 6), dtype=np.int64)
+            nuevos.append((model.step_counter, tuple(datos.T)))
+        self._nuevos = [[] for _ in self.franjas]
+        self._recogidos = False
+
+        for llegadas, pasos, ids in self._ordenar("llegadas", nuevos):
+            model.coches_destino += llegadas
+            model.pasos_totales += pasos
+            self._num_coches -= len(ids)
+            for ident in ids.tolist():
+                model._marcar_baja(f"Coche-{ident}")
+
+    def _mover_coches(self):
+        """Mueve los coches de todas las franjas en paralelo."""
+        cambios = not self.model._rapido
+        num_coches = 0
+        datos = [(self.model.step_counter, cambios)] * len(self.franjas)
+        for movidos, coches in self._ordenar("mover", datos):
+            num_coches += coches
+            if cambios:
+                for ident in movidos.tolist():
+                    self.model._marcar_cambio(f"Coche-{ident}")
+        self._num_coches = num_coches
+
+    def _recoger(self):
+        """Copia al proceso principal los coches de todas las franjas, en orden de creación."""
+        if self._recogidos:
+            return
+        partes = list(zip(*self._ordenar("coches")))
+        ids = np.concatenate(partes[4])
+        orden = np.argsort(ids, kind="stable")
+        self.celda, self.destino, self.ultima, self.creado = (np.concatenate(p)[orden] for p in partes[:4])
+        self.ids = ids[orden]
+        self.entrada = np.concatenate(partes[5])[orden]
+        self._recogidos = True
+
+    def coches(self):
+        self._recoger()
+        return super().coches()
+
+    def cargar_coches(self, celda, destino, ultima, creado, ids, entrada):
+        super().cargar_coches(celda, destino, ultima, creado, ids, entrada)
+        franja = np.searchsorted(self.franja_inicio, celda, side="right") - 1
+        self._ordenar("cargar", [tuple(a[franja == k] for a in (celda, destino, ultima, creado, ids, entrada))
+                                 for k in range(len(self.franjas))])
+        self._num_coches = len(celda)
+        self._recogidos = True
+
+    def agentes_dinamicos(self, ids=None, historial=True):
+        self._recoger()
+        return super().agentes_dinamicos(ids, historial)
+
+    def arreglos_dinamicos(self, ids=None):
+        self._recoger()
+        return super().arreglos_dinamicos(ids)
+
+    def cerrar(self):
+        """Detiene los trabajadores y libera la memoria compartida."""
+        self._finalizador()
@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class PerfilPasos:
+    """ Tiempo acumulado por fase de RandomModel.step.
+
+    El modelo sólo lo usa si model.perfil no es None, así que sin perfil el
+    costo es una comparación por fase. Cada fase guarda [llamadas, segundos,
+    agentes]; agentes es cuántos coches o semáforos procesó la fase, para
+    calcular el costo por agente. hilo es el hilo que está dentro de step()
+    (lo usa el muestreador de perfiles).
+    """
+    def __init__(self):
+        self.fases = {}
+        self.hilo = None
+        self._marca = 0.0
+
+    def iniciar(self):
+        """Empieza a medir un paso."""
+        self.hilo = threading.get_ident()
+        self._marca = time.perf_counter()
+
+    def marcar(self, fase, agentes=0):
+        """Acumula el tiempo desde la marca anterior en fase."""
+        ahora = time.perf_counter()
+        acumulado = self.fases.get(fase)
+        if acumulado is None:
+            acumulado = self.fases[fase] = [0, 0.0, 0]
+        acumulado[0] += 1
+        acumulado[1] += ahora - self._marca
+        acumulado[2] += agentes
+        self._marca = ahora
+
+    def terminar(self):
+        """Termina de medir el paso."""
+        self.hilo = None
@@ -0,0 +1,163 @@
+import heapq
+from collections import deque
+import numpy as np
+from trafficBase.routing import Ruta, calcular_ruta, movimiento
+
+# Peso de cada observación en el promedio móvil del tiempo de una arista
+ALFA = 0.2
+
+
+def observar_tiempos(tiempo, siguiente, width, paso, salidas, quietos):
+    """Actualiza los tiempos estimados por arista con lo que pasó en un paso.
+
+    salidas son (celdas, celdas vecinas, paso de entrada) de los coches que
+    dejaron su celda: el tiempo que estuvieron ahí entra al promedio móvil de la
+    arista que usaron. quietos son (celdas, índices de destino, paso de entrada)
+    de los que se quedaron: van a tardar al menos lo que llevan más uno, así que
+    la arista que sigue en su ruta no puede costar menos. Cada celda tiene un
+    solo coche, así que no hay aristas repetidas.
+    """
+    celdas, vecinas, entradas = salidas
+    k = movimiento(celdas, vecinas, width)
+    espera = np.maximum(paso - entradas, 1)
+    tiempo[celdas, k] += ALFA * (espera - tiempo[celdas, k])
+
+    celdas, destinos, entradas = quietos
+    siguientes = siguiente[destinos, celdas]
+    con_ruta = siguientes >= 0
+    celdas, siguientes, entradas = celdas[con_ruta], siguientes[con_ruta], entradas[con_ruta]
+    k = movimiento(celdas, siguientes, width)
+    tiempo[celdas, k] = np.maximum(tiempo[celdas, k], paso + 1 - entradas)
+
+
+class Reruteo:
+    """ Tiempos de viaje por arista y árboles de caminos más cortos hacia cada destino.
+
+    tiempo[celda, k] es el tiempo estimado para salir de celda con el movimiento
+    k; lo actualizan los motores en cada paso (ver observar_tiempos). peso es
+    el tiempo con el que están calculados los árboles: cada periodo pasos,
+    actualizar() copia a peso las aristas cuyo tiempo cambió más que umbral
+    (relativo) y repara los árboles de todos los destinos sólo alrededor de
+    esas aristas. Los árboles empiezan siendo las rutas BFS del mapa (con todos
+    los pesos en 1 son los mismos), así que nunca se calculan desde cero.
+
+    distancias[d] y siguiente[d] son el tiempo hasta el destino d y la
+    siguiente celda del camino (-1 si no hay camino); rutas[d] es una Ruta que
+    mira esos mismos arreglos. Los coches eligen la vecina con menor
+    peso de la arista + distancia, sin alejarse del destino.
+    """
+    def __init__(self, model, periodo=20, umbral=0.25):
+        compilado = model.mapa_compilado
+        self.periodo = periodo
+        self.umbral = umbral
+        self.width = compilado.width
+        self.vecinos = compilado.vecinos
+        self.previos = compilado.previos
+        self.legal = compilado.legal
+        self.a_destino = compilado.a_destino
+        celdas = compilado.width * compilado.height
+
+        self.tiempo = np.ones((celdas, 4))
+        self.peso = np.ones((celdas, 4))
+        self.destino_celda = [d.pos[1] * self.width + d.pos[0] for d in model.destinos]
+        rutas = [calcular_ruta(compilado.width, compilado.height, compilado.previos, d.pos, con_siguiente=True)
+                 for d in model.destinos]
+        if rutas:
+            self.distancias = np.stack([r.distancia for r in rutas]).astype(np.float64)
+            self.siguiente = np.stack([r.siguiente for r in rutas])
+        else:
+            self.distancias = np.full((0, celdas), -1.0)
+            self.siguiente = np.full((0, celdas), -1, dtype=np.int32)
+        self._crear_rutas()
+        self.reparaciones = 0  # Celdas cuyo camino se recalculó (suma sobre destinos)
+
+    def _crear_rutas(self):
+        """Rutas que miran las filas de distancias, siguiente y peso (hay que rehacerlas si se reemplazan)."""
+        height = len(self.vecinos) // self.width
+        self.rutas = [Ruta(self.width, height, self.distancias[d], self.siguiente[d], self.peso)
+                      for d in range(len(self.destino_celda))]
+
+    def actualizar(self):
+        """Aplica a los árboles las aristas que cambiaron más que el umbral y los repara."""
+        usables = self.legal | self.a_destino
+        cambio = usables & (np.abs(self.tiempo - self.peso) > self.umbral * self.peso)
+        celdas, ks = np.nonzero(cambio)
+        if len(celdas) == 0:
+            return
+        subieron = self.tiempo[celdas, ks] > self.peso[celdas, ks]
+        self.peso[celdas, ks] = self.tiempo[celdas, ks]
+
+        # Costo de cada arista (-1 si no existe), por celda de salida y por celda de llegada (como previos)
+        salida = np.where(usables, self.peso, -1.0)
+        entrada = np.where(self.previos >= 0, salida[self.previos, np.arange(4)], -1.0)
+        for d in range(len(self.destino_celda)):
+            self._reparar(d, celdas, ks, subieron, salida, entrada)
+
+    def _reparar(self, d, celdas, ks, subieron, salida, entrada):
+        """Repara el árbol del destino d después de cambiar el peso de las aristas (celdas, ks).
+
+        1. Si subió el peso de una arista del árbol, la celda y todas las que pasan
+           por ella (su subárbol) pierden su distancia.
+        2. Cada celda afectada toma la mejor salida hacia una celda no afectada, y
+           cada arista que bajó propone un camino más corto para su celda.
+        3. Dijkstra desde esas propuestas, sólo sobre las celdas que mejoran.
+
+        Los destinos no tienen salidas, así que las aristas hacia otro destino
+        nunca llegan a una celda con distancia y no hace falta revisarlas aparte.
+        """
+        distancias = self.distancias[d]
+        vecinos = self.vecinos[celdas, ks]
+        raices = celdas[subieron & (self.siguiente[d, celdas] == vecinos)]
+        cercanas = distancias[vecinos]
+        nuevas = cercanas + self.peso[celdas, ks]
+        bajaron = ~subieron & (cercanas >= 0) & ((distancias[celdas] < 0) | (nuevas < distancias[celdas]))
+        if len(raices) == 0 and not bajaron.any():
+            return
+
+        # Listas de Python: el recorrido lee celdas sueltas, mucho más rápido que en arreglos
+        distancia = distancias.tolist()
+        siguiente = self.siguiente[d].tolist()
+
+        # 1. Subárbol de las aristas del árbol que subieron
+        afectadas = set(raices.tolist())
+        pendientes = deque(afectadas)
+        while pendientes:
+            celda = pendientes.popleft()
+            for previa in self.previos[celda].tolist():
+                if previa >= 0 and previa not in afectadas and siguiente[previa] == celda:
+                    afectadas.add(previa)
+                    pendientes.append(previa)
+        for celda in afectadas:
+            distancia[celda] = -1
+            siguiente[celda] = -1
+        self.reparaciones += len(afectadas)
+        tocadas = set(afectadas)
+
+        # 2. Propuestas iniciales
+        cola = []
+        for celda in afectadas:
+            for vecino, costo in zip(self.vecinos[celda].tolist(), salida[celda].tolist()):
+                if costo >= 0 and distancia[vecino] >= 0:
+                    heapq.heappush(cola, (distancia[vecino] + costo, celda, vecino))
+        for nueva, celda, vecino in zip(nuevas[bajaron].tolist(), celdas[bajaron].tolist(), vecinos[bajaron].tolist()):
+            if distancia[vecino] >= 0:  # Pudo quedar afectada en el paso 1
+                heapq.heappush(cola, (nueva, celda, vecino))
+
+        # 3. Dijkstra hacia atrás (de cada celda a las que llegan a ella)
+        while cola:
+            nueva, celda, vecino = heapq.heappop(cola)
+            if distancia[celda] >= 0 and nueva >= distancia[celda]:
+                continue
+            distancia[celda] = nueva
+            siguiente[celda] = vecino
+            tocadas.add(celda)
+            for previa, costo in zip(self.previos[celda].tolist(), entrada[celda].tolist()):
+                if previa < 0:
+                    continue
+                propuesta = nueva + costo
+                if distancia[previa] < 0 or propuesta < distancia[previa]:
+                    heapq.heappush(cola, (propuesta, previa, celda))
+
+        tocadas = np.fromiter(tocadas, dtype=np.int64, count=len(tocadas))
+        distancias[tocadas] = [distancia[celda] for celda in tocadas.tolist()]
+        self.siguiente[d, tocadas] = [siguiente[celda] for celda in tocadas.tolist()]
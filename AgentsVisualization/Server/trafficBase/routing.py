@@ -0,0 +1,85 @@
+import numpy as np
+
+# Pasos que un coche puede llevar detenido en su celda antes de aceptar un
+# desvío: cualquier vecina libre desde la que se llegue a su destino, aunque
+# quede más lejos. Sin esto dos coches que necesitan cada uno la celda del
+# otro (un cambio de carril cruzado) se esperan para siempre.
+ESPERA_DESVIO = 8
+
+
+def movimiento(celdas, vecinas, width):
+    """Índice k de MOVIMIENTOS que lleva de cada celda a su vecina."""
+    delta = vecinas - celdas
+    return np.select([delta == 1, delta == -1, delta == width], [0, 1, 2], 3)
+
+
+class Ruta:
+    """ Tabla de siguiente salto hacia un destino.
+
+    Las celdas se indexan como y * width + x. Para cada celda se guarda la
+    distancia (en pasos) al destino y, si se pidió, el índice de la siguiente
+    celda en el camino más corto (siguiente es None si no); -1 indica que
+    desde esa celda no se puede llegar. Con
+    peso (arreglo (celdas, 4), ver Reruteo) la distancia es el tiempo estimado
+    y cada arista tiene su costo; sin peso todas cuestan lo mismo.
+    """
+    def __init__(self, width, height, distancia=None, siguiente=None, peso=None):
+        self.width = width
+        self.distancia = distancia if distancia is not None else np.full(width * height, -1, dtype=np.int32)
+        self.siguiente = siguiente
+        self.peso = peso
+
+    def indice(self, pos):
+        return pos[1] * self.width + pos[0]
+
+    def distancia_a(self, pos):
+        """Pasos (o tiempo estimado) que faltan desde pos hasta el destino (-1 si no hay camino)."""
+        return self.distancia[self.indice(pos)].item()
+
+    def costo(self, pos, vecina):
+        """Peso de la arista de pos a la celda vecina (0 si la ruta no usa pesos)."""
+        if self.peso is None:
+            return 0
+        indice = self.indice(pos)
+        return self.peso[indice, int(movimiento(indice, self.indice(vecina), self.width))].item()
+
+    def siguiente_paso(self, pos):
+        """Celda a la que conviene avanzar desde pos, o None si no hay camino (la ruta debe guardar siguiente)."""
+        siguiente = int(self.siguiente[self.indice(pos)])
+        if siguiente < 0:
+            return None
+        return (siguiente % self.width, siguiente // self.width)
+
+
+def calcular_ruta(width, height, previos, destino_pos, con_siguiente=False):
+    """BFS inversa desde el destino sobre el grafo dirigido de calles.
+
+    previos[celda, k] es la celda desde la que se llega a celda con el
+    movimiento k (-1 si no hay). Se avanza un nivel de distancia a la vez.
+    Los coches sólo miran la distancia, así que la siguiente celda se guarda
+    sólo con con_siguiente (el reruteo la necesita), y la distancia se guarda
+    en int16 cuando cabe: en un mapa grande con muchos destinos las rutas son
+    la mayor parte de la memoria.
+    """
+    siguiente = np.full(width * height, -1, dtype=np.int32) if con_siguiente else None
+    ruta = Ruta(width, height, siguiente=siguiente)
+    inicio = ruta.indice(destino_pos)
+    ruta.distancia[inicio] = 0
+
+    frontera = np.array([inicio], dtype=np.int32)
+    distancia = 0
+    while len(frontera):
+        distancia += 1
+        candidatos = previos[frontera].ravel()
+        padres = np.repeat(frontera, previos.shape[1])
+        nuevos = candidatos >= 0
+        nuevos[nuevos] = ruta.distancia[candidatos[nuevos]] < 0
+        candidatos, primero = np.unique(candidatos[nuevos], return_index=True)
+        ruta.distancia[candidatos] = distancia
+        if con_siguiente:
+            ruta.siguiente[candidatos] = padres[nuevos][primero]
+        frontera = candidatos
+
+    if distancia < np.iinfo(np.int16).max:
+        ruta.distancia = ruta.distancia.astype(np.int16)
+    return ruta
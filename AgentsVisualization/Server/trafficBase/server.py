@@ -1,4 +1,4 @@
-from model import RandomModel, Edificio, Semaforo, Calle, Destino, Coche
+from model import RandomModel, Semaforo, Destino, Coche
 from mesa.visualization import CanvasGrid, ModularServer
 from mesa.visualization.modules import TextElement
 import mesa
@@ -58,22 +58,12 @@ def agent_portrayal(agent):
                  "Color": "red",
                  "r": 0.5}
 
-    if isinstance(agent, Edificio):
-        portrayal["Color"] = "black"
-        portrayal["Layer"] = 1
-        portrayal["r"] = 1
-        portrayal["Shape"] = "circle"
-    
     if isinstance(agent, Semaforo):
         portrayal["Color"] = "green" if agent.green else "red"  # Cambia el color según el estado
         portrayal["Layer"] = 1
         portrayal["r"] = 1
         portrayal["Shape"] = "circle"
 
-    if isinstance(agent, Calle):
-        portrayal["Shape"] = "./Resources/Arriba.png" if agent.direction == 0 else "./Resources/derecha.png" if agent.direction == 1 else "./Resources/abajo.png" if agent.direction == 2 else "./Resources/Izquierda.png"
-        portrayal["Layer"] = 0
-
     if isinstance(agent, Destino):
         portrayal["Layer"] = 1
         portrayal["Shape"] = "circle"
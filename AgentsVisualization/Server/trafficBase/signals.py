@@ -0,0 +1,117 @@
+import numpy as np
+
+MODOS = ("fijo", "onda", "actuado")
+
+# Dirección de la calle -> (dx, dy) del avance
+_AVANCE = {0: (0, 1), 1: (1, 0), 2: (0, -1), 3: (-1, 0)}
+
+
+class ControladorCruces:
+    """ Controla todos los semáforos del mapa agrupados en cruces.
+
+    Los semáforos a 3 celdas o menos (en distancia Manhattan, encadenando) forman
+    un cruce. Cada cruce alterna dos fases: en la fase 0 están en verde los
+    semáforos verticales (^ v) y en la fase 1 los horizontales (< >). Todos los
+    temporizadores se avanzan juntos con operaciones de arreglos.
+
+    Modos:
+    - "fijo": cada fase dura intervalo pasos y todos los cruces cambian a la vez.
+    - "onda": igual que "fijo", pero cada cruce se desfasa x + y pasos (su centro)
+      para formar una onda verde hacia la derecha y hacia arriba: un coche que
+      avanza una celda por paso encuentra los siguientes cruces en la misma fase.
+    - "actuado": cada fase dura al menos intervalo pasos y se extiende (hasta
+      verde_max) mientras haya coches esperando en los accesos en verde o
+      ninguno en los accesos en rojo. La cola de un semáforo son las celdas
+      ocupadas entre las largo_cola celdas de calle anteriores a él.
+    """
+    def __init__(self, compilado, modo="fijo", intervalo=5, verde_max=None, largo_cola=4):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de semáforos desconocido: {modo}")
+        self.modo = modo
+        self.intervalo = intervalo
+        self.verde_max = verde_max if verde_max is not None else 3 * intervalo
+        width = compilado.width
+
+        # Semáforos en el orden de compilado.semaforos
+        posiciones = [(x, y) for x, y, _, _ in compilado.semaforos]
+        direcciones = [direction for _, _, direction, _ in compilado.semaforos]
+        self.celda = np.array([y * width + x for x, y in posiciones], dtype=np.int64)
+        self.grupo = np.array([0 if d in (0, 2) else 1 for d in direcciones], dtype=np.int64)
+        self.cruce = self._agrupar(posiciones)
+        num_cruces = int(self.cruce.max()) + 1 if len(self.cruce) else 0
+
+        # Cola de cada semáforo: celdas de calle antes de él (-1 si no hay)
+        self.cola = np.full((len(posiciones), largo_cola), -1, dtype=np.int64)
+        for k, ((x, y), direction) in enumerate(zip(posiciones, direcciones)):
+            dx, dy = _AVANCE[direction]
+            for paso in range(largo_cola):
+                cx, cy = x - dx * (paso + 1), y - dy * (paso + 1)
+                if not (0 <= cx < width and 0 <= cy < compilado.height) or compilado.tipos[cy * width + cx] != 2:
+                    break
+                self.cola[k, paso] = cy * width + cx
+
+        # Desfase de cada cruce (en pasos dentro del ciclo de dos fases)
+        adelanto = np.zeros(num_cruces, dtype=np.int64)
+        if modo == "onda" and num_cruces:
+            centro = np.zeros(num_cruces)
+            np.add.at(centro, self.cruce, [x + y for x, y in posiciones])
+            centro /= np.bincount(self.cruce, minlength=num_cruces)
+            # Retrasar el ciclo del cruce equivale a adelantarlo ciclo - retraso pasos
+            adelanto = (-np.rint(centro).astype(np.int64)) % (2 * intervalo)
+
+        self.fase = (adelanto // intervalo) % 2
+        self.tiempo = adelanto % intervalo
+        self.verde = self.fase[self.cruce] == self.grupo
+
+    def _agrupar(self, posiciones):
+        """Índice de cruce de cada semáforo (unión de semáforos cercanos)."""
+        padre = list(range(len(posiciones)))
+
+        def raiz(k):
+            while padre[k] != k:
+                padre[k] = padre[padre[k]]
+                k = padre[k]
+            return k
+
+        indice = {pos: k for k, pos in enumerate(posiciones)}
+        for k, (x, y) in enumerate(posiciones):
+            for dx in range(-3, 4):
+                for dy in range(-3 + abs(dx), 4 - abs(dx)):
+                    otro = indice.get((x + dx, y + dy))
+                    if otro is not None:
+                        padre[raiz(otro)] = raiz(k)
+
+        raices = [raiz(k) for k in range(len(posiciones))]
+        numeros = {}
+        return np.array([numeros.setdefault(r, len(numeros)) for r in raices], dtype=np.int64)
+
+    def colas(self, ocupacion):
+        """Coches esperando por cruce y grupo, arreglo (cruces, 2)."""
+        celdas = np.where(self.cola >= 0, self.cola, 0)
+        por_semaforo = ((ocupacion[celdas] != 0) & (self.cola >= 0)).sum(axis=1)
+        totales = np.bincount(self.cruce * 2 + self.grupo, weights=por_semaforo, minlength=2 * len(self.fase))
+        return totales.reshape(-1, 2)
+
+    def step(self, ocupacion):
+        """Avanza todos los cruces un paso y devuelve los índices de los semáforos que cambiaron.
+
+        ocupacion es un arreglo por celda (distinto de cero si hay un coche).
+        """
+        if len(self.fase) == 0:
+            return np.zeros(0, dtype=np.int64)
+        self.tiempo += 1
+        cambia = self.tiempo >= self.intervalo
+        if self.modo == "actuado":
+            colas = self.colas(ocupacion)
+            cruces = np.arange(len(self.fase))
+            en_verde = colas[cruces, self.fase]
+            en_rojo = colas[cruces, 1 - self.fase]
+            extender = ((en_verde > 0) | (en_rojo == 0)) & (self.tiempo < self.verde_max)
+            cambia &= ~extender
+
+        self.fase[cambia] ^= 1
+        self.tiempo[cambia] = 0
+        verde = self.fase[self.cruce] == self.grupo
+        cambiados = np.flatnonzero(verde != self.verde)
+        self.verde[:] = verde
+        return cambiados
@@ -0,0 +1,203 @@
+import io
+import json
+import numpy as np
+from trafficBase.agent import Coche
+from trafficBase.model import RandomModel
+
+# Versión del formato de instantánea
+VERSION = 1
+
+# Contadores del modelo que se guardan tal cual
+CONTADORES = ("step_counter", "next_id", "coches_creados", "coches_destino", "pasos_totales",
+              "accidentes", "total_accidentes", "num_coches")
+
+
+def guardar_instantanea(model):
+    """Serializa el estado completo del modelo a bytes (archivo .npz comprimido).
+
+    Incluye el mapa, los parámetros, contadores, estado del generador aleatorio,
+    coches (posición, destino, última celda, paso de creación e historial),
+    temporizadores de los cruces, métricas, la demanda (generador y colas) y el
+    reruteo (tiempos por arista y rutas). La ocupación se reconstruye a partir
+    de los coches. El registro de cambios no se guarda: después de restaurar el
+    cliente necesita la foto completa.
+    """
+    version_rng, estado_rng, gauss_rng = model.random.getstate()
+    meta = {
+        "version": VERSION,
+        "mapa": model.mapa_compilado.filas,
+        "motor": "mesa" if model.motor is None else model.motor.nombre,
+        "trabajadores": model.trabajadores,
+        "historial_max": model.historial_max,
+        "cambios_max": model.registro_cambios.maxlen,
+        "periodo_aparicion": model.periodo_aparicion,
+        "intervalo_semaforo": model.intervalo_semaforo,
+        "control_semaforos": model.controlador.modo,
+        "metricas_capacidad": model.datacollector.capacidad,
+        "metricas_cada": model.datacollector.cada,
+        "running": model.running,
+        "contadores": {nombre: getattr(model, nombre) for nombre in CONTADORES},
+        "rng": [version_rng, gauss_rng],
+        "metricas_filas": model.datacollector.filas,
+        "metricas_llamadas": model.datacollector.llamadas,
+        "demanda": model.demanda.config if model.demanda is not None else None,
+        "reruteo": None,
+    }
+
+    arreglos = {
+        "rng_estado": np.array(estado_rng, dtype=np.uint32),
+        "fase": model.controlador.fase,
+        "tiempo": model.controlador.tiempo,
+        "verde": model.controlador.verde,
+        "metricas_datos": model.datacollector.datos,
+        "metricas_pasos": model.datacollector.pasos,
+    }
+
+    if model.demanda is not None:
+        demanda = model.demanda
+        meta["demanda_estado"] = {
+            "rng": demanda.rng.bit_generator.state,
+            "descartados": demanda.descartados,
+            "liberados": demanda.liberados,
+            "espera_total": demanda.espera_total,
+        }
+        arreglos.update({
+            "cola_origen": demanda.cola_origen,
+            "cola_destino": demanda.cola_destino,
+            "cola_pedido": demanda.cola_pedido,
+        })
+
+    if model.reruteo is not None:
+        reruteo = model.reruteo
+        meta["reruteo"] = {"periodo": reruteo.periodo, "umbral": reruteo.umbral, "reparaciones": reruteo.reparaciones}
+        arreglos.update({
+            "reruteo_tiempo": reruteo.tiempo,
+            "reruteo_peso": reruteo.peso,
+            "reruteo_distancias": reruteo.distancias,
+            "reruteo_siguiente": reruteo.siguiente,
+        })
+
+    if model.motor is None:
+        coches = [a for a in model.schedule.agents if isinstance(a, Coche)]
+        historiales = [list(c.recent_positions) for c in coches]
+        arreglos.update({
+            "coche_numero": np.array([c.numero for c in coches], dtype=np.int64),
+            "coche_pos": np.array([c.pos for c in coches], dtype=np.int32).reshape(-1, 2),
+            "coche_destino": np.array([model.indice_destino[c.destino.unique_id] for c in coches], dtype=np.int32),
+            "coche_ultima": np.array([c.last_pos if c.last_pos is not None else (-1, -1) for c in coches],
+                                     dtype=np.int32).reshape(-1, 2),
+            "coche_creado": np.array([c.paso_creacion for c in coches], dtype=np.int64),
+            "coche_entrada": np.array([c.paso_entrada for c in coches], dtype=np.int64),
+            "historial_largo": np.array([len(h) for h in historiales], dtype=np.int32),
+            "historial": np.array([p for h in historiales for p in h], dtype=np.int32).reshape(-1, 2),
+        })
+    else:
+        arreglos.update(model.motor.coches())
+
+    salida = io.BytesIO()
+    np.savez_compressed(salida, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arreglos)
+    return salida.getvalue()
+
+
+def leer_instantanea(datos):
+    """Separa una instantánea en (meta, arreglos) sin crear el modelo.
+
+    Sirve para revisar los parámetros guardados antes de restaurarla con restaurar_instantanea.
+    """
+    with np.load(io.BytesIO(datos), allow_pickle=False) as archivo:
+        arreglos = {nombre: archivo[nombre] for nombre in archivo.files}
+    meta = json.loads(arreglos.pop("meta").tobytes().decode("utf-8"))
+    if not isinstance(meta, dict):
+        raise ValueError("Metadatos de instantánea inválidos.")
+    if meta.get("version") != VERSION:
+        raise ValueError(f"Versión de instantánea no soportada: {meta.get('version')}")
+    return meta, arreglos
+
+
+def cargar_instantanea(datos):
+    """Crea un RandomModel con el estado guardado por guardar_instantanea."""
+    return restaurar_instantanea(*leer_instantanea(datos))
+
+
+def restaurar_instantanea(meta, arreglos):
+    """Crea un RandomModel a partir de lo que devuelve leer_instantanea."""
+    mapa = meta["mapa"]
+    reruteo = meta.get("reruteo") or {}
+    model = RandomModel(
+        len(mapa[0]), len(mapa), mapa,
+        motor=meta["motor"],
+        metricas_capacidad=meta["metricas_capacidad"],
+        metricas_cada=meta["metricas_cada"],
+        historial_max=meta["historial_max"],
+        cambios_max=meta["cambios_max"],
+        periodo_aparicion=meta["periodo_aparicion"],
+        intervalo_semaforo=meta["intervalo_semaforo"],
+        control_semaforos=meta["control_semaforos"],
+        trabajadores=meta.get("trabajadores"),
+        demanda=meta.get("demanda"),
+        periodo_reruteo=reruteo.get("periodo"),
+        umbral_reruteo=reruteo.get("umbral", 0.25),
+    )
+    for nombre in CONTADORES:
+        setattr(model, nombre, meta["contadores"][nombre])
+    model.running = meta["running"]
+    version_rng, gauss_rng = meta["rng"]
+    model.random.setstate((version_rng, tuple(arreglos["rng_estado"].tolist()), gauss_rng))
+
+    # Cruces (verde se actualiza en su lugar: el motor vectorizado lo comparte)
+    model.controlador.fase[:] = arreglos["fase"]
+    model.controlador.tiempo[:] = arreglos["tiempo"]
+    model.controlador.verde[:] = arreglos["verde"]
+    for semaforo, verde in zip(model._lista_semaforos, arreglos["verde"].tolist()):
+        semaforo.green = verde
+
+    # Demanda
+    if model.demanda is not None:
+        demanda = model.demanda
+        estado = meta["demanda_estado"]
+        demanda.rng.bit_generator.state = estado["rng"]
+        demanda.descartados = estado["descartados"]
+        demanda.liberados = estado["liberados"]
+        demanda.espera_total = estado["espera_total"]
+        demanda.cola_origen = arreglos["cola_origen"]
+        demanda.cola_destino = arreglos["cola_destino"]
+        demanda.cola_pedido = arreglos["cola_pedido"]
+
+    # Reruteo (en su lugar: los motores y las rutas miran estos arreglos)
+    if model.reruteo is not None:
+        model.reruteo.tiempo[:] = arreglos["reruteo_tiempo"]
+        model.reruteo.peso[:] = arreglos["reruteo_peso"]
+        model.reruteo.distancias[:] = arreglos["reruteo_distancias"]
+        model.reruteo.siguiente[:] = arreglos["reruteo_siguiente"]
+        model.reruteo.reparaciones = reruteo["reparaciones"]
+
+    # Métricas
+    model.datacollector.datos[:] = arreglos["metricas_datos"]
+    model.datacollector.pasos[:] = arreglos["metricas_pasos"]
+    model.datacollector.filas = meta["metricas_filas"]
+    model.datacollector.llamadas = meta["metricas_llamadas"]
+
+    if model.motor is None:
+        inicio = 0
+        historial = [tuple(p) for p in arreglos["historial"].tolist()]
+        # Las instantáneas anteriores al reruteo no guardan el paso de entrada a la celda
+        entradas = arreglos.get("coche_entrada", arreglos["coche_creado"])
+        for numero, pos, destino, ultima, creado, entrada, largo in zip(
+                arreglos["coche_numero"].tolist(), arreglos["coche_pos"].tolist(),
+                arreglos["coche_destino"].tolist(), arreglos["coche_ultima"].tolist(),
+                arreglos["coche_creado"].tolist(), entradas.tolist(), arreglos["historial_largo"].tolist()):
+            coche = Coche(f"Coche-{numero}", model, model.destinos[destino], numero)
+            coche.last_pos = tuple(ultima) if ultima[0] >= 0 else None
+            coche.paso_creacion = creado
+            coche.paso_entrada = entrada
+            coche.recent_positions.extend(historial[inicio:inicio + largo])
+            inicio += largo
+            model.grid.place_agent(coche, tuple(pos))
+            model.schedule.add(coche)
+            model._ocupar(coche, tuple(pos))
+            model.dinamicos[coche.unique_id] = coche
+    else:
+        model.motor.cargar_coches(arreglos["celda"], arreglos["destino"], arreglos["ultima"],
+                                  arreglos["creado"], arreglos["ids"], arreglos.get("entrada", arreglos["creado"]))
+
+    return model
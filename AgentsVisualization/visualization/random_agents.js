@@ -9,6 +9,10 @@ import fs_phong from "./shaders/fs_phong.glsl?raw";
 // Define the agent server URI
 const agent_server_uri = "http://localhost:8585/";
 
+// Each page gets its own simulation session on the server
+const sessionId = crypto.randomUUID();
+const sessionHeaders = { "X-Session-Id": sessionId };
+
 // Initialize arrays to store agents
 const obstacles = [];
 const destinations = [];
@@ -18,6 +22,19 @@ const roads = [];
 // Object for cars
 const cars = {};
 
+// Traffic lights by id (trafficLights is rebuilt from it)
+const lightsById = {};
+
+// Last simulation step received from /getDynamicAgents (null = no data yet)
+let lastStep = null;
+
+// Id dictionary of the binary wire format (destinations and traffic lights)
+let wireDictionary = null;
+
+// Cell types of the binary static format (same order as TIPOS_CELDA in binary_format.py)
+const STATIC_CELL_TYPES = ["", "Edificio", "Calle", "Destino"];
+const NO_DIRECTION = 255;
+
 // Mapa data
 const mapa = [
   "v<<<<<<<<<<<<<<<<i<<<<<<<<<<<<",
@@ -154,11 +171,13 @@ async function main() {
  * Initializes the agents model by sending a POST request to the agent server.
  */
 async function initModel() {
+  lastStep = null;
+  wireDictionary = null;
   try {
     // Send a POST request to the agent server to initialize the model
     const response = await fetch(`${agent_server_uri}init`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: { "Content-Type": "application/json", ...sessionHeaders },
       body: JSON.stringify({ mapa: mapa }),
     });
 
@@ -183,10 +202,9 @@ async function fetchEntities() {
 // Fetch static agents
 async function fetchStaticAgents() {
   try {
-    const response = await fetch(`${agent_server_uri}getStaticAgents`);
+    const response = await fetch(`${agent_server_uri}getStaticAgents?format=binary`, { headers: sessionHeaders });
     if (!response.ok) throw new Error("Failed to fetch static agents.");
-    const result = await response.json();
-    const staticAgents = result.staticAgents;
+    const staticAgents = decodeStaticAgents(await response.arrayBuffer());
 
     // Clear existing arrays
     obstacles.length = 0;
@@ -219,111 +237,193 @@ async function fetchStaticAgents() {
   }
 }
 
-// Fetch dynamic agents
+// Fetch dynamic agents (only the changes since the last received step)
 async function fetchDynamicAgents() {
   try {
-    const response = await fetch(`${agent_server_uri}getDynamicAgents`);
+    let query = "?format=binary";
+    if (lastStep !== null) query += `&since=${lastStep}`;
+    if (wireDictionary === null) query += "&dict=1";
+    const response = await fetch(`${agent_server_uri}getDynamicAgents${query}`, { headers: sessionHeaders });
     if (!response.ok) throw new Error("Failed to fetch dynamic agents.");
-    const result = await response.json();
-    const dynamicAgents = result.dynamicAgents;
+    const result = decodeDynamicAgents(await response.arrayBuffer());
+    applyDynamicAgents(result);
+  } catch (error) {
+    console.error("Error fetching dynamic agents:", error);
+  }
+}
 
-    // Clear trafficLights array
-    trafficLights.length = 0;
+// Decode the binary static format (see Server/binary_format.py)
+function decodeStaticAgents(buffer) {
+  const view = new DataView(buffer);
+  const width = view.getUint16(4, true);
+  const height = view.getUint16(6, true);
+  const cells = width * height;
+  const types = new Uint8Array(buffer, 8, cells);
+  const directions = new Uint8Array(buffer, 8 + cells + ((4 - (cells % 4)) % 4), cells);
+
+  const staticAgents = [];
+  for (let i = 0; i < cells; i++) {
+    if (types[i] === 0) continue;
+    const agent = { type: STATIC_CELL_TYPES[types[i]], pos: [i % width, Math.floor(i / width)] };
+    if (directions[i] !== NO_DIRECTION) agent.direction = directions[i];
+    staticAgents.push(agent);
+  }
+  return staticAgents;
+}
 
-    // Update 'cars' and 'trafficLights'
-    const newCarIds = [];
-    dynamicAgents.forEach((agent, index) => {
-      const agentType = agent.type;
-      const pos = agent.pos;
+// Decode the binary dynamic format into the same shape as the JSON response
+function decodeDynamicAgents(buffer) {
+  const view = new DataView(buffer);
+  const step = view.getUint32(4, true);
+  const full = view.getUint8(8) === 1;
+  const carCount = view.getUint32(12, true);
+  const lightCount = view.getUint32(16, true);
+  const removedCount = view.getUint32(20, true);
+  const dictionaryBytes = view.getUint32(24, true);
+
+  // Sections start at multiples of 4 bytes
+  let offset = 28;
+  const section = (ArrayType, length) => {
+    const array = new ArrayType(buffer, offset, length);
+    offset += array.byteLength;
+    offset += (4 - (offset % 4)) % 4;
+    return array;
+  };
+  const carIds = section(Uint32Array, carCount);
+  const carPositions = section(Uint16Array, carCount * 2);
+  const carDestinations = section(Uint16Array, carCount);
+  const lightIndices = section(Uint16Array, lightCount);
+  const lightStates = section(Uint8Array, Math.ceil(lightCount / 8));
+  const removedIds = section(Uint32Array, removedCount);
+  if (dictionaryBytes > 0) {
+    wireDictionary = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset, dictionaryBytes)));
+  }
 
-      const x = pos[0];
-      const z = pos[1];
-      const y = 0;
-
-      if (agentType === "Coche") {
-        const carId = agent.id;
-
-        if (cars[carId]) {
-          // Existing car: update previous and current positions
-          cars[carId].prevX = cars[carId].x;
-          cars[carId].prevY = cars[carId].y;
-          cars[carId].prevZ = cars[carId].z;
-          cars[carId].x = x;
-          cars[carId].y = y;
-          cars[carId].z = z;
-          cars[carId].interpolation = 0; // Reset interpolation factor
-        } else {
-          // New car: initialize positions and assign a random color
-          const color = carColors[Math.floor(Math.random() * carColors.length)];
-          cars[carId] = {
-            id: carId,
-            x: x,
-            y: y,
-            z: z,
-            prevX: x,
-            prevY: y,
-            prevZ: z,
-            lastAngle: 0, // Initialize last known angle
-            interpolation: 0, // Initialize interpolation factor
-            color: color, // Assign random color
-          };
-        }
-        newCarIds.push(carId);
-      } else if (agentType === "Semaforo") {
-        trafficLights.push({
+  const dynamicAgents = [];
+  for (let i = 0; i < carCount; i++) {
+    dynamicAgents.push({
+      id: `Coche-${carIds[i]}`,
+      type: "Coche",
+      pos: [carPositions[2 * i], carPositions[2 * i + 1]],
+      destination: wireDictionary.destinos[carDestinations[i]],
+    });
+  }
+  for (let i = 0; i < lightCount; i++) {
+    const light = wireDictionary.semaforos[lightIndices[i]];
+    dynamicAgents.push({
+      id: light.id,
+      type: "Semaforo",
+      pos: light.pos,
+      state: (lightStates[i >> 3] >> (i & 7)) & 1 ? true : false,
+      direction: light.direction,
+    });
+  }
+
+  return {
+    step: step,
+    full: full,
+    dynamicAgents: dynamicAgents,
+    removed: Array.from(removedIds, (id) => `Coche-${id}`),
+  };
+}
+
+// Apply a full snapshot or a delta of dynamic agents
+function applyDynamicAgents(result) {
+  const dynamicAgents = result.dynamicAgents;
+  lastStep = result.step;
+
+  // Cars that are not in the delta did not move: settle their interpolation
+  Object.values(cars).forEach((car) => {
+    car.prevX = car.x;
+    car.prevY = car.y;
+    car.prevZ = car.z;
+  });
+
+  const seenCarIds = new Set();
+  dynamicAgents.forEach((agent) => {
+    const agentType = agent.type;
+    const pos = agent.pos;
+
+    const x = pos[0];
+    const z = pos[1];
+    const y = 0;
+
+    if (agentType === "Coche") {
+      const carId = agent.id;
+
+      if (cars[carId]) {
+        // Existing car: update current position
+        cars[carId].x = x;
+        cars[carId].y = y;
+        cars[carId].z = z;
+        cars[carId].interpolation = 0; // Reset interpolation factor
+      } else {
+        // New car: initialize positions and assign a random color
+        const color = carColors[Math.floor(Math.random() * carColors.length)];
+        cars[carId] = {
+          id: carId,
           x: x,
-          y: y + 1, // over the ground
+          y: y,
           z: z,
-          state: agent.state,
-          direction: agent.direction,
-        });
+          prevX: x,
+          prevY: y,
+          prevZ: z,
+          lastAngle: 0, // Initialize last known angle
+          interpolation: 0, // Initialize interpolation factor
+          color: color, // Assign random color
+        };
       }
-    });
+      seenCarIds.add(carId);
+    } else if (agentType === "Semaforo") {
+      lightsById[agent.id] = {
+        x: x,
+        y: y + 1, // over the ground
+        z: z,
+        state: agent.state,
+        direction: agent.direction,
+      };
+    }
+  });
 
-    // Remove cars that no longer exist
+  if (result.full) {
+    // Full snapshot: remove cars that no longer exist
     Object.keys(cars).forEach((carId) => {
-      if (!newCarIds.includes(carId)) {
+      if (!seenCarIds.has(carId)) {
         delete cars[carId];
       }
     });
-
-  } catch (error) {
-    console.error("Error fetching dynamic agents:", error);
+  } else {
+    (result.removed || []).forEach((carId) => {
+      delete cars[carId];
+    });
   }
-}
 
-// Fetch statistics
-async function fetchStats() {
-  try {
-    const response = await fetch(`${agent_server_uri}getStats`);
-    if (!response.ok) throw new Error("Failed to fetch stats.");
-    const stats = await response.json();
-    return stats;
-  } catch (error) {
-    console.error("Error fetching stats:", error);
-    return null;
-  }
+  // Rebuild trafficLights array
+  trafficLights.length = 0;
+  Object.values(lightsById).forEach((light) => trafficLights.push(light));
 }
 
 /*
- * Updates the agent positions by sending a request to the agent server.
+ * Advances the simulation and retrieves the new agent state and stats in a
+ * single request to the agent server.
  */
-async function update() {
+async function update(steps = 1) {
   try {
-    // Send a request to the agent server to update the agent positions
-    let response = await fetch(agent_server_uri + "update") 
+    const since = lastStep === null ? "" : `&since=${lastStep}`;
+    const response = await fetch(`${agent_server_uri}advance?steps=${steps}&historial=0${since}`, {
+      headers: sessionHeaders,
+    });
 
     // Check if the response was successful
-    if(response.ok){
-      // Retrieve the updated agent positions
-      await fetchDynamicAgents()
-      // Log a message indicating that the agents have been updated
-      console.log("Updated agents")
+    if (response.ok) {
+      const result = await response.json();
+      applyDynamicAgents(result);
+      updateStatsDisplay(result.stats);
     }
 
   } catch (error) {
     // Log any errors that occur during the request
-    console.log(error) 
+    console.log(error)
   }
 }
 
@@ -504,13 +604,8 @@ async function drawScene() {
   if (frameCount % 5 === 0) {
     frameCount = 0;
     framesSinceUpdate = 0; // Reset frames since last update
+    // Advance the simulation, update the agents and the stats display
     await update();
-
-    // Fetch stats and update display
-    const stats = await fetchStats();
-    if (stats) {
-      updateStatsDisplay(stats);
-    }
   }
 
   // Request the next frame